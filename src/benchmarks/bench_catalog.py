@@ -0,0 +1,58 @@
+## benchmark
+## run from src/: python -m benchmarks.bench_catalog
+
+import gc
+import random
+import tracemalloc
+from game.items.items import ItemTypeEnum, ItemRarityEnum
+from game.items.catalog import ItemCatalog, CompactInventory
+from game.npc.merchant.react.models import Inventory
+from game.npc.merchant.react.catalog_items import to_react_item
+
+N_INVENTORIES = 100_000
+ITEMS_PER_INVENTORY = 8
+N_DEFINITIONS = 500
+
+def build_catalog() -> ItemCatalog:
+    catalog = ItemCatalog()
+    types = list(ItemTypeEnum)
+    rarities = list(ItemRarityEnum)
+    for i in range(N_DEFINITIONS):
+        catalog.register(f'item_{i}', f'Item {i}', types[i % 3], base_price=5 + i, rarity=rarities[i % 5], damage=i % 40)
+    return catalog
+
+def measure(label, build):
+    gc.collect()
+    tracemalloc.start()
+    held = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<45} {current / 1e6:>9.1f} MB  ({current / N_INVENTORIES:.0f} B/inventory)")
+    del held
+    return current
+
+def main():
+    random.seed(0)
+    catalog = build_catalog()
+    picks = [random.sample(range(N_DEFINITIONS), ITEMS_PER_INVENTORY) for _ in range(N_INVENTORIES)]
+    print(f"{N_INVENTORIES} player inventories x {ITEMS_PER_INVENTORY} items, {N_DEFINITIONS} item definitions\n")
+
+    # every inventory holds its own pydantic items (as when loaded from saves / prompts)
+    def pydantic_inventories():
+        return [Inventory(items=[to_react_item(catalog.get(cid)) for cid in ids], gold=100) for ids in picks]
+
+    def compact_inventories():
+        inventories = []
+        for ids in picks:
+            inventory = CompactInventory(catalog, gold=100)
+            for cid in ids:
+                inventory.add(cid)
+            inventories.append(inventory)
+        return inventories
+
+    before = measure("pydantic Inventory[Item]", pydantic_inventories)
+    after = measure("CompactInventory (catalog refs)", compact_inventories)
+    print(f"\nsaved: {(before - after) / 1e6:.1f} MB ({100 * (1 - after / before):.1f}%)")
+
+if __name__ == '__main__':
+    main()
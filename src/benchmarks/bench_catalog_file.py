@@ -0,0 +1,60 @@
+## benchmark
+## run from src/: python -m benchmarks.bench_catalog_file
+
+import os
+import json
+import time
+import random
+import tempfile
+from game.items.items import ItemTypeEnum, ItemRarityEnum
+from game.items.catalog import ItemDefinition
+from game.items.catalog_file import build_catalog_file, MappedCatalog
+
+SIZES = (1_000, 10_000, 100_000, 500_000)
+
+def make_definitions(n):
+    types = list(ItemTypeEnum)
+    rarities = list(ItemRarityEnum)
+    for i in range(n):
+        yield ItemDefinition(
+            id=i, key=f'item_{i}', name=f'Item {i}',
+            type=types[i % 3], rarity=rarities[random.randrange(5)],
+            base_price=random.randint(1, 10_000), damage=i % 50,
+        )
+
+def stock_merchant(catalog):
+    return [
+        catalog.query(item_type=ItemTypeEnum.WEAPON, max_price=100, limit=2, descending=True),
+        catalog.query(item_type=ItemTypeEnum.ARMOR, max_price=50, limit=1, descending=True),
+        catalog.query(item_type=ItemTypeEnum.POTION, rarity=ItemRarityEnum.RARE, max_price=20, limit=1, descending=True),
+    ]
+
+def main():
+    random.seed(0)
+    print(f"{'items':>8} {'json load+validate':>20} {'mmap open':>12} {'open+stock merchant':>22}")
+    with tempfile.TemporaryDirectory() as dirname:
+        for n in SIZES:
+            definitions = list(make_definitions(n))
+            json_path = os.path.join(dirname, f'catalog_{n}.json')
+            bin_path = os.path.join(dirname, f'catalog_{n}.bin')
+            with open(json_path, 'w') as f:
+                json.dump([d.model_dump(mode='json') for d in definitions], f)
+            build_catalog_file(definitions, bin_path)
+
+            ## baseline: scan and validate the full json dump
+            start = time.perf_counter()
+            with open(json_path) as f:
+                loaded = [ItemDefinition.model_validate(d) for d in json.load(f)]
+            json_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            catalog = MappedCatalog(bin_path)
+            open_time = time.perf_counter() - start
+            stock_merchant(catalog)
+            stock_time = time.perf_counter() - start
+            catalog.close()
+
+            print(f"{n:>8} {json_time * 1e3:>18.1f}ms {open_time * 1e3:>10.3f}ms {stock_time * 1e3:>20.3f}ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+## benchmark
+## run from src/: python -m benchmarks.bench_combat
+
+import math
+import random
+import time
+import numpy as np
+from game.items.items import Armour, Weapon
+from game.world.combat import Combatant, CombatSession, simulate_fights
+
+N_SCALAR = 20_000
+N_BATCH = 1_000_000
+Z_THRESHOLD = 3.0 # six comparisons, a false failure at |z| > 3 has ~1.6% chance
+
+MATCHUPS = [
+    (Combatant.equipped("hero", 100, 5, Weapon(name="Sword", price=50, damage=10), Armour(name="Leather Armor", price=30, defense=3)),
+     Combatant(name="cave_troll", health=150, damage=14, defense=2, hit_chance=0.6)),
+    (Combatant.equipped("hero", 100, 5, Weapon(name="Ice Staff", price=100, damage=18)),
+     Combatant(name="dragon", health=250, damage=12, defense=8, crit_chance=0.2)),
+    (Combatant.equipped("hero", 100, 5, Weapon(name="Dagger", price=10, damage=3)),
+     Combatant(name="rat", health=20, damage=2)),
+]
+
+def main():
+    for player, enemy in MATCHUPS:
+        rng = random.Random(0)
+        start = time.perf_counter()
+        results = [CombatSession(player, enemy, rng).run() for _ in range(N_SCALAR)]
+        scalar_time = time.perf_counter() - start
+        scalar_wins = np.array([r.winner == 'player' for r in results])
+        scalar_rounds = np.array([r.round for r in results])
+
+        start = time.perf_counter()
+        stats = simulate_fights(player, enemy, N_BATCH, seed=0)
+        batch_time = time.perf_counter() - start
+
+        ## the two estimates agree within sampling error (z score of the difference)
+        p, q = scalar_wins.mean(), stats.player_win_rate
+        se = math.sqrt(p * (1 - p) / N_SCALAR + q * (1 - q) / N_BATCH) or 1.0
+        rounds_se = math.sqrt(scalar_rounds.var() / N_SCALAR + stats.rounds.var() / N_BATCH) or 1.0
+        win_z = (p - q) / se
+        rounds_z = (scalar_rounds.mean() - stats.rounds.mean()) / rounds_se
+
+        print(f"{player.name} vs {enemy.name}")
+        print(f"  {stats.summary()}")
+        print(f"  scalar win rate {p:.2%} vs batch {q:.2%} (z={win_z:+.2f}), mean fight length z={rounds_z:+.2f}")
+        print(f"  scalar {N_SCALAR / scalar_time:>12,.0f} fights/s, batch {N_BATCH / batch_time:>12,.0f} fights/s")
+        assert abs(win_z) < Z_THRESHOLD and abs(rounds_z) < Z_THRESHOLD
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+## benchmark
+## run from src/: python -m benchmarks.bench_economy
+
+import time
+import numpy as np
+from game.npc.merchant.react.models import Inventory, Item
+from game.npc.merchant.react.sub_system.transaction import purchase
+from game.npc.merchant.react.sub_system.economy import EconomyConfig, EconomySimulator
+
+DAYS = 365
+ITEMS = [
+    Item(name="Sword", type="weapon", price=50),
+    Item(name="Ice Staff", type="weapon", price=100),
+    Item(name="Dagger", type="weapon", price=15),
+    Item(name="Leather Armor", type="armour", price=30),
+    Item(name="Chainmail", type="armour", price=80),
+    Item(name="Potion of Healing", type="potion", price=10),
+    Item(name="Potion of Defense", type="potion", price=20),
+]
+
+def check_against_purchase(n_merchants: int = 20, n_players: int = 500):
+    """One round of attempts gives the same gold and stock as calling purchase() on real inventories in player order"""
+    sim = EconomySimulator(ITEMS, EconomyConfig(merchants=n_merchants, players=n_players, start_stock=2), seed=1)
+    sim.player_gold[:] = sim.rng.integers(0, 120, n_players)
+    merchants = [Inventory(owner=f"merchant_{m}", gold=int(sim.merchant_gold[m]), items=[item for item in ITEMS for _ in range(2)]) for m in range(n_merchants)]
+    players = [Inventory(owner=f"player_{p}", gold=int(sim.player_gold[p]), items=[]) for p in range(n_players)]
+
+    merchant, kind = sim.random_attempts()
+    result = sim.attempt_round(merchant, kind)
+    for p in range(n_players):
+        if merchant[p] < 0:
+            continue
+        res = purchase(players[p], merchants[merchant[p]], ITEMS[kind[p]])
+        assert res.is_successful == result.allowed[p], p
+
+    assert [inv.gold for inv in players] == sim.player_gold.tolist()
+    assert [inv.gold for inv in merchants] == sim.merchant_gold.tolist()
+    assert [[inv.quantity(item) for item in ITEMS] for inv in merchants] == sim.stock.tolist()
+    print(f"vectorized round matches purchase() on {n_players} players x {n_merchants} merchants ({int(result.allowed.sum())} sales)")
+
+def main():
+    check_against_purchase()
+
+    sim = EconomySimulator(ITEMS, EconomyConfig(), seed=0)
+    start = time.perf_counter()
+    report = sim.run(DAYS)
+    elapsed = time.perf_counter() - start
+
+    config = sim.config
+    print(f"\n{config.merchants} merchants, {config.players} players, {DAYS} days: {elapsed:.1f} s")
+    print(report.summary(every=30))
+    print(f"\nunits sold per item type (total): {dict(zip(('weapon', 'armour', 'potion'), np.sum(report.sales, axis=0).tolist()))}")
+
+if __name__ == '__main__':
+    main()
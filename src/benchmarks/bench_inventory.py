@@ -0,0 +1,63 @@
+## benchmark
+## run from src/: python -m benchmarks.bench_inventory
+
+import time
+import random
+from typing import List
+from game.npc.merchant.react.models import Item, Inventory
+
+N_ITEMS = 10_000
+N_OPS = 2_000
+TYPES = ['weapon', 'armour', 'potion']
+
+def make_items(n) -> List[Item]:
+    return [Item(name=f"Item {i}", type=TYPES[i % 3], price=random.randint(1, 1000)) for i in range(n)]
+
+def timed(label, fn, ops):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed * 1e6 / ops:>10.2f} us/op")
+
+def main():
+    random.seed(0)
+    items = make_items(N_ITEMS)
+    picks = random.sample(items, N_OPS)
+    print(f"merchant inventory: {N_ITEMS} items, {N_OPS} ops\n")
+
+    ## baseline: the old List[Item] inventory
+    item_list = list(items)
+    timed("list: membership (item in items)", lambda: [item in item_list for item in picks], N_OPS)
+    def list_remove_add():
+        for item in picks:
+            item_list.remove(item)
+            item_list.append(item)
+    timed("list: remove + append", list_remove_add, N_OPS)
+
+    ## indexed inventory
+    inventory = Inventory(items=items, gold=0)
+    timed("inventory: membership (item in inventory)", lambda: [item in inventory for item in picks], N_OPS)
+    def inventory_remove_add():
+        for item in picks:
+            inventory.add(inventory.remove(item))
+    timed("inventory: remove + add (last of stack)", inventory_remove_add, N_OPS)
+
+    for item in picks:
+        inventory.add(item, 4)
+    def inventory_stack_remove_add():
+        for item in picks:
+            inventory.add(inventory.remove(item))
+    timed("inventory: remove + add (stacked)", inventory_stack_remove_add, N_OPS)
+    timed("inventory: items_of_type", lambda: [inventory.items_of_type(t) for t in TYPES], len(TYPES))
+    timed("inventory: sorted_by_price", lambda: inventory.sorted_by_price(), 1)
+    timed("inventory: query (text + budget page)", lambda: [inventory.query(text="the 4242 one", budget=300, page_size=8) for _ in range(100)], 100)
+
+    ## prompt size: full inventory vs bounded page (see_collection context)
+    print()
+    for n in (10, 1_000, N_ITEMS):
+        inv = Inventory(items=items[:n], gold=0)
+        page = inv.query(text="show me your weapons", budget=300, page_size=8)
+        print(f"{n:>6} items: full inventory {len(inv.model_dump_json()):>8} chars, page {len(page.model_dump_json()):>5} chars")
+
+if __name__ == '__main__':
+    main()
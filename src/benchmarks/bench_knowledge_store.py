@@ -0,0 +1,80 @@
+## benchmark
+## run from src/: python -m benchmarks.bench_knowledge_store
+
+import os
+import json
+import time
+import random
+import tempfile
+from game.npc.merchant.react.knowledge_store import KnowledgeStore, StoredKnowledgeBase
+from game.npc.merchant.react.react_merchant_statemachine import MerchantStateMachine
+
+N_NPCS = 1_000
+N_LORE = 20_000 # shared pool, npcs reference overlapping subsets
+ENTRIES_PER_NPC = 100
+PLACES = "dragon passage waterfall bandit castle forest river ice fire merchant guard king tower cave sword relic curse harbor mine".split()
+WORDS = PLACES + [f"{place}{i}" for place in PLACES for i in range(100)] # realistic vocabulary: many rare names, few common words
+
+def make_records(states):
+    lore = [
+        {'name': f"Lore {i}", 'description': " ".join(random.choices(WORDS, k=12))}
+        for i in range(N_LORE)
+    ]
+    quests = [
+        {'name': f"Quest {i}", 'description': " ".join(random.choices(WORDS, k=12)), 'npc_dialog_option': None, 'reward': 10 * i, 'is_given': False}
+        for i in range(N_LORE // 10)
+    ]
+    return {
+        f'npc_{n}': {
+            'quests': {'allowed_states': states[-2:], 'data': random.sample(quests, ENTRIES_PER_NPC // 10)},
+            'secrets': {'allowed_states': states[-1:], 'data': random.sample(lore, ENTRIES_PER_NPC // 2)},
+            'generic_info': {'allowed_states': states, 'data': random.sample(lore, ENTRIES_PER_NPC // 2)},
+        }
+        for n in range(N_NPCS)
+    }
+
+def main():
+    random.seed(0)
+    state_machine = MerchantStateMachine()
+    states = list(state_machine.states_map)
+
+    with tempfile.TemporaryDirectory() as dirname:
+        source = os.path.join(dirname, 'knowledge.json')
+        with open(source, 'w') as f:
+            json.dump(make_records(states), f)
+
+        store = KnowledgeStore(os.path.join(dirname, 'knowledge.db'))
+        start = time.perf_counter()
+        n_access = store.import_file(source)
+        elapsed = time.perf_counter() - start
+        n_entries = store._conn.execute('SELECT COUNT(*) FROM knowledge').fetchone()[0]
+        print(f"bulk import: {N_NPCS} npcs, {n_entries} unique entries, {n_access} access rows in {elapsed:.2f}s")
+
+        views = [StoredKnowledgeBase(store, f'npc_{n}') for n in range(N_NPCS)]
+        helpful = state_machine.states_map[states[-1]]
+
+        start = time.perf_counter()
+        for view in views[:200]:
+            view.get_protected_knowledge(helpful)
+        print(f"protected view (cold): {(time.perf_counter() - start) * 1e3 / 200:.2f} ms/npc")
+
+        start = time.perf_counter()
+        for view in views[:200]:
+            view.get_protected_knowledge(helpful)
+        print(f"protected view (cached): {(time.perf_counter() - start) * 1e6 / 200:.1f} us/npc")
+
+        for view in views[:200]:
+            view.get_protected_knowledge_json(helpful)
+        start = time.perf_counter()
+        for view in views[:200]:
+            view.get_protected_knowledge_json(helpful)
+        print(f"protected view json (cached): {(time.perf_counter() - start) * 1e6 / 200:.1f} us/npc")
+
+        start = time.perf_counter()
+        for view in views[:200]:
+            view.search("where is the dragon cave near the waterfall", helpful, k=3, boost_kinds=['secrets'])
+        print(f"search (fts + state filter): {(time.perf_counter() - start) * 1e3 / 200:.2f} ms/query")
+        store.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+## benchmark
+## run from src/: python -m benchmarks.bench_ledger
+
+import os
+import time
+import random
+import tempfile
+import threading
+from game.npc.merchant.react.models import Item, Inventory
+from game.npc.merchant.react.sub_system.transaction import purchase
+from game.npc.merchant.react.sub_system.ledger import TransactionLedger, write_snapshot, restore
+
+N_HISTORY = 1_000_000
+N_PLAYERS = 1_000
+ITEMS = [Item(name=f"Item {i}", type=['weapon', 'armour', 'potion'][i % 3], price=5 + i) for i in range(50)]
+
+def bench_group_commit(dirname, n_buyers=16, per_buyer=200):
+    """durable purchases from many threads, every call waits for its fsync"""
+    ledger = TransactionLedger(os.path.join(dirname, 'live.ledger'))
+    merchant = Inventory(gold=0, owner='merchant')
+    for item in ITEMS:
+        merchant.add(item, n_buyers * per_buyer)
+    buyers = [Inventory(gold=10**9, owner=f'player_{i}') for i in range(n_buyers)]
+
+    def buyer_loop(buyer):
+        for _ in range(per_buyer):
+            purchase(buyer, merchant, random.choice(ITEMS), ledger=ledger)
+
+    threads = [threading.Thread(target=buyer_loop, args=(b,)) for b in buyers]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    ledger.close()
+    n = n_buyers * per_buyer
+    print(f"durable purchases: {n} from {n_buyers} threads in {elapsed:.2f}s -> {n / elapsed:.0f} tx/s")
+
+def bench_replay(dirname):
+    ledger_path = os.path.join(dirname, 'history.ledger')
+    snapshot_path = os.path.join(dirname, 'history.snapshot')
+
+    merchant = Inventory(gold=0, owner='merchant')
+    for item in ITEMS:
+        merchant.add(item, N_HISTORY)
+    ledger = TransactionLedger(ledger_path)
+    write_snapshot(snapshot_path, {'merchant': merchant}, ledger)
+
+    ## write the history: each trade is one purchase record
+    start = time.perf_counter()
+    players = [f'player_{i}' for i in range(N_PLAYERS)]
+    for i in range(N_HISTORY):
+        player, item = random.choice(players), random.choice(ITEMS)
+        ledger.append_purchase(player, 'merchant', item.price, item, 1)
+    ledger.close()
+    elapsed = time.perf_counter() - start
+    print(f"ledger write: {N_HISTORY} records in {elapsed:.2f}s ({os.path.getsize(ledger_path) / 1e6:.1f} MB)")
+
+    start = time.perf_counter()
+    inventories = restore(snapshot_path, ledger_path)
+    elapsed = time.perf_counter() - start
+    print(f"restore (snapshot + replay of {N_HISTORY} records): {elapsed:.2f}s, {len(inventories)} inventories")
+    print(f"merchant gold after replay: {inventories['merchant'].gold}")
+
+def main():
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as dirname:
+        bench_group_commit(dirname)
+        bench_replay(dirname)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+## benchmark
+## run from src/: python -m benchmarks.bench_narration_cache
+## the llm call is replaced by a fixed delay, only the time a player waits on arrival is measured
+
+import random
+import time
+from game.world.narration_cache import NarrationCache
+
+GENERATION_DELAY = 0.05 # seconds per generated description
+GRID = 10 # locations on a GRID x GRID map, connected to their 4 neighbours
+N_MOVES = 60
+THINK_TIME = 0.1 # seconds a player spends at a location before moving on
+
+def neighbours(location: str):
+    x, y = map(int, location.split('_')[1:])
+    return [f"loc_{x + dx}_{y + dy}" for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)) if 0 <= x + dx < GRID and 0 <= y + dy < GRID]
+
+def generate(location_id: str, time_of_day, weather) -> str:
+    time.sleep(GENERATION_DELAY)
+    return f"{location_id} at {time_of_day} ({weather})"
+
+def walk(prefetch: bool) -> float:
+    rng = random.Random(0)
+    cache = NarrationCache(generate, max_entries=64)
+    location, waited = "loc_0_0", 0.0
+    for _ in range(N_MOVES):
+        start = time.perf_counter()
+        cache.get(location, 'morning', 'clear')
+        waited += time.perf_counter() - start
+        if prefetch:
+            cache.prefetch(neighbours(location), 'morning', 'clear')
+        time.sleep(THINK_TIME)
+        location = rng.choice(neighbours(location))
+    return waited
+
+def main():
+    for prefetch in (False, True):
+        waited = walk(prefetch)
+        print(f"prefetch={prefetch!s:<5} average wait on arrival: {waited * 1e3 / N_MOVES:6.1f} ms")
+
+if __name__ == '__main__':
+    main()
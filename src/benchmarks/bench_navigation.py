@@ -0,0 +1,80 @@
+## benchmark
+## run from src/: python -m benchmarks.bench_navigation
+
+import random
+import time
+from game.world.navigation import NavigationGraph
+
+SIDE = 224 # SIDE x SIDE grid, ~50k locations
+WALL_RATE = 0.25 # fraction of grid connections that are blocked
+N_QUERIES = 200
+N_PASSAGES = 50 # secret passages opened after the build
+
+def loc(x, y):
+    return f"loc_{x}_{y}"
+
+def main():
+    rng = random.Random(0)
+    graph = NavigationGraph(num_landmarks=8)
+
+    start = time.perf_counter()
+    for x in range(SIDE):
+        for y in range(SIDE):
+            graph.add_location(loc(x, y))
+            if x and rng.random() > WALL_RATE:
+                graph.add_edge(loc(x - 1, y), loc(x, y), rng.uniform(1, 5))
+            if y and rng.random() > WALL_RATE:
+                graph.add_edge(loc(x, y - 1), loc(x, y), rng.uniform(1, 5))
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    graph.build_landmarks()
+    landmark_time = time.perf_counter() - start
+    print(f"{len(graph)} locations: graph {build_time:.2f} s, landmarks {landmark_time:.2f} s")
+
+    pairs = [(loc(rng.randrange(SIDE), rng.randrange(SIDE)), loc(rng.randrange(SIDE), rng.randrange(SIDE))) for _ in range(N_QUERIES)]
+
+    start = time.perf_counter()
+    reachable = [graph.reachable(a, b) for a, b in pairs]
+    print(f"reachable:    {(time.perf_counter() - start) * 1e6 / N_QUERIES:10.1f} us/query ({sum(reachable)}/{N_QUERIES} reachable)")
+
+    ## baseline: A* without landmarks is plain Dijkstra
+    landmark_dist, graph._landmark_dist = graph._landmark_dist, []
+    start = time.perf_counter()
+    baseline = [graph._search(graph._ids[a], graph._ids[b]) if r else None for (a, b), r in zip(pairs, reachable)]
+    dijkstra_time = time.perf_counter() - start
+    graph._landmark_dist = landmark_dist
+
+    start = time.perf_counter()
+    routes = [graph.route(a, b) for a, b in pairs]
+    alt_time = time.perf_counter() - start
+    for route, expected in zip(routes, baseline):
+        assert (route is None) == (expected is None)
+        assert route is None or abs(route.travel_time - expected.travel_time) < 1e-9
+    print(f"dijkstra:     {dijkstra_time * 1e6 / N_QUERIES:10.1f} us/query")
+    print(f"ALT A*:       {alt_time * 1e6 / N_QUERIES:10.1f} us/query")
+
+    start = time.perf_counter()
+    for a, b in pairs:
+        graph.travel_time(a, b)
+    print(f"cached route: {(time.perf_counter() - start) * 1e6 / N_QUERIES:10.1f} us/query")
+
+    cached = len(graph._routes)
+    start = time.perf_counter()
+    for _ in range(N_PASSAGES):
+        graph.open_edge(loc(rng.randrange(SIDE), rng.randrange(SIDE)), loc(rng.randrange(SIDE), rng.randrange(SIDE)), 1.0)
+    print(f"open edge:    {(time.perf_counter() - start) * 1e3 / N_PASSAGES:10.1f} ms/edge (landmark tables repaired)")
+    print(f"route cache:  {len(graph._routes)}/{cached} entries kept after {N_PASSAGES} edges")
+
+    ## the repaired tables match a rebuild from scratch
+    for landmark, dist in zip(graph._landmarks, graph._landmark_dist):
+        assert dist == graph._dijkstra(landmark)
+    ## kept cache entries are still exact
+    for a, b in pairs:
+        assert (graph.route(a, b) is None) == (not graph.reachable(a, b))
+    routes = [graph.route(a, b) for a, b in pairs[:20]]
+    for route, (a, b) in zip(routes, pairs[:20]):
+        if route is not None:
+            assert abs(route.travel_time - graph._dijkstra(graph._ids[a])[graph._ids[b]]) < 1e-9
+
+if __name__ == '__main__':
+    main()
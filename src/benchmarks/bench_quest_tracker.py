@@ -0,0 +1,63 @@
+## benchmark
+## run from src/: python -m benchmarks.bench_quest_tracker
+
+import random
+import time
+from game.npc.merchant.react.models import Quest, QuestObjective
+from game.world.quest_tracker import QuestTracker
+
+N_QUESTS = 1000
+N_EVENTS = 20_000
+EVENT_TYPES = ['talk', 'collect', 'visit', 'defeat']
+N_TARGETS = 500 # per event type
+
+def make_quests(rng):
+    quests = []
+    for i in range(N_QUESTS):
+        objectives = [
+            QuestObjective(event_type=rng.choice(EVENT_TYPES), target=f"target_{rng.randrange(N_TARGETS)}", required=rng.randint(1, 5))
+            for _ in range(rng.randint(1, 4))
+        ]
+        quests.append(Quest(name=f"quest_{i}", description="", reward=10, objectives=objectives))
+    return quests
+
+def scan(quests, progress, event_type, target):
+    """Baseline: every objective of every active quest is checked"""
+    updates = 0
+    for quest in quests:
+        counts = progress[quest.name]
+        for i, objective in enumerate(quest.objectives):
+            if objective.event_type == event_type and objective.target == target and counts[i] < objective.required:
+                counts[i] += 1
+                updates += 1
+    return updates
+
+def main():
+    rng = random.Random(0)
+    quests = make_quests(rng)
+    events = [(rng.choice(EVENT_TYPES), f"target_{rng.randrange(N_TARGETS)}") for _ in range(N_EVENTS)]
+
+    progress = {quest.name: [0] * len(quest.objectives) for quest in quests}
+    start = time.perf_counter()
+    scan_updates = sum(scan(quests, progress, event_type, target) for event_type, target in events)
+    scan_time = time.perf_counter() - start
+
+    tracker = QuestTracker()
+    start = time.perf_counter()
+    for quest in quests:
+        tracker.add_quest(quest)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index_updates = sum(len(tracker.on_event(event_type, target)) for event_type, target in events)
+    index_time = time.perf_counter() - start
+
+    assert scan_updates == index_updates, (scan_updates, index_updates)
+    assert all(tracker.progress[name] == counts for name, counts in progress.items())
+
+    print(f"{N_QUESTS} active quests, {N_EVENTS} events, {index_updates} objective updates")
+    print(f"scan:  {N_EVENTS / scan_time:>12,.0f} events/s")
+    print(f"index: {N_EVENTS / index_time:>12,.0f} events/s (build {build_time * 1e3:.1f} ms)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+## benchmark
+## run from src/: python -m benchmarks.bench_reflection [--live]
+## --live calls the reflection agent (needs OPENAI_API_KEY) and reports completion tokens and latency per turn,
+## without it the output sizes of both contracts are compared offline (~4 chars per token)
+
+import sys
+import json
+import time
+from typing import List
+from game.npc.merchant.react.models import Action, ApprovalWrapper, ProtectedKnowledgeBase
+from game.npc.merchant.react.react_merchant_statemachine import MerchantStateMachine
+
+N_LIVE_TURNS = 10
+
+TURNS = [
+    ("My name is Aria, I come from the northern isles.", 'player_shared_personal_info', 'question_player'),
+    ("Will some gold change your mind?", 'player_offer_bribe', 'take_bribe'),
+    ("Show me your weapons.", None, 'trade'),
+    ("Do you know anything about the dragon?", None, 'basic_info'),
+    ("Tell me your secrets or you will regret it.", 'player_threaten_npc', None),
+]
+
+REASONING = "The player offered gold in a friendly manner, so the merchant accepts the bribe and becomes helpful."
+
+def legacy_output(state_machine, condition, action) -> dict:
+    """old contract: full approval wrappers echoing the condition (with examples) and the action"""
+    condition = state_machine.transition_lookup(condition)
+    action = state_machine.action_lookup(action)
+    return {
+        'transition_condition_approval': ApprovalWrapper(data=condition, approved=True).model_dump() if condition else None,
+        'action_approval': ApprovalWrapper(data=action, approved=True).model_dump() if action else ApprovalWrapper[Action](data=Action(name='none', description=''), approved=False).model_dump(),
+        'reasoning': REASONING,
+    }
+
+def slim_output(condition, action) -> dict:
+    return {'approvals': {name: True for name in (condition, action) if name}, 'reasoning': REASONING}
+
+def offline():
+    state_machine = MerchantStateMachine()
+    legacy = [len(json.dumps(legacy_output(state_machine, c, a))) for _, c, a in TURNS]
+    slim = [len(json.dumps(slim_output(c, a))) for _, c, a in TURNS]
+    print(f"{'contract':<12} {'chars/turn':>10} {'~tokens/turn':>13}")
+    for label, sizes in (('legacy', legacy), ('slim', slim)):
+        mean = sum(sizes) / len(sizes)
+        print(f"{label:<12} {mean:>10.0f} {mean / 4:>13.0f}")
+
+def live():
+    from pydantic import Field
+    from atomic_agents.agents.base_agent import BaseIOSchema
+    from game.npc.merchant.react.models import FewShotIntent
+    from game.npc.merchant.react.agents.reflection_reason import reflection_reason_agent, ReflectionReasonInputSchema, ReflectionReasonOutputSchema
+
+    class LegacyReflectionReasonOutputSchema(BaseIOSchema):
+        """Output schema for the Reflection Reason Agent."""
+        transition_condition_approval: ApprovalWrapper[FewShotIntent] = Field(..., description="Approval for the detected transition condition")
+        action_approval: ApprovalWrapper[Action] = Field(..., description="Approval for the detected action")
+        reasoning: str = Field(..., description="Reasoning behind the decision")
+
+    state_machine = MerchantStateMachine()
+    agent = reflection_reason_agent
+    for label, schema in (('legacy', LegacyReflectionReasonOutputSchema), ('slim', ReflectionReasonOutputSchema)):
+        tokens: List[int] = []
+        latencies: List[float] = []
+        for i in range(N_LIVE_TURNS):
+            message, condition, action = TURNS[i % len(TURNS)]
+            user_input = ReflectionReasonInputSchema(
+                player_input=message,
+                current_state=state_machine.states_map[state_machine.state],
+                detected_transition_condition=state_machine.transition_lookup(condition),
+                detected_action=state_machine.action_lookup(action),
+                previous_step_reasoning=None,
+                npc_knowledge_base=ProtectedKnowledgeBase(quests=[], secrets=[], generic_info=[]),
+                previous_conversation="",
+            )
+            messages = [
+                {'role': 'system', 'content': agent.system_prompt_generator.generate_prompt()},
+                {'role': 'user', 'content': user_input.model_dump_json()},
+            ]
+            start = time.perf_counter()
+            _, completion = agent.client.chat.completions.create_with_completion(
+                messages=messages, model=agent.model, response_model=schema, max_retries=1,
+            )
+            latencies.append(time.perf_counter() - start)
+            tokens.append(completion.usage.completion_tokens)
+        print(f"{label:<12} {sum(tokens) / len(tokens):>8.1f} completion tokens/turn {sum(latencies) * 1e3 / len(latencies):>8.0f} ms/turn")
+
+def main():
+    offline()
+    if '--live' in sys.argv:
+        print()
+        live()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+## benchmark
+## run from src/: python -m benchmarks.bench_sentiment
+
+import time
+from game.npc.merchant.react.sentiment import analyze
+
+N_REPEAT = 200
+
+# (player line, expected label), None = neutral
+# lines the lexicon was tuned on
+TUNING_LINES = [
+    ("Thank you, friend, that is very kind of you.", 'positive'),
+    ("Greetings! It is a pleasure to meet you.", 'positive'),
+    ("Your prices are fair and your wares are great.", 'positive'),
+    ("I appreciate the help, wise one.", 'positive'),
+    ("That is not bad at all.", 'positive'),
+    ("You have been a generous and honest merchant.", 'positive'),
+    ("I love this sword, it is beautiful.", 'positive'),
+    ("Cheers, glad to do business with you.", 'positive'),
+    ("I trust you, old man.", 'positive'),
+    ("Happy to help you with anything you need.", 'positive'),
+    ("I will hurt you if you don't comply.", 'negative'),
+    ("Don't you dare thinking about lying to me.", 'negative'),
+    ("You do not want me as your enemy.", 'negative'),
+    ("Tell me or you will regret it.", 'negative'),
+    ("You are a liar and a thief.", 'negative'),
+    ("These prices are a scam, you stupid fool.", 'negative'),
+    ("I will burn your shop to the ground.", 'negative'),
+    ("This potion is useless and overpriced.", 'negative'),
+    ("You are not my friend.", 'negative'),
+    ("I hate dealing with cheats like you.", 'negative'),
+    ("Shut up and show me the goods.", 'negative'),
+    ("I am not happy with this deal.", 'negative'),
+    ("Show me your weapons.", None),
+    ("How much is the leather armor?", None),
+    ("Some gold for some information?", None),
+    ("My name is Aria, I am from the north.", None),
+    ("Where is the dragon's lair?", None),
+    ("I would like to buy a potion of healing.", 'positive'),
+    ("Do you have any quests for me?", None),
+    ("What is behind the waterfall?", None),
+]
+
+# lines written after the lexicon was fixed, never used to adjust it
+HELD_OUT_LINES = [
+    ("Many thanks, you have been most helpful.", 'positive'),
+    ("What a wonderful shop you have here.", 'positive'),
+    ("You seem like an honest man, I like that.", 'positive'),
+    ("Good day to you, merchant.", 'positive'),
+    ("I am glad I found your stall.", 'positive'),
+    ("Fine, that price works for me.", 'positive'),
+    ("Your kindness will not be forgotten.", 'positive'),
+    ("This sword is a fine piece of work.", 'positive'),
+    ("Give me the map or you die today.", 'negative'),
+    ("You are a cheat and everyone knows it.", 'negative'),
+    ("This armor is terrible, it fell apart in a day.", 'negative'),
+    ("I will destroy everything you own.", 'negative'),
+    ("Nobody trusts a greedy old crook like you.", 'negative'),
+    ("Stop wasting my time, you pathetic old man.", 'negative'),
+    ("That is an awful deal and you know it.", 'negative'),
+    ("I don't like your tone.", 'negative'),
+    ("I need a sword and a shield.", None),
+    ("How far is it to the castle?", None),
+    ("Here are ten gold coins for the rumour.", None),
+    ("Tell me about the bandits on the river road.", None),
+    ("What do you sell?", None),
+    ("I am looking for the blacksmith.", None),
+    ("Is the reward for the troll still open?", None),
+    ("I just came back from the mines.", None),
+]
+
+def accuracy(lines, verbose: bool = False) -> int:
+    correct = 0
+    for line, expected in lines:
+        result = analyze(line)
+        correct += result.label == expected
+        if verbose:
+            marker = ' ' if result.label == expected else 'x'
+            print(f"{marker} {result.score:+.2f} {str(result.label):<9} expected {str(expected):<9} {line}")
+    return correct
+
+def main():
+    print("held-out lines:")
+    held_out = accuracy(HELD_OUT_LINES, verbose=True)
+    tuning = accuracy(TUNING_LINES)
+
+    start = time.perf_counter()
+    for _ in range(N_REPEAT):
+        for line, _ in HELD_OUT_LINES:
+            analyze(line)
+    elapsed = time.perf_counter() - start
+
+    print(f"\naccuracy held-out: {held_out}/{len(HELD_OUT_LINES)} ({held_out / len(HELD_OUT_LINES):.0%})")
+    print(f"accuracy tuning:   {tuning}/{len(TUNING_LINES)} ({tuning / len(TUNING_LINES):.0%})")
+    print(f"latency: {elapsed * 1e6 / (N_REPEAT * len(HELD_OUT_LINES)):.1f} us/message")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+## benchmark
+## run from src/: python -m benchmarks.bench_state_machine
+
+import time
+from transitions import Machine
+from game.npc.merchant.react.react_merchant_statemachine import MerchantStateMachine, MERCHANT_GRAPH
+
+N_NPCS = 10_000
+
+class MachineModel:
+    pass
+
+def per_instance_machine():
+    """baseline: a transitions.Machine built and wired per npc"""
+    model = MachineModel()
+    machine = Machine(model=model, states=list(MERCHANT_GRAPH.states_map), initial=MERCHANT_GRAPH.init_state)
+    for (source, condition), destination in MERCHANT_GRAPH.transition_table.items():
+        machine.add_transition(trigger=condition, source=source, dest=destination)
+    return model
+
+def timed(label, fn, n):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<45} {elapsed * 1e3:>8.1f} ms ({elapsed * 1e6 / n:.2f} us/npc)")
+    return result
+
+def main():
+    print(f"{N_NPCS} merchants\n")
+    timed("per instance transitions.Machine", lambda: [per_instance_machine() for _ in range(N_NPCS)], N_NPCS)
+    machines = timed("MerchantStateMachine (shared compiled graph)", lambda: [MerchantStateMachine() for _ in range(N_NPCS)], N_NPCS)
+
+    def transitions():
+        for machine in machines:
+            machine.transition('player_shared_personal_info')
+            machine.transition('player_offer_bribe')
+            machine.transition('player_threaten_npc')
+    timed("3 transitions per npc", transitions, N_NPCS)
+
+if __name__ == '__main__':
+    main()
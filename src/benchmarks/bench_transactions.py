@@ -0,0 +1,51 @@
+## benchmark
+## run from src/: python -m benchmarks.bench_transactions
+
+import time
+import threading
+from game.npc.merchant.react.models import Item, Inventory
+from game.npc.merchant.react.sub_system.transaction import purchase, transfer
+
+STOCK = 20_000
+ITEM = Item(name="Potion of Healing", type="potion", price=10)
+BUYER_GOLD = 5_000 # every buyer can afford at most 500 potions
+
+def run(n_buyers: int):
+    merchant = Inventory(gold=0)
+    merchant.add(ITEM, STOCK)
+    buyers = [Inventory(gold=BUYER_GOLD) for _ in range(n_buyers)]
+    start_barrier = threading.Barrier(n_buyers + 1)
+    successes = [0] * n_buyers
+
+    def buyer_loop(i):
+        start_barrier.wait()
+        while purchase(buyers[i], merchant, ITEM).is_successful:
+            successes[i] += 1
+            # give a little back now and then so both lock orders are exercised
+            if successes[i] % 50 == 0:
+                transfer(merchant, buyers[i], 1)
+
+    threads = [threading.Thread(target=buyer_loop, args=(i,)) for i in range(n_buyers)]
+    for t in threads:
+        t.start()
+    start_barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    ## invariants: no stock or gold was created or double spent
+    sold = sum(successes)
+    total_gold = merchant.gold + sum(b.gold for b in buyers)
+    assert total_gold == BUYER_GOLD * n_buyers, "gold not conserved"
+    assert merchant.quantity(ITEM) + sum(b.quantity(ITEM) for b in buyers) == STOCK, "stock not conserved"
+    assert all(b.gold >= 0 for b in buyers) and merchant.quantity(ITEM) >= 0
+
+    print(f"{n_buyers:>3} buyers: {sold:>6} purchases in {elapsed:.3f}s -> {sold / elapsed:>10.0f} tx/s")
+
+def main():
+    for n in (1, 2, 4, 8, 16, 32):
+        run(n)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Flyweight item catalog
+- every item definition (name, type, rarity, base price, stats) is held once in the catalog
+- inventories only hold compact references: catalog id + quantity (+ optional price override of the whole stack)
+- conversion to the react merchant's models lives on the react side (game.npc.merchant.react.catalog_items)
+- CompactInventory is a standalone storage format (e.g. for saves of many inventories), the live player and merchant
+  inventories are the react Inventory models the transactions and the trade system work on
+"""
+
+from array import array
+from typing import Dict, Iterator, List, Optional
+from pydantic import BaseModel, ConfigDict, Field
+from game.items.items import Item, ItemTypeEnum, ItemRarityEnum, PotionEffectEnum, Weapon, Armour, Potion, HealthPotion, DefensePotion
+
+class ItemDefinition(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    id: int = Field(..., description="Catalog id of the item")
+    key: str = Field(..., description="Unique item key, e.g. 'ice_staff'")
+    name: str
+    type: ItemTypeEnum
+    rarity: ItemRarityEnum = ItemRarityEnum.COMMON
+    base_price: int
+    damage: int | None = None
+    defense: int | None = None
+    effect: PotionEffectEnum | None = None
+    points: int | None = None
+
+class ItemCatalog:
+    """Shared registry of item definitions"""
+    def __init__(self):
+        self._definitions: List[ItemDefinition] = []
+        self._ids: Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self._definitions)
+
+    def __iter__(self) -> Iterator[ItemDefinition]:
+        return iter(self._definitions)
+
+    def register(self, key: str, name: str, type: ItemTypeEnum, base_price: int, rarity: ItemRarityEnum = ItemRarityEnum.COMMON, **stats) -> int:
+        """Add a definition (or return the existing one with the same key) and return its catalog id"""
+        if key in self._ids:
+            return self._ids[key]
+        catalog_id = len(self._definitions)
+        self._definitions.append(ItemDefinition(id=catalog_id, key=key, name=name, type=type, rarity=rarity, base_price=base_price, **stats))
+        self._ids[key] = catalog_id
+        return catalog_id
+
+    def register_item(self, item: Item, rarity: ItemRarityEnum = ItemRarityEnum.COMMON) -> int:
+        """Register a definition from a simple item (Weapon, Armour, HealthPotion, ...)"""
+        stats = {}
+        if isinstance(item, Weapon):
+            stats['damage'] = item.damage
+        elif isinstance(item, Armour):
+            stats['defense'] = item.defense
+        elif isinstance(item, Potion):
+            stats['effect'] = item.effect
+            stats['points'] = getattr(item, 'points', None)
+        key = item.name.strip().lower().replace(' ', '_')
+        return self.register(key, item.name, item.type, item.price, rarity, **stats)
+
+    def get(self, catalog_id: int) -> ItemDefinition:
+        return self._definitions[catalog_id]
+
+    def lookup(self, key: str) -> Optional[ItemDefinition]:
+        catalog_id = self._ids.get(key)
+        return None if catalog_id is None else self._definitions[catalog_id]
+
+    def to_item(self, catalog_id: int, price: Optional[int] = None) -> Item:
+        """Materialize a simple item model, e.g. for the simple merchant's inventory"""
+        definition = self._definitions[catalog_id]
+        price = definition.base_price if price is None else price
+        if definition.type == ItemTypeEnum.WEAPON:
+            return Weapon(name=definition.name, price=price, damage=definition.damage or 0)
+        if definition.type == ItemTypeEnum.ARMOR:
+            return Armour(name=definition.name, price=price, defense=definition.defense or 0)
+        potion_cls = DefensePotion if definition.effect == PotionEffectEnum.DEFENSE else HealthPotion
+        return potion_cls(name=definition.name, price=price, effect=definition.effect or PotionEffectEnum.HEAL, points=definition.points or 0)
+
+class ItemRef:
+    """Lightweight view of one held stack: catalog id, quantity and the stack's price override"""
+    __slots__ = ('catalog_id', 'quantity', 'price')
+
+    def __init__(self, catalog_id: int, quantity: int = 1, price: Optional[int] = None):
+        self.catalog_id = catalog_id
+        self.quantity = quantity
+        self.price = price # None = catalog base price
+
+    def __repr__(self):
+        return f"ItemRef(catalog_id={self.catalog_id}, quantity={self.quantity}, price={self.price})"
+
+class CompactInventory:
+    """
+    Array backed inventory for the many small (player) inventories
+    - parallel arrays of catalog ids and quantities, 4 bytes each per held item
+    - catalog id -> slot dict, allocated with the first item: O(1) lookup, add and remove (the last slot is moved
+      into a removed one, so the iteration order is not the insertion order)
+    - price overrides are sparse and only allocated when used, keyed by catalog id: one price per held stack,
+      units of the same item can not be priced differently
+    - standalone: not used by the live player inventory (see the module docstring)
+    """
+    __slots__ = ('catalog', 'gold', '_ids', '_quantities', '_slots', '_prices')
+
+    def __init__(self, catalog: ItemCatalog, gold: int = 0):
+        self.catalog = catalog
+        self.gold = gold
+        self._ids = array('I')
+        self._quantities = array('I')
+        self._slots: Optional[Dict[int, int]] = None
+        self._prices: Optional[Dict[int, int]] = None
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self) -> Iterator[ItemRef]:
+        for catalog_id, quantity in zip(self._ids, self._quantities):
+            yield ItemRef(catalog_id, quantity, self._prices.get(catalog_id) if self._prices else None)
+
+    def __contains__(self, catalog_id: int) -> bool:
+        return self._slot(catalog_id) >= 0
+
+    def _slot(self, catalog_id: int) -> int:
+        return self._slots.get(catalog_id, -1) if self._slots else -1
+
+    def quantity(self, catalog_id: int) -> int:
+        slot = self._slot(catalog_id)
+        return self._quantities[slot] if slot >= 0 else 0
+
+    def price(self, catalog_id: int) -> int:
+        if self._prices and catalog_id in self._prices:
+            return self._prices[catalog_id]
+        return self.catalog.get(catalog_id).base_price
+
+    def add(self, catalog_id: int, quantity: int = 1, price: Optional[int] = None) -> None:
+        slot = self._slot(catalog_id)
+        if slot >= 0:
+            self._quantities[slot] += quantity
+        else:
+            if self._slots is None:
+                self._slots = {}
+            self._slots[catalog_id] = len(self._ids)
+            self._ids.append(catalog_id)
+            self._quantities.append(quantity)
+        if price is not None:
+            if self._prices is None:
+                self._prices = {}
+            self._prices[catalog_id] = price
+
+    def remove(self, catalog_id: int, quantity: int = 1) -> None:
+        slot = self._slot(catalog_id)
+        if slot < 0 or self._quantities[slot] < quantity:
+            raise ValueError(f"Not enough {catalog_id} in inventory.")
+        self._quantities[slot] -= quantity
+        if self._quantities[slot] == 0:
+            ## move the last stack into the freed slot
+            last_id, last_quantity = self._ids.pop(), self._quantities.pop()
+            del self._slots[catalog_id]
+            if last_id != catalog_id:
+                self._ids[slot], self._quantities[slot] = last_id, last_quantity
+                self._slots[last_id] = slot
+            if self._prices:
+                self._prices.pop(catalog_id, None)
@@ -0,0 +1,212 @@
+"""
+Prebuilt binary item catalog, read through mmap
+- fixed size records + a string table, so any record is decoded on its own
+- precomputed indexes by item type, rarity and price band, each a list of record ids sorted by price
+- opening a catalog only reads the header and index directory: cold start does not grow with catalog size
+
+File layout
+    header      MAGIC, version, record count, offsets of the sections below
+    directory   one entry per index: (dimension, value, ids offset, prices offset, count)
+    records     RECORD struct per item, record position == catalog id
+    indexes     uint32 record ids + uint32 prices per index, sorted by price
+    strings     utf-8 item keys and names
+"""
+
+import mmap
+import bisect
+import struct
+from typing import Iterable, List, Optional, Sequence
+from game.items.items import ItemTypeEnum, ItemRarityEnum, PotionEffectEnum
+from game.items.catalog import ItemDefinition
+
+MAGIC = b'TQIC'
+VERSION = 1
+
+HEADER = struct.Struct('<4sIIIIII') # magic, version, n_records, n_index, records offset, strings offset, n price bands
+DIRECTORY_ENTRY = struct.Struct('<BBxxIII') # dimension, value, ids offset, prices offset, count
+RECORD = struct.Struct('<IBBBxIiiiIIII') # id, type, rarity, effect, base_price, damage, defense, points, key off/len, name off/len
+
+NO_STAT = -2**31
+
+## index dimensions
+ALL, BY_TYPE, BY_RARITY, BY_PRICE_BAND = 0, 1, 2, 3
+
+# upper bounds (exclusive) of each price band, the last band is open ended
+DEFAULT_PRICE_BANDS = (10, 50, 100, 500, 1000, 5000)
+
+def price_band_of(price: int, bands: Sequence[int] = DEFAULT_PRICE_BANDS) -> int:
+    return bisect.bisect_right(bands, price)
+
+def build_catalog_file(definitions: Iterable[ItemDefinition], path: str, price_bands: Sequence[int] = DEFAULT_PRICE_BANDS) -> int:
+    """Write a binary catalog, catalog ids are reassigned to the record positions. Return the number of records"""
+    definitions = list(definitions)
+    n = len(definitions)
+
+    ## string table
+    strings = bytearray()
+    def add_string(text: str):
+        data = text.encode('utf-8')
+        offset = len(strings)
+        strings.extend(data)
+        return offset, len(data)
+
+    records = bytearray()
+    for record_id, d in enumerate(definitions):
+        key_off, key_len = add_string(d.key)
+        name_off, name_len = add_string(d.name)
+        records += RECORD.pack(
+            record_id, d.type.value, d.rarity.value, d.effect.value if d.effect else 0, d.base_price,
+            NO_STAT if d.damage is None else d.damage,
+            NO_STAT if d.defense is None else d.defense,
+            NO_STAT if d.points is None else d.points,
+            key_off, key_len, name_off, name_len,
+        )
+
+    ## indexes, every index is sorted by price
+    by_price = sorted(range(n), key=lambda i: (definitions[i].base_price, i))
+    groups = {(ALL, 0): by_price}
+    for i in by_price:
+        d = definitions[i]
+        groups.setdefault((BY_TYPE, d.type.value), []).append(i)
+        groups.setdefault((BY_RARITY, d.rarity.value), []).append(i)
+        groups.setdefault((BY_PRICE_BAND, price_band_of(d.base_price, price_bands)), []).append(i)
+
+    directory_offset = HEADER.size + 4 * len(price_bands)
+    records_offset = directory_offset + DIRECTORY_ENTRY.size * len(groups)
+    offset = records_offset + len(records)
+
+    directory = bytearray()
+    index_data = bytearray()
+    for (dimension, value), ids in sorted(groups.items()):
+        ids_offset = offset + len(index_data)
+        index_data += struct.pack(f'<{len(ids)}I', *ids)
+        prices_offset = offset + len(index_data)
+        index_data += struct.pack(f'<{len(ids)}I', *(definitions[i].base_price for i in ids))
+        directory += DIRECTORY_ENTRY.pack(dimension, value, ids_offset, prices_offset, len(ids))
+
+    strings_offset = offset + len(index_data)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, n, len(groups), records_offset, strings_offset, len(price_bands)))
+        f.write(struct.pack(f'<{len(price_bands)}I', *price_bands))
+        f.write(directory)
+        f.write(records)
+        f.write(index_data)
+        f.write(strings)
+    return n
+
+class MappedCatalog:
+    """Read-only item catalog backed by a memory mapped catalog file"""
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self._n, n_index, self._records_offset, self._strings_offset, n_bands = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} item catalog.")
+        self.price_bands = struct.unpack_from(f'<{n_bands}I', self._mm, HEADER.size)
+
+        ## only the (small) index directory is read up front
+        self._view = memoryview(self._mm)
+        self._indexes = {}
+        directory_offset = HEADER.size + 4 * n_bands
+        for i in range(n_index):
+            dimension, value, ids_offset, prices_offset, count = DIRECTORY_ENTRY.unpack_from(self._mm, directory_offset + i * DIRECTORY_ENTRY.size)
+            self._indexes[(dimension, value)] = (ids_offset, prices_offset, count)
+
+    def __len__(self):
+        return self._n
+
+    def close(self):
+        self._view.release()
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _index(self, dimension: int, value: int):
+        """(record ids, prices) of an index, both uint32 views into the mapped file"""
+        entry = self._indexes.get((dimension, value))
+        if not entry:
+            return (), ()
+        ids_offset, prices_offset, count = entry
+        return (
+            self._view[ids_offset:ids_offset + 4 * count].cast('I'),
+            self._view[prices_offset:prices_offset + 4 * count].cast('I'),
+        )
+
+    def _string(self, offset: int, length: int) -> str:
+        start = self._strings_offset + offset
+        return str(self._mm[start:start + length], 'utf-8')
+
+    def _record_fields(self, catalog_id: int) -> tuple:
+        """Raw RECORD fields of a record, nothing decoded"""
+        return RECORD.unpack_from(self._mm, self._records_offset + catalog_id * RECORD.size)
+
+    def get(self, catalog_id: int) -> ItemDefinition:
+        if not 0 <= catalog_id < self._n:
+            raise KeyError(catalog_id)
+        (record_id, item_type, rarity, effect, base_price, damage, defense, points,
+         key_off, key_len, name_off, name_len) = self._record_fields(catalog_id)
+        # data was validated when the catalog was built
+        return ItemDefinition.model_construct(
+            id=record_id,
+            key=self._string(key_off, key_len),
+            name=self._string(name_off, name_len),
+            type=ItemTypeEnum(item_type),
+            rarity=ItemRarityEnum(rarity),
+            base_price=base_price,
+            damage=None if damage == NO_STAT else damage,
+            defense=None if defense == NO_STAT else defense,
+            effect=PotionEffectEnum(effect) if effect else None,
+            points=None if points == NO_STAT else points,
+        )
+
+    def query(
+        self,
+        item_type: Optional[ItemTypeEnum] = None,
+        rarity: Optional[ItemRarityEnum] = None,
+        price_band: Optional[int] = None,
+        min_price: Optional[int] = None,
+        max_price: Optional[int] = None,
+        limit: Optional[int] = None,
+        descending: bool = False,
+    ) -> List[ItemDefinition]:
+        """Items matching all given filters, ordered by price"""
+        ## start from the smallest matching index, it is already sorted by price
+        candidates = [(ALL, 0)]
+        if item_type is not None:
+            candidates.append((BY_TYPE, item_type.value))
+        if rarity is not None:
+            candidates.append((BY_RARITY, rarity.value))
+        if price_band is not None:
+            candidates.append((BY_PRICE_BAND, price_band))
+        if any(key not in self._indexes for key in candidates):
+            return []
+        key = min(candidates, key=lambda key: self._indexes[key][2])
+        ids, prices = self._index(*key)
+
+        ## price range by binary search on the index's price column
+        lo = 0 if min_price is None else bisect.bisect_left(prices, min_price)
+        hi = len(ids) if max_price is None else bisect.bisect_right(prices, max_price)
+        positions = range(hi - 1, lo - 1, -1) if descending else range(lo, hi)
+
+        ## remaining filters are checked on the raw records, only matches are decoded
+        results = []
+        for pos in positions:
+            if limit is not None and len(results) >= limit:
+                break
+            catalog_id = ids[pos]
+            fields = self._record_fields(catalog_id)
+            if item_type is not None and fields[1] != item_type.value:
+                continue
+            if rarity is not None and fields[2] != rarity.value:
+                continue
+            if price_band is not None and price_band_of(fields[4], self.price_bands) != price_band:
+                continue
+            results.append(self.get(catalog_id))
+        return results
@@ -1,16 +1,12 @@
 import instructor
 from pydantic import Field
-from typing import List, Any
+from typing import List, Any, Mapping
 from game.npc.merchant.react.models import *
 from atomic_agents.agents.base_agent import BaseIOSchema
 from atomic_agents.lib.components.system_prompt_generator import SystemPromptGenerator
 from game.npc.merchant.react.llm_client import llm
 from atomic_agents.agents.base_agent import BaseAgent, BaseAgentConfig, BaseIOSchema
 
-'''
-NOT IN USE
-'''
-
 class ActionConfirmationInputSchema(BaseIOSchema):
     """ Action Confirm Message Input Schema """
     current_state: State = Field(..., description="Current state of the NPC")
@@ -57,3 +53,27 @@ action_confirm_agent = BaseAgent(
     ) 
 )
 
+def generate_confirmation_template(state: State, action: Action, fields: Mapping[str, str]) -> str:
+    """
+    A reusable confirmation prompt with {placeholders} for the values filled in at send time.
+    Stateless (does not touch the agent's memory), so it can run in background threads.
+    """
+    user_input = ActionConfirmationInputSchema(
+        current_state=state,
+        action=action,
+        npc_knowledge_base=ProtectedKnowledgeBase(quests=[], secrets=[], generic_info=[]),
+        context={
+            "template_placeholders": {f"{{{field}}}": description for field, description in fields.items()},
+            "instruction": "Write the message as a template: use every placeholder exactly once, verbatim with its braces, and no other braces.",
+        },
+    )
+    response = action_confirm_agent.client.chat.completions.create(
+        messages=[
+            {"role": "system", "content": action_confirm_agent.system_prompt_generator.generate_prompt()},
+            {"role": "user", "content": user_input.model_dump_json()},
+        ],
+        model=action_confirm_agent.model,
+        response_model=ActionConfirmationOutputSchema,
+        temperature=0.9, # variety across the pool
+    )
+    return response.response
@@ -1,10 +1,11 @@
 import instructor
 from pydantic import Field
-from typing import List
+from typing import List, Tuple, Type
 from game.npc.merchant.react.models import *
 from atomic_agents.agents.base_agent import BaseAgent, BaseAgentConfig, BaseIOSchema
 from atomic_agents.lib.components.system_prompt_generator import SystemPromptGenerator
 from game.npc.merchant.react.llm_client import llm
+from game.npc.merchant.react.agents.constrained import constrained_schema, track_validation
 
 class ActionDetectionInputSchema(BaseIOSchema):
     """Input Schema for Action Detection"""
@@ -30,6 +31,7 @@ action_detection_prompt = SystemPromptGenerator(
     ],
     output_instructions=[
         "Only choose an action if it is an appropriate response to the user's message.",
+        "Answer 'none' if no available action is an appropriate response.",
         "Assign reasonable confidence scores (0.0 to 1.0) based on how relative the message is to the selected action.",
     ]
 )
@@ -45,6 +47,12 @@ action_detection_agent = BaseAgent(
         output_schema=ActionDetectionOutputSchema,
         memory=None,
         temperature=0,  # Low temperature for more deterministic intent detection
+        model_api_parameters={'max_retries': 2},  # re-ask when the label is not in the output schema
         max_tokens=None,
     ) 
-)
\ No newline at end of file
+)
+track_validation(action_detection_agent, 'action_detection')
+
+def action_detection_output_schema(action_names: Tuple[str, ...]) -> Type[ActionDetectionOutputSchema]:
+    """Output schema that only accepts the given actions (or 'none'), cached per set of actions"""
+    return constrained_schema(ActionDetectionOutputSchema, 'detected_action', action_names)
@@ -0,0 +1,53 @@
+"""
+Per-call output schemas whose label fields only accept valid labels
+- the schema is generated once per label set (e.g. per state) and cached
+- validation failures (invented labels) are retried by instructor and counted in metrics
+- when the retries run out the call counts as an invalid label and returns the 'none' label with zero confidence
+"""
+
+from functools import lru_cache
+from typing import Literal, Tuple, Type, get_origin
+from instructor.exceptions import InstructorRetryException
+from pydantic import Field, create_model
+from atomic_agents.agents.base_agent import BaseAgent, BaseIOSchema
+from game.npc.merchant.react.metrics import metrics
+
+NO_LABEL = 'none'
+
+@lru_cache(maxsize=None)
+def constrained_schema(base: Type[BaseIOSchema], field: str, labels: Tuple[str, ...]) -> Type[BaseIOSchema]:
+    """Subclass of base where `field` is a Literal of labels + 'none'"""
+    description = base.model_fields[field].description
+    return create_model(
+        base.__name__,
+        __base__=base,
+        __doc__=base.__doc__,
+        **{field: (Literal[labels + (NO_LABEL,)], Field(..., description=description))},
+    )
+
+def track_validation(agent: BaseAgent, name: str) -> None:
+    """Count completion attempts and validation errors of an agent's client"""
+    if not hasattr(agent.client, 'on'):
+        return
+    agent.client.on('completion:kwargs', lambda *args, **kwargs: metrics.incr(f'{name}.attempts'))
+    agent.client.on('parse:error', lambda error: metrics.incr(f'{name}.validation_errors'))
+
+def run_with_schema(agent: BaseAgent, user_input: BaseIOSchema, output_schema: Type[BaseIOSchema], name: str) -> BaseIOSchema:
+    """BaseAgent.run with a per-call output schema (the shared agent is left untouched)"""
+    metrics.incr(f'{name}.calls')
+    agent.memory.initialize_turn()
+    agent.current_user_input = user_input
+    agent.memory.add_message('user', user_input)
+    try:
+        response = agent.get_response(response_model=output_schema)
+    except InstructorRetryException as e:
+        metrics.incr(f'{name}.invalid_labels')
+        print(f"[WARN] {name}: no valid label after {e.n_attempts} attempts, using '{NO_LABEL}'")
+        return no_label_response(output_schema)
+    agent.memory.add_message('assistant', response)
+    return response
+
+def no_label_response(output_schema: Type[BaseIOSchema]) -> BaseIOSchema:
+    """Response of a constrained schema with the 'none' label and zero confidence"""
+    label_field = next(name for name, field in output_schema.model_fields.items() if get_origin(field.annotation) is Literal)
+    return output_schema.model_construct(**{label_field: NO_LABEL, 'confidence_score': 0.0})
@@ -20,7 +20,7 @@ class KnowledgeBaseWorkerInputSchema(BaseIOSchema):
     detected_condition: FewShotIntent | None = Field(..., description="Detected transition condition")
     detected_action: str | None = Field(..., description="Detected action")
     npc_knowledge_base: ProtectedKnowledgeBase = Field(..., description="Knowledge base of the NPC in the curent state.")
-    npc_inventory: Inventory = Field(..., description="The npc's inventory")
+    npc_inventory: InventoryPage = Field(..., description="Page of the npc's inventory")
 
 class KnowledgeBaseWorkerOutputSchema(BaseIOSchema):
     """Output schema for the Knowledge Base Worker."""
@@ -1,6 +1,6 @@
 import instructor
-from pydantic import Field
-from typing import List
+from pydantic import Field, field_validator
+from typing import Dict, List
 from game.npc.merchant.react.models import *
 from game.npc.merchant.react.models import State, ProtectedKnowledgeBase, Inventory, FewShotIntent
 from atomic_agents.agents.base_agent import BaseAgent, BaseAgentConfig, BaseIOSchema
@@ -16,12 +16,20 @@ class ReflectionReasonInputSchema(BaseIOSchema):
     previous_step_reasoning: str | None = Field(..., description="Reasoning behind the previous step.")
     npc_knowledge_base: ProtectedKnowledgeBase = Field(..., description="Knowledge base of the NPC in the curent state.")
     previous_conversation: str = Field(..., description="chat history between user and npc")
+    message_signals: List[str] = Field(default_factory=list, description="Hints from a local analysis of the player input (sentiment, missing cues), not decisions")
+
+REASONING_MAX_CHARS = 300
 
 class ReflectionReasonOutputSchema(BaseIOSchema):
     """Output schema for the Reflection Reason Agent."""
-    transition_condition_approval: ApprovalWrapper[FewShotIntent] = Field(..., description="Approval for the detected transition condition")
-    action_approval: ApprovalWrapper[Action] = Field(..., description="Approval for the detected action")
-    reasoning: str = Field(..., description="Reasoning behind the decision")
+    approvals: Dict[str, bool] = Field(..., description="Approval of the detected transition condition and action, keyed by their name")
+    reasoning: str = Field(..., description=f"Short reasoning behind the decision (at most {REASONING_MAX_CHARS} characters)")
+
+    @field_validator('reasoning')
+    @classmethod
+    def bound_reasoning(cls, reasoning: str) -> str:
+        # truncate rather than fail validation, a retry would cost more than it saves
+        return reasoning[:REASONING_MAX_CHARS]
 
 reflection_reason_prompt = SystemPromptGenerator(
     background=[
@@ -29,13 +37,14 @@ reflection_reason_prompt = SystemPromptGenerator(
         "Your task is to decide whether the NPC should take a detected transition condition for state",
         "transition and whether the NPC should execute a detected action.",
         "You have access to the player input, current state, detected transition condition, detected action,",
-        "previous step reasoning, NPC's knowledge base, and previous conversation history."
+        "previous step reasoning, NPC's knowledge base, previous conversation history and hints about the player input."
     ],
 
     steps=[
         "Take into account of the player input and previous conversation history.",
         "Analyze the player input in the context of previous conversations and the current state of the NPC.",
         "Consider the detected transition condition and action with the previous step reasoning.",
+        "Weigh the message signals as hints, e.g. a detected bribe without any offer of gold is less likely to be a bribe.",
         "Decide whether the NPC should take the detected transition condition for state transition.",
         "Decide whether the NPC should execute the detected action.",
         "Provide reasoning behind the decisions made."
@@ -43,7 +52,8 @@ reflection_reason_prompt = SystemPromptGenerator(
 
     output_instructions=[
         "Ensure the decisions align with the NPC's current state and previous interactions.",
-        "Provide clear and concise reasoning for the decisions made.",
+        "Return approvals keyed by the name of the detected transition condition and action, e.g. {\"trade\": true}. Do not repeat their descriptions or examples.",
+        "Provide clear and concise reasoning for the decisions made, one or two sentences.",
         "Consider the impact of the decisions on the NPC's traits and the overall game experience."
     ],
 )
@@ -56,6 +66,7 @@ reflection_reason_agent = BaseAgent(
         model='gpt-4o-mini',
         system_prompt_generator=reflection_reason_prompt,
         input_schema=ReflectionReasonInputSchema,
-        output_schema=ReflectionReasonOutputSchema
+        output_schema=ReflectionReasonOutputSchema,
+        model_api_parameters={'max_tokens': 200},  # approvals + short reasoning fit well within this
     )
 )
\ No newline at end of file
@@ -1,10 +1,11 @@
 import instructor
 from pydantic import Field
-from typing import List
+from typing import List, Tuple, Type
 from game.npc.merchant.react.models import *
 from atomic_agents.agents.base_agent import BaseAgent, BaseAgentConfig, BaseIOSchema
 from atomic_agents.lib.components.system_prompt_generator import SystemPromptGenerator
 from game.npc.merchant.react.llm_client import llm
+from game.npc.merchant.react.agents.constrained import constrained_schema, track_validation
 
 class TransitionDetectionInputSchema(BaseIOSchema):
     """Input schema for the Intent Detection Agent."""
@@ -33,6 +34,7 @@ intent_detection_prompt = SystemPromptGenerator(
     ],
     output_instructions=[
         "Only detect intents that are truly present in the player's message.",
+        "Answer 'none' if no available condition matches the player's message.",
         "Assign reasonable confidence scores (0.0 to 1.0) based on how closely the message matches the examples.",
     ],
 )
@@ -48,6 +50,12 @@ transition_detection_agent = BaseAgent(
         output_schema=TransitionDetectionOutputSchema,
         memory=None,
         temperature=0,  # Low temperature for more deterministic intent detection
+        model_api_parameters={'max_retries': 2},  # re-ask when the label is not in the output schema
         max_tokens=None,
     ) 
-)
\ No newline at end of file
+)
+track_validation(transition_detection_agent, 'transition_detection')
+
+def transition_detection_output_schema(condition_names: Tuple[str, ...]) -> Type[TransitionDetectionOutputSchema]:
+    """Output schema that only accepts the given conditions (or 'none'), cached per set of conditions"""
+    return constrained_schema(TransitionDetectionOutputSchema, 'detected_condition', condition_names)
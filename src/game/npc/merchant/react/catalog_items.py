@@ -0,0 +1,30 @@
+"""
+Item catalog definitions as react models
+- game.items knows nothing about the react merchant, the conversion to its Item / Inventory lives here
+"""
+
+from typing import Optional
+from game.items.items import ItemTypeEnum
+from game.items.catalog import CompactInventory, ItemDefinition
+from game.npc.merchant.react.models import Inventory, Item
+
+REACT_ITEM_TYPES = {
+    ItemTypeEnum.WEAPON: 'weapon',
+    ItemTypeEnum.ARMOR: 'armour',
+    ItemTypeEnum.POTION: 'potion',
+}
+
+def to_react_item(definition: ItemDefinition, price: Optional[int] = None) -> Item:
+    """Materialize a react item model, e.g. for prompts and react inventories"""
+    return Item(
+        name=definition.name,
+        type=REACT_ITEM_TYPES[definition.type],
+        price=definition.base_price if price is None else price,
+    )
+
+def to_react_inventory(inventory: CompactInventory, owner: Optional[str] = None) -> Inventory:
+    """Materialize a react Inventory from a compact one (e.g. for prompts or trading)"""
+    react_inventory = Inventory(gold=inventory.gold, owner=owner)
+    for ref in inventory:
+        react_inventory.add(to_react_item(inventory.catalog.get(ref.catalog_id), ref.price), ref.quantity)
+    return react_inventory
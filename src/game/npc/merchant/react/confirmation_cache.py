@@ -0,0 +1,109 @@
+"""
+Cached action confirmation prompts
+- a small pool of template variants per (npc, state, action), e.g. "For {price}, I may remember something. Deal?"
+- variants are generated in the background (at startup or on the first miss) and filled with the current values at send time
+- while a pool is empty a static template is used, actions without one fall back to the agent
+"""
+
+import random
+import string
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+from game.npc.merchant.react.models import Action, State
+from game.npc.merchant.react.metrics import metrics
+
+# placeholders a template of each action must use, with a description for the template generator
+CONFIRMATION_FIELDS: Dict[str, Dict[str, str]] = {
+    'take_bribe': {'price': "price asked for the information, e.g. '5 gold coins'"},
+    'give_quest': {'quest': "name of the offered quest", 'reward': "reward of the quest in gold coins"},
+    'trade': {'item_count': "number of items for sale", 'min_price': "price of the cheapest item in gold coins"},
+}
+
+STATIC_TEMPLATES: Dict[str, str] = {
+    'take_bribe': "For {price}, I might remember something useful. Do we have a deal?",
+    'give_quest': "I have a task for you: {quest}. It pays {reward} gold coins. Will you take it on?",
+    'trade': "I have {item_count} items that may interest you, starting at {min_price} gold coins. Shall we trade?",
+}
+
+CacheKey = Tuple[str, str, str] # npc id, state name, action name
+TemplateGenerator = Callable[[State, Action, Mapping[str, str]], str]
+
+def template_fields(template: str) -> set:
+    return {field for _, field, _, _ in string.Formatter().parse(template) if field is not None}
+
+def is_valid_template(template: str, fields: Mapping[str, str]) -> bool:
+    """Uses exactly the expected placeholders (and nothing else in braces)"""
+    try:
+        return template_fields(template) == set(fields) and bool(template.format_map({field: '' for field in fields}).strip())
+    except (ValueError, KeyError, IndexError):
+        return False
+
+class ConfirmationPromptCache:
+    def __init__(self, generate: TemplateGenerator, pool_size: int = 3, executor: Optional[Executor] = None):
+        self.generate = generate
+        self.pool_size = pool_size
+        self._executor = executor
+        self._pools: Dict[CacheKey, List[str]] = {}
+        self._pending: set = set()
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='confirmation-templates')
+        return self._executor
+
+    def variants(self, npc_id: str, state: State, action: Action) -> List[str]:
+        return list(self._pools.get((npc_id, state.name, action.name), ()))
+
+    def warm(self, npc_id: str, states: Mapping[str, State]) -> None:
+        """Generate the pools of every confirmation action of every state in the background"""
+        for state in states.values():
+            for action in state.available_actions:
+                if action.confirmation_required:
+                    self._schedule(npc_id, state, action)
+
+    def _schedule(self, npc_id: str, state: State, action: Action) -> None:
+        key = (npc_id, state.name, action.name)
+        with self._lock:
+            if key in self._pending or len(self._pools.get(key, ())) >= self.pool_size:
+                return
+            self._pending.add(key)
+        self.executor.submit(self._fill, key, state, action)
+
+    def _fill(self, key: CacheKey, state: State, action: Action) -> None:
+        fields = CONFIRMATION_FIELDS.get(action.name, {})
+        try:
+            for _ in range(self.pool_size):
+                try:
+                    template = self.generate(state, action, fields)
+                except Exception as e:
+                    print(f"[WARN] - Confirmation template generation failed for {key}: {e}")
+                    return
+                if not is_valid_template(template, fields):
+                    metrics.incr('confirmation.invalid_templates')
+                    continue
+                with self._lock:
+                    self._pools.setdefault(key, []).append(template)
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def get(self, npc_id: str, state: State, action: Action, values: Mapping[str, object]) -> Optional[str]:
+        """
+        A filled confirmation prompt: a cached variant, else the static template (the pool is filled in the background).
+        Returns None when neither exists, the caller then asks the agent directly.
+        """
+        pool = self._pools.get((npc_id, state.name, action.name))
+        if pool:
+            metrics.incr('confirmation.hits')
+            return random.choice(pool).format_map(values)
+
+        metrics.incr('confirmation.misses')
+        self._schedule(npc_id, state, action)
+        static = STATIC_TEMPLATES.get(action.name)
+        if static is None:
+            return None
+        metrics.incr('confirmation.static_fallbacks')
+        return static.format_map(values)
@@ -0,0 +1,91 @@
+"""
+Local retrieval index over the NPC knowledge base
+- BM25 over quests, secrets and generic_info entries
+- state based access control is a filter inside the index, entries the state may not see are never scored
+- replaces sending the whole protected knowledge base to the knowledge_base_worker LLM call
+"""
+
+import math
+import heapq
+from typing import Dict, Iterable, List, Literal, Sequence, Set
+from pydantic import BaseModel, Field
+from game.npc.merchant.react.models import KnowledgeBase, NameDescriptionModel, ProtectedKnowledgeBase, Quest, State, text_words
+
+KnowledgeKind = Literal['quests', 'secrets', 'generic_info']
+
+class KnowledgeEntry(BaseModel):
+    kind: KnowledgeKind = Field(..., description="Knowledge base section the entry belongs to")
+    data: Quest | NameDescriptionModel = Field(..., description="The knowledge base entry")
+    allowed_states: List[str] = Field(..., description="States that can access this entry")
+
+    def text(self) -> str:
+        if isinstance(self.data, Quest):
+            return f"{self.data.name} {self.data.description} {self.data.npc_dialog_option or ''}"
+        return f"{self.data.name} {self.data.description}"
+
+def knowledge_entries(knowledge_base: KnowledgeBase) -> List[KnowledgeEntry]:
+    entries = []
+    for kind in ('quests', 'secrets', 'generic_info'):
+        resource = getattr(knowledge_base, kind)
+        entries += [KnowledgeEntry(kind=kind, data=data, allowed_states=resource.allowed_states) for data in resource.data]
+    return entries
+
+def to_protected_knowledge(entries: Iterable[KnowledgeEntry]) -> ProtectedKnowledgeBase:
+    view = {'quests': [], 'secrets': [], 'generic_info': []}
+    for entry in entries:
+        view[entry.kind].append(entry.data)
+    return ProtectedKnowledgeBase(**view)
+
+class KnowledgeIndex:
+    def __init__(self, entries: Sequence[KnowledgeEntry], version: int = 0, k1: float = 1.5, b: float = 0.75):
+        self.entries = list(entries)
+        self.version = version # knowledge base version the index was built from
+        self.k1 = k1
+        self.b = b
+
+        self._postings: Dict[str, Dict[int, int]] = {} # term -> {entry id: term frequency}
+        self._lengths: List[int] = []
+        self._allowed: Dict[str, Set[int]] = {} # state name -> entry ids the state can access
+        for entry_id, entry in enumerate(self.entries):
+            words = text_words(entry.text())
+            self._lengths.append(len(words))
+            for word in words:
+                postings = self._postings.setdefault(word, {})
+                postings[entry_id] = postings.get(entry_id, 0) + 1
+            for state_name in entry.allowed_states:
+                self._allowed.setdefault(state_name, set()).add(entry_id)
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+
+    @classmethod
+    def from_knowledge_base(cls, knowledge_base: KnowledgeBase) -> 'KnowledgeIndex':
+        return cls(knowledge_entries(knowledge_base), version=knowledge_base.version)
+
+    def _idf(self, term: str) -> float:
+        n = len(self._postings.get(term, ()))
+        return math.log(1 + (len(self.entries) - n + 0.5) / (n + 0.5))
+
+    def search(self, query: str, state: State | str, k: int = 5, boost_kinds: Iterable[KnowledgeKind] = (), boost: float = 1.0) -> List[KnowledgeEntry]:
+        """Top k entries for the query that the state can access, entries of boost_kinds score extra"""
+        state_name = state if isinstance(state, str) else state.name
+        allowed = self._allowed.get(state_name, set())
+        scores: Dict[int, float] = {}
+
+        for term in set(text_words(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf(term)
+            for entry_id, tf in postings.items():
+                if entry_id not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[entry_id] / self._avg_length)
+                scores[entry_id] = scores.get(entry_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        boost_kinds = set(boost_kinds)
+        if boost_kinds:
+            for entry_id in allowed:
+                if self.entries[entry_id].kind in boost_kinds:
+                    scores[entry_id] = scores.get(entry_id, 0.0) + boost
+
+        top = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [self.entries[entry_id] for entry_id, _ in top]
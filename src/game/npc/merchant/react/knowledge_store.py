@@ -0,0 +1,291 @@
+"""
+SQLite backed knowledge store shared by many NPCs
+- every knowledge entry (quest, secret, generic info) is stored once, NPCs that share lore reference the same row
+- state protection is an indexed (npc_id, state, knowledge_id) access table, not a field on the entries
+- per npc progress (which quests an npc has given) is kept in its own (npc_id, knowledge_id) table, a shared quest is
+  given separately by every npc that knows it
+- NPCs query their per-state view on demand (StoredKnowledgeBase) instead of holding every entry in memory
+- every npc has its own version, bumped only by writes to entries it can access, so one npc's edit does not
+  invalidate the cached views of the others
+- full text search (FTS5, bm25) gives the same retrieval as KnowledgeIndex without loading the entries, boosted kinds
+  get the same additive score bonus
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import yaml
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from game.npc.merchant.react.models import KnowledgeBase, NameDescriptionModel, ProtectedKnowledgeBase, Quest, State, text_words
+from game.npc.merchant.react.knowledge_index import KnowledgeEntry, KnowledgeKind
+
+KINDS: Tuple[KnowledgeKind, ...] = ('quests', 'secrets', 'generic_info')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS knowledge (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    terms TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS knowledge_access (
+    npc_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    knowledge_id INTEGER NOT NULL REFERENCES knowledge(id),
+    PRIMARY KEY (npc_id, state, knowledge_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS knowledge_access_by_entry ON knowledge_access (knowledge_id);
+CREATE TABLE IF NOT EXISTS quest_given (
+    npc_id TEXT NOT NULL,
+    knowledge_id INTEGER NOT NULL REFERENCES knowledge(id),
+    PRIMARY KEY (npc_id, knowledge_id)
+) WITHOUT ROWID;
+CREATE VIRTUAL TABLE IF NOT EXISTS knowledge_fts USING fts5(terms, content='knowledge', content_rowid='id');
+CREATE TABLE IF NOT EXISTS npc_version (npc_id TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID;
+"""
+
+def _entry_key(kind: str, name: str) -> str:
+    return f"{kind}:{name.strip().lower()}"
+
+## per npc given flag of the selected entries (the npc id is bound as the first parameter of the query)
+GIVEN_JOIN = "LEFT JOIN quest_given g ON g.npc_id = a.npc_id AND g.knowledge_id = k.id"
+
+def _parse(kind: str, payload: str, given: bool = False) -> Quest | NameDescriptionModel:
+    if kind == 'quests':
+        quest = Quest.model_validate_json(payload)
+        quest.is_given = bool(given)
+        return quest
+    return NameDescriptionModel.model_validate_json(payload)
+
+def _payload(kind: str, data: Dict[str, Any]) -> str:
+    """Shared entry payload, without per npc progress"""
+    if kind == 'quests':
+        data = {**data, 'is_given': False}
+    return json.dumps(data)
+
+def _terms(data: Dict[str, Any]) -> str:
+    """Searchable words of an entry, normalized like the query (text_words) so fts matches the same terms"""
+    return ' '.join(text_words(f"{data['name']} {data.get('description', '')} {data.get('npc_dialog_option') or ''}"))
+
+class KnowledgeStore:
+    def __init__(self, path: str = ':memory:'):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def version(self, npc_id: str) -> int:
+        """Bumped on every write to the entries this npc can access, used to invalidate its cached views"""
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM npc_version WHERE npc_id = ?', (npc_id,)).fetchone()
+        return row[0] if row else 0
+
+    def _bump_versions(self, npc_ids: Iterable[str]):
+        self._conn.executemany(
+            'INSERT INTO npc_version (npc_id, value) VALUES (?, 1) ON CONFLICT (npc_id) DO UPDATE SET value = value + 1',
+            [(npc_id,) for npc_id in npc_ids],
+        )
+
+    ## Import
+    def import_records(self, npcs: Dict[str, Dict[str, Dict[str, Any]]]) -> int:
+        """
+        Bulk import, in one transaction. Shape (same as KnowledgeBase, per npc):
+            {npc_id: {kind: {'allowed_states': [...], 'data': [entry, ...]}}}
+        Entries with the same kind and name are stored once, a quest's is_given is recorded for its npc only.
+        Returns the number of access rows written.
+        """
+        entries: Dict[str, Tuple[str, str, str, str]] = {}
+        access: List[Tuple[str, str, str]] = []
+        given: List[Tuple[str, str]] = []
+        for npc_id, knowledge in npcs.items():
+            for kind in KINDS:
+                resource = knowledge.get(kind)
+                if not resource:
+                    continue
+                for data in resource['data']:
+                    data = data.model_dump() if hasattr(data, 'model_dump') else data
+                    key = _entry_key(kind, data['name'])
+                    if key not in entries:
+                        entries[key] = (key, kind, _terms(data), _payload(kind, data))
+                    access += [(npc_id, state, key) for state in resource['allowed_states']]
+                    if kind == 'quests' and data.get('is_given'):
+                        given.append((npc_id, key))
+
+        with self._lock:
+            conn = self._conn
+            conn.execute('BEGIN')
+            try:
+                last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM knowledge').fetchone()[0]
+                conn.executemany('INSERT OR IGNORE INTO knowledge (key, kind, terms, payload) VALUES (?, ?, ?, ?)', entries.values())
+                conn.execute('INSERT INTO knowledge_fts (rowid, terms) SELECT id, terms FROM knowledge WHERE id > ?', (last_id,))
+
+                conn.execute('CREATE TEMP TABLE IF NOT EXISTS import_access (npc_id TEXT, state TEXT, key TEXT)')
+                conn.execute('DELETE FROM import_access')
+                conn.executemany('INSERT INTO import_access VALUES (?, ?, ?)', access)
+                conn.execute("""
+                    INSERT OR IGNORE INTO knowledge_access (npc_id, state, knowledge_id)
+                    SELECT a.npc_id, a.state, k.id FROM import_access a JOIN knowledge k ON k.key = a.key
+                """)
+                conn.execute('DELETE FROM import_access')
+                conn.executemany('INSERT OR IGNORE INTO quest_given (npc_id, knowledge_id) SELECT ?, id FROM knowledge WHERE key = ?', given)
+                self._bump_versions(npcs)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return len(access)
+
+    def import_file(self, path: str) -> int:
+        """Bulk import a JSON or YAML file of import_records shape"""
+        with open(path, encoding='utf-8') as f:
+            if os.path.splitext(path)[1].lower() in ('.yaml', '.yml'):
+                data = yaml.safe_load(f)
+            else:
+                data = json.load(f)
+        return self.import_records(data)
+
+    def import_knowledge_base(self, npc_id: str, knowledge_base: KnowledgeBase) -> int:
+        return self.import_records({npc_id: {kind: getattr(knowledge_base, kind).model_dump() for kind in KINDS}})
+
+    ## Queries
+    def page(self, npc_id: str, state: str, kind: Optional[KnowledgeKind] = None, offset: int = 0, limit: int = 50) -> List[KnowledgeEntry]:
+        """One page of the entries an npc can access in a state"""
+        sql = f"""
+            SELECT k.kind, k.payload, g.knowledge_id IS NOT NULL FROM knowledge_access a JOIN knowledge k ON k.id = a.knowledge_id
+            {GIVEN_JOIN}
+            WHERE a.npc_id = ? AND a.state = ?
+        """
+        params: List[Any] = [npc_id, state]
+        if kind:
+            sql += ' AND k.kind = ?'
+            params.append(kind)
+        sql += ' ORDER BY a.knowledge_id LIMIT ? OFFSET ?'
+        params += [limit, offset]
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [KnowledgeEntry(kind=kind, data=_parse(kind, payload, given), allowed_states=[state]) for kind, payload, given in rows]
+
+    def iter_entries(self, npc_id: str, state: str, kind: Optional[KnowledgeKind] = None, page_size: int = 200) -> Iterator[KnowledgeEntry]:
+        offset = 0
+        while True:
+            entries = self.page(npc_id, state, kind, offset, page_size)
+            yield from entries
+            if len(entries) < page_size:
+                return
+            offset += page_size
+
+    def search(self, npc_id: str, state: str, query: str, k: int = 5, boost_kinds: Iterable[KnowledgeKind] = (), boost: float = 1.0) -> List[KnowledgeEntry]:
+        """Top k entries the npc can access in this state, ranked by bm25 plus `boost` for entries of boost_kinds"""
+        boost_kinds = list(boost_kinds)
+        words = text_words(query)
+        if not words and not boost_kinds:
+            return []
+
+        ## bm25() is lower for better matches, the score is its negation so the boost adds like in KnowledgeIndex
+        is_boosted = f"k.kind IN ({','.join('?' * len(boost_kinds))})" if boost_kinds else "0"
+        matches = "SELECT rowid AS id, -bm25(knowledge_fts) AS score FROM knowledge_fts WHERE knowledge_fts MATCH ?" if words else "SELECT NULL AS id, 0.0 AS score WHERE 0"
+        params: List[Any] = [' OR '.join(f'"{word}"' for word in words)] if words else []
+        params += [*boost_kinds, boost, npc_id, state, *boost_kinds, k]
+        with self._lock:
+            rows = self._conn.execute(f"""
+                WITH matches AS ({matches})
+                SELECT k.kind, k.payload, g.knowledge_id IS NOT NULL,
+                    COALESCE(m.score, 0.0) + CASE WHEN {is_boosted} THEN ? ELSE 0.0 END AS score
+                FROM knowledge_access a JOIN knowledge k ON k.id = a.knowledge_id
+                LEFT JOIN matches m ON m.id = k.id
+                {GIVEN_JOIN}
+                WHERE a.npc_id = ? AND a.state = ? AND (m.id IS NOT NULL OR {is_boosted})
+                ORDER BY score DESC, k.id LIMIT ?
+            """, params).fetchall()
+        return [KnowledgeEntry(kind=kind, data=_parse(kind, payload, given), allowed_states=[state]) for kind, payload, given, _ in rows]
+
+    def mark_quest_given(self, npc_id: str, quest: Quest) -> None:
+        """Record that this npc gave the quest, other npcs sharing it are not affected"""
+        with self._lock:
+            self._conn.execute('BEGIN')
+            self._conn.execute(
+                'INSERT OR IGNORE INTO quest_given (npc_id, knowledge_id) SELECT ?, id FROM knowledge WHERE key = ?',
+                (npc_id, _entry_key('quests', quest.name)),
+            )
+            self._bump_versions([npc_id])
+            self._conn.execute('COMMIT')
+
+    def update_entry(self, kind: KnowledgeKind, data: Quest | NameDescriptionModel) -> None:
+        """Rewrite a shared entry and its full text row, only the npcs that can access it see a new version"""
+        data = data.model_dump()
+        with self._lock:
+            conn = self._conn
+            row = conn.execute('SELECT id, terms FROM knowledge WHERE key = ?', (_entry_key(kind, data['name']),)).fetchone()
+            if row is None:
+                raise KeyError(f"No {kind} entry named '{data['name']}'.")
+            entry_id, old_terms = row
+            terms = _terms(data)
+            conn.execute('BEGIN')
+            try:
+                ## external content table: the old row is removed with the text it was indexed with
+                conn.execute("INSERT INTO knowledge_fts (knowledge_fts, rowid, terms) VALUES ('delete', ?, ?)", (entry_id, old_terms))
+                conn.execute('UPDATE knowledge SET terms = ?, payload = ? WHERE id = ?', (terms, _payload(kind, data), entry_id))
+                conn.execute('INSERT INTO knowledge_fts (rowid, terms) VALUES (?, ?)', (entry_id, terms))
+                npc_ids = [npc_id for npc_id, in conn.execute('SELECT DISTINCT npc_id FROM knowledge_access WHERE knowledge_id = ?', (entry_id,))]
+                self._bump_versions(npc_ids)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+class StoredKnowledgeBase:
+    """Per NPC view of a KnowledgeStore, drop-in for KnowledgeBase in the merchant"""
+    def __init__(self, store: KnowledgeStore, npc_id: str):
+        self.store = store
+        self.npc_id = npc_id
+        self._protected_views: Dict[str, Tuple[int, ProtectedKnowledgeBase]] = {}
+        self._protected_json: Dict[str, Tuple[int, str]] = {}
+
+    @property
+    def version(self) -> int:
+        return self.store.version(self.npc_id)
+
+    def invalidate(self) -> None:
+        self._protected_views.clear()
+        self._protected_json.clear()
+
+    def mark_quest_given(self, quest: Quest) -> None:
+        quest.is_given = True
+        self.store.mark_quest_given(self.npc_id, quest)
+
+    def get_protected_knowledge(self, state: State) -> ProtectedKnowledgeBase:
+        """Return a protected knowledge base for the given state (queried on demand, cached until this npc's entries change)"""
+        version = self.version
+        cached = self._protected_views.get(state.name)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        view = {kind: [] for kind in KINDS}
+        for entry in self.store.iter_entries(self.npc_id, state.name):
+            view[entry.kind].append(entry.data)
+        protected = ProtectedKnowledgeBase(**view)
+        self._protected_views[state.name] = (version, protected)
+        return protected
+
+    def get_protected_knowledge_json(self, state: State) -> str:
+        """Serialized protected view for prompts, cached under the same npc version as the view"""
+        version = self.version
+        cached = self._protected_json.get(state.name)
+        if cached and cached[0] == version:
+            return cached[1]
+        serialized = self.get_protected_knowledge(state).model_dump_json()
+        self._protected_json[state.name] = (version, serialized)
+        return serialized
+
+    def search(self, query: str, state: State | str, k: int = 5, boost_kinds: Iterable[KnowledgeKind] = ()) -> List[KnowledgeEntry]:
+        """Same contract as KnowledgeIndex.search, answered by the store"""
+        state_name = state if isinstance(state, str) else state.name
+        return self.store.search(self.npc_id, state_name, query, k, boost_kinds)
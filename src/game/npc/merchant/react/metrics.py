@@ -0,0 +1,33 @@
+"""
+Process wide counters for the react pipeline (agent calls, validation retries, invalid labels, ...)
+"""
+
+import threading
+from collections import Counter
+from typing import Dict
+
+class Metrics:
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counts[name] += amount
+
+    def get(self, name: str) -> int:
+        return self._counts[name]
+
+    def ratio(self, numerator: str, denominator: str) -> float:
+        total = self._counts[denominator]
+        return self._counts[numerator] / total if total else 0.0
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+metrics = Metrics()
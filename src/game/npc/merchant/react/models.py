@@ -1,6 +1,11 @@
 import time
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Literal, TypeVar, Generic
+import bisect
+import heapq
+import itertools
+import threading
+from functools import cached_property
+from pydantic import BaseModel, Field, ConfigDict, PrivateAttr, model_validator
+from typing import Dict, List, Literal, Set, Tuple, TypeVar, Generic
 
 T = TypeVar('T')
 
@@ -66,7 +71,7 @@ class NpcConfig(BaseModel):
     transitions: List[StateTransition]
 ## CHAT HISTORY
 class Message(BaseModel):
-    timestamp: float = Field(default=time.time())
+    timestamp: float = Field(default_factory=time.time)
     role: str = Field(..., description="Who this message belongs to (NPC or player).")
     message: str = Field(..., description="Chat message")
 
@@ -74,7 +79,8 @@ class Message(BaseModel):
         return f"{self.role}: {self.message}"
 
 class ChatHistory:
-    messages: List[Message] = []
+    def __init__(self):
+        self.messages: List[Message] = [] # per instance, every npc has its own conversation
 
     def add_player(self, message):
         self.messages.append(Message(role='player', message=message))
@@ -93,13 +99,241 @@ class ChatHistory:
         
 ## GAME
 class Item(BaseModel):
+    ## immutable: the id is derived from the fields and keys the inventory stacks and indexes
+    model_config = ConfigDict(frozen=True)
+
     name: str = Field(..., description='Name of the item')
     type: Literal['weapon', 'armour', 'potion'] = Field(..., description='Item type (weapon, armour or potion).')
     price: int = Field(..., description='Price of item in gold coins.')
 
+    @cached_property
+    def id(self) -> str:
+        """Stable id of the item, identical items (same name, type and price) share the same id"""
+        return f"{self.name.strip().lower().replace(' ', '_')}:{self.type}:{self.price}"
+
+class ItemStack(BaseModel):
+    item: Item = Field(..., description='Held item.')
+    quantity: int = Field(default=1, description='Number of identical items held.')
+
+class InventoryPage(BaseModel):
+    items: List[ItemStack] = Field(..., description="Items on this page, best matches first.")
+    total: int = Field(..., description="Total number of items matching the query.")
+    page: int = Field(default=0, description="Page number (from 0).")
+    page_size: int = Field(..., description="Maximum number of items per page.")
+
+STOP_WORDS = {'the', 'and', 'you', 'your', 'for', 'are', 'what', 'have', 'has', 'with', 'that', 'this', 'can', 'any', 'some', 'how', 'want', 'please'}
+
+def text_words(text: str) -> List[str]:
+    """Lower-cased words of a text (naive singular form), short and filler words dropped"""
+    words = ''.join(c if c.isalnum() else ' ' for c in text.lower()).split()
+    return [word[:-1] if len(word) > 3 and word.endswith('s') else word for word in words if len(word) > 2 and word not in STOP_WORDS]
+
+def text_tokens(text: str) -> Set[str]:
+    return set(text_words(text))
+
 class Inventory(BaseModel):
-    items: List[Item] = Field(..., description="Currently held items.")
+    """
+    Stacked inventory indexed by item id
+    - O(1) lookup by item id, O(1) add and remove on an already held stack
+    - secondary indexes by item type and by price; the price index is a sorted list, so a new kind of item or the
+      last unit of one is an O(n) insert or delete (n = distinct items held)
+    """
+    stacks: Dict[str, ItemStack] = Field(default_factory=dict, description="Currently held items keyed by item id.")
     gold: int = Field(..., description="Currently held gold coins (in-game currency).")
+    owner: str | None = Field(default=None, exclude=True, description="Id of the player or npc holding this inventory, used by the transaction ledger.")
+
+    _by_type: Dict[str, Set[str]] = PrivateAttr(default_factory=dict)
+    _by_price: List[Tuple[int, str]] = PrivateAttr(default_factory=list)
+    _by_word: Dict[str, Set[str]] = PrivateAttr(default_factory=dict)
+    _lock: threading.RLock = PrivateAttr(default_factory=threading.RLock)
+    _lock_order: int = PrivateAttr(default_factory=itertools.count().__next__)
+
+    @model_validator(mode='before')
+    @classmethod
+    def _stack_items(cls, data):
+        """Accept a flat `items` list and fold identical items into stacks, stacks are always keyed by their item's id"""
+        if not isinstance(data, dict):
+            return data
+        if 'items' not in data:
+            if isinstance(data.get('stacks'), dict):
+                ## re-key (e.g. a save written with another id scheme)
+                stacks = [stack if isinstance(stack, ItemStack) else ItemStack.model_validate(stack) for stack in data['stacks'].values()]
+                data = {**data, 'stacks': {stack.item.id: stack for stack in stacks}}
+            return data
+
+        data = dict(data)
+        stacks = {}
+        for item in data.pop('items') or []:
+            item = item if isinstance(item, Item) else Item.model_validate(item)
+            if item.id in stacks:
+                stacks[item.id].quantity += 1
+            else:
+                stacks[item.id] = ItemStack(item=item)
+        data.setdefault('stacks', stacks)
+        return data
+
+    def model_post_init(self, __context) -> None:
+        for stack in self.stacks.values():
+            self._index(stack.item)
+
+    def model_copy(self, *, update: Dict | None = None, deep: bool = False) -> 'Inventory':
+        """Copy with its own stacks, indexes and lock (items are immutable and shared), shallow and deep copies are the same"""
+        with self._lock:
+            data = {
+                'stacks': {item_id: stack.model_copy() for item_id, stack in self.stacks.items()},
+                'gold': self.gold,
+                'owner': self.owner,
+            }
+        return type(self)(**{**data, **(update or {})})
+
+    def __copy__(self) -> 'Inventory':
+        return self.model_copy()
+
+    def __deepcopy__(self, memo: Dict | None = None) -> 'Inventory':
+        return self.model_copy(deep=True)
+
+    def _index(self, item: Item) -> None:
+        self._by_type.setdefault(item.type, set()).add(item.id)
+        bisect.insort(self._by_price, (item.price, item.id))
+        for word in text_tokens(f"{item.name} {item.type}"):
+            self._by_word.setdefault(word, set()).add(item.id)
+
+    def _unindex(self, item: Item) -> None:
+        self._by_type[item.type].discard(item.id)
+        for word in text_tokens(f"{item.name} {item.type}"):
+            self._by_word[word].discard(item.id)
+        i = bisect.bisect_left(self._by_price, (item.price, item.id))
+        del self._by_price[i]
+
+    @staticmethod
+    def _item_id(item: Item | str) -> str:
+        return item if isinstance(item, str) else item.id
+
+    @property
+    def items(self) -> List[Item]:
+        """Held items, one entry per distinct item, cheapest first"""
+        return [self.stacks[item_id].item for _, item_id in self._by_price]
+
+    @property
+    def min_price(self) -> int | None:
+        """Price of the cheapest held item, None if the inventory is empty"""
+        by_price = self._by_price
+        return by_price[0][0] if by_price else None
+
+    def get(self, item: Item | str) -> Item | None:
+        """Return the held item with the same id"""
+        stack = self.stacks.get(self._item_id(item))
+        return stack.item if stack else None
+
+    def quantity(self, item: Item | str) -> int:
+        stack = self.stacks.get(self._item_id(item))
+        return stack.quantity if stack else 0
+
+    def has(self, item: Item | str, quantity: int = 1) -> bool:
+        return self.quantity(item) >= quantity
+
+    def __contains__(self, item: Item | str) -> bool:
+        return self._item_id(item) in self.stacks
+
+    def add(self, item: Item, quantity: int = 1) -> None:
+        if quantity <= 0:
+            raise ValueError(f"Quantity must be positive, got {quantity}.")
+        with self._lock:
+            stack = self.stacks.get(item.id)
+            if stack:
+                stack.quantity += quantity
+                return
+            self.stacks[item.id] = ItemStack(item=item, quantity=quantity)
+            self._index(item)
+
+    def remove(self, item: Item | str, quantity: int = 1) -> Item:
+        """Remove items from the stack and return the held item, raise ValueError if not enough are held"""
+        if quantity <= 0:
+            raise ValueError(f"Quantity must be positive, got {quantity}.")
+        item_id = self._item_id(item)
+        with self._lock:
+            stack = self.stacks.get(item_id)
+            if not stack or stack.quantity < quantity:
+                raise ValueError(f"Not enough {item_id} in inventory.")
+
+            stack.quantity -= quantity
+            if stack.quantity == 0:
+                del self.stacks[item_id]
+                self._unindex(stack.item)
+            return stack.item
+
+    def items_of_type(self, item_type: str) -> List[Item]:
+        """Held items of the given type, cheapest first"""
+        items = [self.stacks[item_id].item for item_id in self._by_type.get(item_type, ())]
+        return sorted(items, key=lambda item: (item.price, item.id))
+
+    def sorted_by_price(self, descending: bool = False) -> List[ItemStack]:
+        index = reversed(self._by_price) if descending else self._by_price
+        return [self.stacks[item_id] for _, item_id in index]
+
+    def query(
+        self,
+        item_type: str | None = None,
+        min_price: int | None = None,
+        max_price: int | None = None,
+        budget: int | None = None,
+        text: str | None = None,
+        page: int = 0,
+        page_size: int = 10,
+    ) -> InventoryPage:
+        """
+        Bounded, ranked page of held items
+        - item_type, min_price and max_price filter
+        - text ranks items whose name/type share words with it first (most shared words first)
+        - budget ranks what the buyer can afford next (priciest affordable first)
+        - then everything else, cheapest first
+        """
+        with self._lock:
+            lo = 0 if min_price is None else bisect.bisect_left(self._by_price, (min_price, ''))
+            hi = len(self._by_price) if max_price is None else bisect.bisect_right(self._by_price, (max_price, '\uffff'))
+            of_type = self._by_type.get(item_type, set()) if item_type is not None else None
+            def allowed(item_id):
+                if of_type is not None and item_id not in of_type:
+                    return False
+                price = self.stacks[item_id].item.price
+                return (min_price is None or price >= min_price) and (max_price is None or price <= max_price)
+
+            if of_type is None:
+                total = hi - lo
+            elif min_price is None and max_price is None:
+                total = len(of_type)
+            else:
+                total = sum(1 for item_id in of_type if allowed(item_id))
+
+            ## text matches from the word index
+            scores: Dict[str, int] = {}
+            for token in (text_tokens(text) if text else ()):
+                for item_id in self._by_word.get(token, ()):
+                    scores[item_id] = scores.get(item_id, 0) + 1
+            end = (page + 1) * page_size
+            matched = heapq.nsmallest(
+                end,
+                (item_id for item_id in scores if allowed(item_id)),
+                key=lambda item_id: (-scores[item_id], self.stacks[item_id].item.price, item_id),
+            )
+
+            ## everything else straight from the price index
+            split = hi if budget is None else max(lo, min(hi, bisect.bisect_right(self._by_price, (budget, '\uffff'))))
+            rest = itertools.chain(reversed(self._by_price[lo:split]), self._by_price[split:hi]) if budget is not None else self._by_price[lo:hi]
+            rest_ids = (item_id for _, item_id in rest if item_id not in scores and (of_type is None or item_id in of_type))
+
+            ranked = list(itertools.islice(itertools.chain(matched, rest_ids), end))
+            return InventoryPage(
+                items=[self.stacks[item_id] for item_id in ranked[page * page_size:end]],
+                total=total,
+                page=page,
+                page_size=page_size,
+            )
+
+class QuestObjective(BaseModel):
+    event_type: Literal['talk', 'collect', 'visit', 'defeat'] = Field(..., description='Kind of event that progresses the objective.')
+    target: str = Field(..., description='Id of the npc, item, location or enemy the event must involve.')
+    required: int = Field(default=1, description='Number of matching events needed to complete the objective.')
 
 class Quest(BaseModel):
     name: str = Field(..., description='Name of the quest')
@@ -107,6 +341,9 @@ class Quest(BaseModel):
     npc_dialog_option: str | None = Field(default=None, description="Dialog options the NPC might consider when describing this quest.")
     reward: int = Field(..., description='Reward for completing the quest (in gold coins).')
     is_given: bool = Field(default=False, description='Whether the quest has been given to the player or not.')
+    min_level: int = Field(default=1, description='Minimum player level to be offered the quest.')
+    prerequisites: List[str] = Field(default_factory=list, description='Names of quests the player must have completed first.')
+    objectives: List[QuestObjective] = Field(default_factory=list, description='Objectives to complete the quest.')
 
 class ProtectedKnowledgeBase(BaseModel):
     quests: List[Quest] = Field(..., description="List of quests that npc knows of.")
@@ -118,35 +355,78 @@ class KnowledgeBase(BaseModel):
     secrets: StateProtectedResource[List[NameDescriptionModel]] = Field(..., description="List of secrets that will help the player during quests tha the npc knows of.")
     generic_info: StateProtectedResource[List[NameDescriptionModel]] = Field(..., description="Basic information the npc knows about the environments.")
 
+    # per state caches of the protected view and its json: state name -> (version, view / json)
+    # assigning a field bumps the version, in place changes (e.g. quests.data.append) must call invalidate()
+    _version: int = PrivateAttr(default=0)
+    _protected_views: Dict[str, Tuple[int, ProtectedKnowledgeBase]] = PrivateAttr(default_factory=dict)
+    _protected_json: Dict[str, Tuple[int, str]] = PrivateAttr(default_factory=dict)
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in type(self).model_fields:
+            self._version += 1
+
+    def invalidate(self) -> None:
+        """Call after changing the knowledge base contents in place, drops every cached protected view"""
+        self._version += 1
+
+    def mark_quest_given(self, quest: Quest) -> None:
+        quest.is_given = True
+        self.invalidate()
+
     def get_protected_knowledge(self, state: State) -> ProtectedKnowledgeBase:
-        """Return a protected knowledge base for the given state"""
+        """Return a protected knowledge base for the given state (cached until the knowledge base changes)"""
+        cached = self._protected_views.get(state.name)
+        if cached and cached[0] == self._version:
+            return cached[1]
+
         quests = [q for q in self.quests.data if state.name in self.quests.allowed_states]
         secrets = [s for s in self.secrets.data if state.name in self.secrets.allowed_states]
         generic_info = [g for g in self.generic_info.data if state.name in self.generic_info.allowed_states]
 
-        return ProtectedKnowledgeBase(quests=quests, secrets=secrets, generic_info=generic_info)
+        view = ProtectedKnowledgeBase(quests=quests, secrets=secrets, generic_info=generic_info)
+        self._protected_views[state.name] = (self._version, view)
+        return view
+
+    def get_protected_knowledge_json(self, state: State) -> str:
+        """Serialized protected view for prompts, cached under the same version as the view"""
+        cached = self._protected_json.get(state.name)
+        if cached and cached[0] == self._version:
+            return cached[1]
+        serialized = self.get_protected_knowledge(state).model_dump_json()
+        self._protected_json[state.name] = (self._version, serialized)
+        return serialized
         
 ## ReAct Logic
 class ObservationResult(BaseModel):
     condition: str | None = Field(..., description="Detected transition condition.")
     action: str | None = Field(..., description="Detected action.")
     sentiment: Literal['positive', 'negative'] | None = Field(..., description="Detected sentiment.")
+    sentiment_score: float | None = Field(default=None, description="Sentiment score from -1.0 (negative) to 1.0 (positive).")
+    cues: List[str] = Field(default_factory=list, description="Cue categories in the player message (threat, offer).")
 
 class ReasonResult(BaseModel):
     information: List[str] | None = Field(..., description="List of relevant information to share with the player")
     reasoning: str | None = Field(..., description="Reasoning behind the provided information")
+    knowledge: ProtectedKnowledgeBase | None = Field(default=None, description="Knowledge base entries retrieved for this turn")
 
 class PlanResult(BaseModel):
     player_message: str = Field(..., description="Player inpuyt")
     action: Action | None = Field(..., description="Action to take.")
     transition_condition: FewShotIntent | None = Field(..., description="Transition condition to check.")
     reasoning: str | None = Field(..., description="Reasoning behind the action.")
+    knowledge: ProtectedKnowledgeBase | None = Field(default=None, description="Knowledge base entries retrieved for this turn")
 
 class PerformActionResult(BaseModel):
     action: Action | None = Field(..., description="Action attempted")
     is_successful: bool = Field(..., description="Whether the action was successful or not")
     reasoning: str | None = Field(..., description="Resaonsing behind the result")
     overridden_player_message: str | None = Field(default=None, description="The new player message to be used in the next step.")
+    quest: Quest | None = Field(default=None, description="Quest offered by the action.")
 
 class PerformTransitionConditionResult(BaseModel):
     transition_condition: FewShotIntent | None = Field(..., description="Transition condition attempted")
@@ -163,4 +443,5 @@ class ActionResult(BaseModel):
     action: Action | None = Field(..., description="Action attempted")
     action_is_successful: bool = Field(..., description="Whether the action was successful or not.")
     reasoning: str | None = Field(default=None, description="Reasoning for the success or failure of this action.")
-    overridden_player_message: str | None = Field(default=None, description="The new player message to be used in the next step.")
\ No newline at end of file
+    overridden_player_message: str | None = Field(default=None, description="The new player message to be used in the next step.")
+    quest: Quest | None = Field(default=None, description="Quest offered by the action.")
\ No newline at end of file
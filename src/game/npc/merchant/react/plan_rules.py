@@ -0,0 +1,56 @@
+"""
+Declarative rules that decide plan approvals locally
+- each rule targets the detected transition condition or the detected action and approves or rejects it
+- the first matching rule decides a target, targets no rule decides are left to the reflection agent
+- a turn where both targets are decided skips the reflection LLM call
+"""
+
+from typing import Callable, List, Literal, NamedTuple, Optional, Sequence
+from game.npc.merchant.react.models import ObservationResult, State
+from game.npc.merchant.react.state_graph import BehaviorGraph
+
+class PlanContext(NamedTuple):
+    graph: BehaviorGraph
+    state: State
+    condition: Optional[str]
+    action: Optional[str]
+    observation: Optional[ObservationResult] = None # sentiment and cues of the player message
+
+class PlanRule(NamedTuple):
+    name: str
+    target: Literal['condition', 'action']
+    when: Callable[[PlanContext], bool]
+    approve: bool
+
+class PlanDecision(NamedTuple):
+    condition: Optional[bool] # None = undecided, ask the reflection agent
+    action: Optional[bool]
+    rules: List[str] # names of the rules that decided
+
+    @property
+    def complete(self) -> bool:
+        return self.condition is not None and self.action is not None
+
+    def reasoning(self) -> str:
+        return f"Decided by rules: {', '.join(self.rules)}."
+
+def _action(context: PlanContext):
+    return next((a for a in context.state.available_actions if a.name == context.action), None)
+
+DEFAULT_PLAN_RULES: Sequence[PlanRule] = (
+    ## nothing detected, nothing to approve
+    PlanRule('no_condition_detected', 'condition', lambda c: c.condition is None, approve=False),
+    PlanRule('no_action_detected', 'action', lambda c: c.action is None, approve=False),
+    ## impossible in the current state
+    PlanRule('no_outgoing_transition', 'condition', lambda c: c.graph.next_state(c.state.name, c.condition) is None, approve=False),
+    PlanRule('action_not_available', 'action', lambda c: _action(c) is None, approve=False),
+)
+
+def decide(context: PlanContext, rules: Sequence[PlanRule] = DEFAULT_PLAN_RULES) -> PlanDecision:
+    verdicts = {'condition': None, 'action': None}
+    decided_by = []
+    for rule in rules:
+        if verdicts[rule.target] is None and rule.when(context):
+            verdicts[rule.target] = rule.approve
+            decided_by.append(rule.name)
+    return PlanDecision(condition=verdicts['condition'], action=verdicts['action'], rules=decided_by)
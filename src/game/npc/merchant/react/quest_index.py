@@ -0,0 +1,111 @@
+"""
+Quest selection index for give_quest
+- per state, quests are sorted by reward and covered by a segment tree of the minimum required level
+- given quests are removed from the tree, so they cost nothing at query time
+- best candidates: binary search of the reward band, then a tree descent to the richest quest the player's level allows, O(log n)
+- prerequisites are checked on the found candidates only (a candidate with missing prerequisites is skipped)
+"""
+
+import bisect
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from game.npc.merchant.react.models import KnowledgeBase, Quest
+from game.npc.merchant.react.knowledge_index import knowledge_entries
+
+LOCKED = float('inf') # level of a quest that can no longer be offered
+
+class _StateQuests:
+    """Quests accessible in one state, sorted by (reward, name)"""
+    def __init__(self, quests: Sequence[Quest]):
+        self.quests = sorted(quests, key=lambda q: (q.reward, q.name))
+        self.rewards = [q.reward for q in self.quests]
+        self.positions = {q.name: i for i, q in enumerate(self.quests)}
+
+        ## segment tree (min of required levels), leaves start at self.size
+        self.size = 1
+        while self.size < max(1, len(self.quests)):
+            self.size *= 2
+        self.tree = [LOCKED] * (2 * self.size)
+        for i, quest in enumerate(self.quests):
+            self.tree[self.size + i] = LOCKED if quest.is_given else quest.min_level
+        for node in range(self.size - 1, 0, -1):
+            self.tree[node] = min(self.tree[2 * node], self.tree[2 * node + 1])
+
+    def lock(self, name: str) -> None:
+        pos = self.positions.get(name)
+        if pos is None:
+            return
+        node = self.size + pos
+        self.tree[node] = LOCKED
+        node //= 2
+        while node:
+            self.tree[node] = min(self.tree[2 * node], self.tree[2 * node + 1])
+            node //= 2
+
+    def richest(self, level: int, lo: int, hi: int) -> int:
+        """Highest position in [lo, hi) whose required level <= level, -1 if none"""
+        return self._richest(1, 0, self.size, level, lo, hi)
+
+    def _richest(self, node: int, node_lo: int, node_hi: int, level: int, lo: int, hi: int) -> int:
+        if node_hi <= lo or hi <= node_lo or self.tree[node] > level:
+            return -1
+        if node >= self.size:
+            return node - self.size
+        mid = (node_lo + node_hi) // 2
+        right = self._richest(2 * node + 1, mid, node_hi, level, lo, hi)
+        if right >= 0:
+            return right
+        return self._richest(2 * node, node_lo, mid, level, lo, hi)
+
+class QuestIndex:
+    def __init__(self, quests: Iterable[Tuple[Quest, Sequence[str]]], version: int = 0):
+        """quests: (quest, states allowed to offer it)"""
+        by_state: Dict[str, List[Quest]] = {}
+        for quest, allowed_states in quests:
+            for state in allowed_states:
+                by_state.setdefault(state, []).append(quest)
+        self.states = {state: _StateQuests(state_quests) for state, state_quests in by_state.items()}
+        self.version = version
+
+    @classmethod
+    def from_knowledge_base(cls, knowledge_base: KnowledgeBase, states: Iterable[str] = ()) -> 'QuestIndex':
+        if isinstance(knowledge_base, KnowledgeBase):
+            quests = [(entry.data, entry.allowed_states) for entry in knowledge_entries(knowledge_base) if entry.kind == 'quests']
+        else:
+            # stored knowledge base: only the quests of each state are read
+            quests = [
+                (entry.data, [state])
+                for state in states
+                for entry in knowledge_base.store.iter_entries(knowledge_base.npc_id, state, 'quests')
+            ]
+        return cls(quests, knowledge_base.version)
+
+    def mark_given(self, quest: Quest) -> None:
+        for state_quests in self.states.values():
+            state_quests.lock(quest.name)
+
+    def best(
+        self,
+        state: str,
+        level: int,
+        completed: Set[str] = frozenset(),
+        min_reward: Optional[int] = None,
+        max_reward: Optional[int] = None,
+        k: int = 1,
+    ) -> List[Quest]:
+        """Up to k quests the npc can offer in this state, richest first"""
+        state_quests = self.states.get(state)
+        if not state_quests:
+            return []
+        lo = 0 if min_reward is None else bisect.bisect_left(state_quests.rewards, min_reward)
+        hi = len(state_quests.quests) if max_reward is None else bisect.bisect_right(state_quests.rewards, max_reward)
+
+        results = []
+        while len(results) < k and hi > lo:
+            pos = state_quests.richest(level, lo, hi)
+            if pos < 0:
+                break
+            quest = state_quests.quests[pos]
+            if all(name in completed for name in quest.prerequisites):
+                results.append(quest)
+            hi = pos
+        return results
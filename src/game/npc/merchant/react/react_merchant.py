@@ -1,51 +1,120 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
 from game.player.player import Player
 from game.npc.merchant.react.models import *
-from game.npc.merchant.react.react_merchant_statemachine import MerchantStateMachine, MachineError
-from game.npc.merchant.react.agents.transition_detection import transition_detection_agent, TransitionDetectionInputSchema
-from game.npc.merchant.react.agents.action.action_detection import action_detection_agent, ActionDetectionInputSchema
+from game.npc.merchant.react.react_merchant_statemachine import MerchantStateMachine, InvalidTransition
+from game.npc.merchant.react.agents.transition_detection import transition_detection_agent, TransitionDetectionInputSchema, transition_detection_output_schema
+from game.npc.merchant.react.agents.action.action_detection import action_detection_agent, ActionDetectionInputSchema, action_detection_output_schema
+from game.npc.merchant.react.agents.constrained import run_with_schema
+from game.npc.merchant.react.metrics import metrics
+from game.npc.merchant.react.plan_rules import DEFAULT_PLAN_RULES, PlanContext, PlanRule, decide
+from game.npc.merchant.react.sentiment import analyze as analyze_sentiment
 from game.npc.merchant.react.agents.knowledge_base_worker import knowledge_base_worker_agent, KnowledgeBaseWorkerInputSchema, KnowledgeBaseWorkerOutputSchema
 from game.npc.merchant.react.agents.reflection_reason import reflection_reason_agent, ReflectionReasonInputSchema
 from game.npc.merchant.react.agents.npc_response import response_agent, NpcResponseInputSchema
-from game.npc.merchant.react.agents.action.action_confirmation import action_confirm_agent, ActionConfirmationInputSchema
-from game.npc.merchant.react.sub_system.trade import TradeSystem
+from game.npc.merchant.react.agents.action.action_confirmation import action_confirm_agent, ActionConfirmationInputSchema, generate_confirmation_template
+from game.npc.merchant.react.confirmation_cache import ConfirmationPromptCache
+from game.npc.merchant.react.knowledge_index import KnowledgeIndex, KnowledgeEntry, to_protected_knowledge
+from game.npc.merchant.react.knowledge_store import KnowledgeStore, StoredKnowledgeBase
+from game.npc.merchant.react.quest_index import QuestIndex
+from game.npc.merchant.react.sub_system.trade import TradeSystem, INVENTORY_PAGE_SIZE
+from game.npc.merchant.react.sub_system.transaction import transfer
+from game.npc.merchant.react.sub_system.ledger import TransactionLedger
+from game.items.items import ItemTypeEnum
+from game.items.catalog_file import MappedCatalog
+from game.npc.merchant.react.catalog_items import to_react_item
 
 ## utility functions
-def inventory_transaction(from_inventory: Inventory, to_inventory: Inventory, transaction_value: int, item: Optional[Item] = None) -> TransactionResult:
-    """ on way transaction """
-    result = TransactionResult(is_successful=False)
-    ## check if item is in inventory
-    if item and item not in from_inventory.items:
-        result.reasoning = "Item not found in inventory."
-        return result
-
-    ## check if enough gold
-    if transaction_value > from_inventory.gold:
-        result.reasoning = "Not enough gold."
-        return result
-    
-    ## perform transaction
-    if item:
-        from_inventory.items.remove(item)
-        to_inventory.items.append(item)
-    
-    from_inventory.gold -= transaction_value
-    to_inventory.gold += transaction_value
-
-    result.is_successful = True
-    return result
+def inventory_transaction(from_inventory: Inventory, to_inventory: Inventory, transaction_value: int, item: Optional[Item] = None, ledger: Optional[TransactionLedger] = None) -> TransactionResult:
+    """ on way transaction, applied atomically across both inventories """
+    return transfer(from_inventory, to_inventory, transaction_value, item, ledger=ledger)
     
 class ReActMerchant:
-    def __init__(self):
+    # (item type, count, max price) stocked from the item catalog
+    catalog_stock_profile = [
+        (ItemTypeEnum.WEAPON, 2, 100),
+        (ItemTypeEnum.ARMOR, 1, 50),
+        (ItemTypeEnum.POTION, 1, 20),
+    ]
+
+    # knowledge base sections preferred by an action when retrieving knowledge
+    action_knowledge_kinds = {
+        'give_quest': ['quests'],
+        'share_secret': ['secrets'],
+        'basic_info': ['generic_info'],
+    }
+    knowledge_top_k = 3
+
+    # actions that are always fine once detected (talk only, no goods, gold or secrets change hands)
+    unconditional_actions = frozenset({'basic_info', 'question_player'})
+
+    # rules deciding clear-cut plan approvals without the reflection agent
+    plan_rules = (
+        *DEFAULT_PLAN_RULES,
+        PlanRule('unconditional_action', 'action', lambda c: c.action in ReActMerchant.unconditional_actions, approve=True),
+    )
+
+    bribe_price = 5
+
+    # templated confirmation prompts shared by all merchants, keyed by (npc, state, action)
+    confirmation_prompts = ConfirmationPromptCache(generate_confirmation_template)
+    # confirmation prompts prefetched while the reflection agent runs
+    prefetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='confirmation-prefetch')
+
+    def __init__(self, npc_id: str = 'magnus_merchant', ledger: Optional[TransactionLedger] = None, catalog: Optional[MappedCatalog] = None, use_knowledge_worker: bool = False, knowledge_store: Optional[KnowledgeStore] = None, warm_confirmation_prompts: bool = False):
+        self.npc_id = npc_id
+        self.ledger = ledger # records every gold/item transfer when set
+        self.catalog = catalog
+        self.use_knowledge_worker = use_knowledge_worker # let the LLM worker pick from the retrieved entries
+        self.knowledge_store = knowledge_store # shared database of npc knowledge, queried per state on demand
+        self.knowledge_index: Optional[KnowledgeIndex] = None
+        self.quest_index: Optional[QuestIndex] = None
         self.conversation_history = []
         self.state_machine = MerchantStateMachine()
         self.knowledge_base = self.__init_knowledge_base()
         self.chat_history = ChatHistory()
         self.inventory = self.__init_inventory()
+        self.confirmation_prefetch: Optional[Tuple[Tuple[str, Optional[str]], Future]] = None # ((action name, quest name), prompt future)
+        if warm_confirmation_prompts:
+            self.confirmation_prompts.warm(self.npc_id, self.state_machine.states_map)
     
+    def export_state(self) -> dict:
+        """Mutable state of the merchant (json serializable), enough to rebuild it after an eviction"""
+        given_quests = []
+        if isinstance(self.knowledge_base, KnowledgeBase):
+            # a stored knowledge base persists given quests itself
+            given_quests = [quest.name for quest in self.knowledge_base.quests.data if quest.is_given]
+        return {
+            'npc_id': self.npc_id,
+            'state': self.state_machine.state,
+            'inventory': self.inventory.model_dump(mode='json'),
+            'chat_history': [message.model_dump(mode='json') for message in self.chat_history.messages],
+            'given_quests': given_quests,
+        }
+
+    def restore_state(self, state: dict) -> None:
+        """Apply a state returned by export_state to a freshly built merchant"""
+        self.state_machine.state = state['state']
+        self.inventory = Inventory.model_validate(state['inventory'])
+        self.inventory.owner = self.npc_id
+        self.chat_history.messages = [Message.model_validate(message) for message in state['chat_history']]
+        given_quests = set(state['given_quests'])
+        if given_quests and isinstance(self.knowledge_base, KnowledgeBase):
+            for quest in self.knowledge_base.quests.data:
+                if quest.name in given_quests:
+                    self.knowledge_base.mark_quest_given(quest)
+
     def __init_inventory(self):
-        # Load inventory from file or database
+        if self.catalog is not None:
+            # index queries only, the catalog is never scanned or validated as a whole
+            inventory = Inventory(owner=self.npc_id, gold=100)
+            for item_type, count, max_price in self.catalog_stock_profile:
+                for definition in self.catalog.query(item_type=item_type, max_price=max_price, limit=count, descending=True):
+                    inventory.add(to_react_item(definition))
+            return inventory
+
         return Inventory(
+            owner=self.npc_id,
             items=[
                 Item(name="Sword", type="weapon", price=50),
                 Item(name="Potion of Healing", type="potion", price=10),
@@ -56,7 +125,9 @@ class ReActMerchant:
         )
 
     def __init_knowledge_base(self):
-        # Load knowledge base from file or database
+        if self.knowledge_store:
+            return StoredKnowledgeBase(self.knowledge_store, self.npc_id)
+
         return KnowledgeBase(
             quests = StateProtectedResource[List[Quest]](
                 allowed_states=[
@@ -109,14 +180,14 @@ class ReActMerchant:
         ## consider context 
         ### previous conversation
         ## consider actions
-        reason_res = self.__reason(observ_res, player)
+        reason_res = self.__reason(player_msg, observ_res, player)
         print(f"[REASON]: {reason_res.reasoning}")
 
         # plan
         ## decide on actions to take
         ## decide on state transitions
         ## consider next response possibilities
-        plan_res = self.__plan(player_msg, observ_res, reason_res)
+        plan_res = self.__plan(player_msg, observ_res, reason_res, player)
         print(f"[PLAN]: {plan_res.reasoning}")
 
         # act
@@ -126,13 +197,18 @@ class ReActMerchant:
         print(f"[ACTION]: {action_phase_res.reasoning}")
 
         # response
+        ## an offered quest replaces the retrieved quests, the response only needs that one
+        knowledge = reason_res.knowledge
+        if action_phase_res.quest and knowledge:
+            knowledge = knowledge.model_copy(update={'quests': [action_phase_res.quest]})
+
         npc_response_res = response_agent.run(
             NpcResponseInputSchema(
                 # if overide player message then use that
                 player_input=action_phase_res.overridden_player_message if action_phase_res.overridden_player_message else player_msg,
                 current_state=self.state_machine.states_map[self.state_machine.state],
                 previous_conversation=self.chat_history.get_last_k_turns(),
-                npc_knowledge_base=self.knowledge_base.get_protected_knowledge(self.state_machine.states_map[self.state_machine.state]),
+                npc_knowledge_base=knowledge,
                 observationStepResult=observ_res,
                 reasonStepResult=reason_res,
                 planStepResult=plan_res,
@@ -157,55 +233,91 @@ class ReActMerchant:
         # - Possible actions to take
         # - Sentiment (friendly, hostile, neutral)
 
-        transition_resp = transition_detection_agent.run(
+        ## only conditions that can fire from the current state are candidates
+        current_state = self.state_machine.states_map[self.state_machine.state]
+        transition_conditions = self.state_machine.available_transition_conditions()
+        transition_resp = run_with_schema(
+            transition_detection_agent,
             TransitionDetectionInputSchema(
                 previous_conversation=self.chat_history.get_last_k_turns(),
                 player_message=msg,
-                current_state=self.state_machine.states_map[self.state_machine.state],
-                available_transition_conditions=self.state_machine.all_transition_conditions
-            )
-        )
-        ## sentiment analysis (TODO)
-        print("[WARN] - Sentiment analysis not implemented yet")
+                current_state=current_state,
+                available_transition_conditions=list(transition_conditions)
+            ),
+            transition_detection_output_schema(tuple(c.name for c in transition_conditions)),
+            'transition_detection',
+        ) if transition_conditions else None
+        ## sentiment analysis (local lexicon, no LLM call)
+        sentiment = analyze_sentiment(msg)
 
         ## actions (maybe move to plan?)
-        action_resp = action_detection_agent.run(
+        action_names = tuple(action.name for action in current_state.available_actions)
+        action_resp = run_with_schema(
+            action_detection_agent,
             ActionDetectionInputSchema(
                 previous_conversation=self.chat_history.get_last_k_turns(),
                 player_message=msg,
-                current_state=self.state_machine.states_map[self.state_machine.state],
-            )
+                current_state=current_state,
+            ),
+            action_detection_output_schema(action_names),
+            'action_detection',
         )
 
         condition = None if (
-            transition_resp.detected_condition == 'none' or 
+            transition_resp is None or
+            transition_resp.detected_condition not in {c.name for c in transition_conditions} or
             transition_resp.confidence_score < confidence_threshold
         ) else transition_resp.detected_condition
         
         action = None if (
-            action_resp.detected_action == 'none' or 
+            action_resp.detected_action not in action_names or 
             action_resp.confidence_score < confidence_threshold
         ) else action_resp.detected_action
 
         return ObservationResult(
             condition=condition,
             action=action,
-            sentiment=None ## TODO
+            sentiment=sentiment.label,
+            sentiment_score=sentiment.score,
+            cues=sentiment.cues,
         )
 
-    def __reason(self, observe_res: ObservationResult, player: Player):
+    def __reason(self, player_msg: str, observe_res: ObservationResult, player: Player):
         '''All context and reasoning'''
 
         ## consider knowledge base
-        relevant_knowledge = self.__collect_relevant_knowledge(observe_res)
+        retrieved_knowledge = self.__retrieve_knowledge(player_msg, observe_res)
+        relevant_knowledge = self.__collect_relevant_knowledge(observe_res, retrieved_knowledge)
+
+        if relevant_knowledge:
+            information, reasoning = relevant_knowledge.information, relevant_knowledge.reasoning
+        else:
+            information = [f"{entry.data.name}: {entry.data.description}" for entry in retrieved_knowledge] or None
+            reasoning = f"Retrieved {len(retrieved_knowledge)} knowledge base entries relevant to the player message." if retrieved_knowledge else None
 
         return ReasonResult(
-            information=relevant_knowledge.information if relevant_knowledge else None,
-            reasoning=relevant_knowledge.reasoning if relevant_knowledge else None,
+            information=information,
+            reasoning=reasoning,
+            knowledge=to_protected_knowledge(retrieved_knowledge),
         )
 
-    def __collect_relevant_knowledge(self, observe_res: ObservationResult) -> KnowledgeBaseWorkerOutputSchema:
-        """Collect relevant knowledge from the knowledge base"""
+    def __retrieve_knowledge(self, player_msg: str, observe_res: ObservationResult) -> List[KnowledgeEntry]:
+        """Top k knowledge base entries accessible in the current state"""
+        query = " ".join(part.replace('_', ' ') for part in (player_msg, observe_res.action, observe_res.condition) if part)
+        boost_kinds = self.action_knowledge_kinds.get(observe_res.action, [])
+        if self.knowledge_store:
+            return self.knowledge_base.search(query, self.state_machine.state, k=self.knowledge_top_k, boost_kinds=boost_kinds)
+
+        if not self.knowledge_index or self.knowledge_index.version != self.knowledge_base.version:
+            self.knowledge_index = KnowledgeIndex.from_knowledge_base(self.knowledge_base)
+
+        return self.knowledge_index.search(query, self.state_machine.state, k=self.knowledge_top_k, boost_kinds=boost_kinds)
+
+    def __collect_relevant_knowledge(self, observe_res: ObservationResult, retrieved_knowledge: List[KnowledgeEntry]) -> KnowledgeBaseWorkerOutputSchema:
+        """Let the knowledge base worker pick from the retrieved knowledge (optional)"""
+        if not self.use_knowledge_worker or not retrieved_knowledge:
+            return None
+
         if not observe_res.action or observe_res.action =='none':
             return None
         
@@ -215,15 +327,7 @@ class ReActMerchant:
             return None
         
         # find condition
-        condition = None
-
-        for cond in self.state_machine.all_transition_conditions:
-            if cond.name == observe_res.condition:
-                condition = cond
-                break
-        
-        ## get the protected knowledge on this state
-        protected_knowledge = self.knowledge_base.get_protected_knowledge(current_state)
+        condition = self.state_machine.transition_lookup(observe_res.condition)
         
         ## Call knowledge base worker agent to get relevant knowledge
         knowledge_resp = knowledge_base_worker_agent.run(
@@ -231,14 +335,25 @@ class ReActMerchant:
                 current_state=current_state,
                 detected_condition=condition,
                 detected_action=observe_res.action,
-                npc_knowledge_base=protected_knowledge,
-                npc_inventory=self.inventory
+                npc_knowledge_base=to_protected_knowledge(retrieved_knowledge),
+                npc_inventory=self.inventory.query(page_size=INVENTORY_PAGE_SIZE)
             )
         )
 
         return knowledge_resp
         
-    def __plan(self, player_msg: str, observation_res: ObservationResult, reason_res: ReasonResult):
+    def __message_signals(self, condition: Optional[str], observation_res: ObservationResult) -> List[str]:
+        """Hints from the local sentiment analysis for the reflection agent, never decisive (a threat can be worded politely, a bribe offered without naming gold)"""
+        signals = []
+        if observation_res.sentiment:
+            signals.append(f"sentiment: {observation_res.sentiment} ({observation_res.sentiment_score:+.2f})")
+        if condition == 'player_threaten_npc' and 'threat' not in observation_res.cues:
+            signals.append("no threatening words in the player input")
+        if condition == 'player_offer_bribe' and 'offer' not in observation_res.cues:
+            signals.append("no words offering gold or payment in the player input")
+        return signals
+
+    def __plan(self, player_msg: str, observation_res: ObservationResult, reason_res: ReasonResult, player: Player):
         """Decide on actions to take based on observation and reasoning"""
 
         # transitions
@@ -251,23 +366,55 @@ class ReActMerchant:
         if observation_res.action:
             action_name = observation_res.action
         
-        reflection_res = reflection_reason_agent.run(
-            ReflectionReasonInputSchema(
-                player_input=player_msg,
-                current_state=self.state_machine.states_map[self.state_machine.state],
-                detected_transition_condition=self.state_machine.transition_lookup(state_transition_name),
-                detected_action=self.state_machine.action_lookup(action_name),
-                previous_step_reasoning=reason_res.reasoning,
-                npc_knowledge_base=self.knowledge_base.get_protected_knowledge(self.state_machine.states_map[self.state_machine.state]),
-                previous_conversation=self.chat_history.get_last_k_turns()
+        current_state = self.state_machine.states_map[self.state_machine.state]
+        decision = decide(PlanContext(self.state_machine.graph, current_state, state_transition_name, action_name, observation_res), self.plan_rules)
+        metrics.incr('plan.turns')
+
+        if decision.complete:
+            metrics.incr('plan.decided_by_rules')
+            approvals = {state_transition_name: decision.condition, action_name: decision.action}
+            reasoning = decision.reasoning()
+        else:
+            ## a confirmation prompt will probably be needed, generate it while the agent reflects
+            prefetch = None
+            detected_action = self.state_machine.action_lookup(action_name)
+            if detected_action and detected_action.confirmation_required and decision.action is not False:
+                ## the quest index is only touched on this thread, the worker gets the chosen quest
+                quest = self.__select_quest(player) if action_name == 'give_quest' else None
+                prefetch_key = (action_name, quest.name if quest else None)
+                prefetch = self.prefetch_executor.submit(self.__confirmation_prompt, detected_action, player, reason_res.knowledge, quest)
+
+            reflection_res = reflection_reason_agent.run(
+                ReflectionReasonInputSchema(
+                    player_input=player_msg,
+                    current_state=current_state,
+                    detected_transition_condition=self.state_machine.transition_lookup(state_transition_name),
+                    detected_action=self.state_machine.action_lookup(action_name),
+                    previous_step_reasoning=reason_res.reasoning,
+                    npc_knowledge_base=reason_res.knowledge,
+                    previous_conversation=self.chat_history.get_last_k_turns(),
+                    message_signals=self.__message_signals(state_transition_name, observation_res),
+                )
             )
-        )
+            ## rule decisions win over the agent's
+            approvals = {
+                state_transition_name: reflection_res.approvals.get(state_transition_name, False) if decision.condition is None else decision.condition,
+                action_name: reflection_res.approvals.get(action_name, False) if decision.action is None else decision.action,
+            }
+            reasoning = reflection_res.reasoning
+
+            if prefetch:
+                if approvals[action_name]:
+                    self.confirmation_prefetch = (prefetch_key, prefetch)
+                else:
+                    prefetch.cancel()
+                    metrics.incr('confirmation.prefetch_discarded')
 
         ## cancel action and transition if not approved
-        if not reflection_res.transition_condition_approval.approved:
+        if not approvals.get(state_transition_name, False):
             state_transition_name = None
         
-        if not reflection_res.action_approval.approved:
+        if not approvals.get(action_name, False):
             action_name = None
 
         # return result
@@ -275,7 +422,8 @@ class ReActMerchant:
             player_message=player_msg,
             action=self.state_machine.action_lookup(action_name),
             transition_condition=self.state_machine.transition_lookup(state_transition_name),
-            reasoning=reflection_res.reasoning,
+            reasoning=reasoning,
+            knowledge=reason_res.knowledge,
         )
     
     def __action(self, plan_res: PlanResult, player:Player) -> ActionResult:
@@ -290,7 +438,8 @@ class ReActMerchant:
         action = plan_res.action
         
         # try perform action
-        perf_action_result = self.__perform_action(action, player)
+        perf_action_result = self.__perform_action(action, player, plan_res.knowledge)
+        result.quest = perf_action_result.quest
         if not perf_action_result.is_successful:
             result.action_is_successful = False
             result.reasoning = perf_action_result.reasoning
@@ -327,13 +476,14 @@ class ReActMerchant:
         try:
             self.state_machine.transition(transition_condition.name)
             result.is_successful = True
-        except MachineError as e:
+        except InvalidTransition as e:
+            print(f"[ERROR]: {e}")
             result.is_successful = False
             result.reasoning = str(e)
         
         return result
 
-    def __perform_action(self, action: Action, player: Player) -> PerformActionResult:
+    def __perform_action(self, action: Action, player: Player, knowledge: Optional[ProtectedKnowledgeBase] = None) -> PerformActionResult:
         """ ask for user confirmation """
         result = PerformActionResult(
             action=action,
@@ -347,20 +497,12 @@ class ReActMerchant:
 
 
         if action.name == 'take_bribe':
-            bribe_price = 5
-            prompt = action_confirm_agent.run(
-                ActionConfirmationInputSchema(
-                    current_state=self.state_machine.states_map[self.state_machine.state],
-                    action=action,
-                    npc_knowledge_base=self.knowledge_base.get_protected_knowledge(self.state_machine.states_map[self.state_machine.state]),
-                    context={"bribe_price": "5 gold coins"}
-                )
-            ).response
+            prompt = self.__await_confirmation_prompt(action, player, knowledge)
 
             res = input(f"{prompt} (y/n) ")
             if res.lower() == 'yes' or res.lower() == 'y':
                 # perform gold transation
-                transaction_res = inventory_transaction(self.inventory, player.inventory, bribe_price)
+                transaction_res = inventory_transaction(self.inventory, player.inventory, self.bribe_price, ledger=self.ledger)
                 result.is_successful = transaction_res.is_successful
                 result.reasoning = transaction_res.reasoning
                 result.overridden_player_message = "I have paid the bribe."
@@ -369,21 +511,19 @@ class ReActMerchant:
                 result.overridden_player_message = "I have declined the bribe."
 
         elif action.name == 'give_quest':
-            state_knowledge = self.knowledge_base.get_protected_knowledge(self.state_machine.states_map[self.state_machine.state]),
-            prompt = action_confirm_agent.run(
-                ActionConfirmationInputSchema(
-                    current_state=self.state_machine.states_map[self.state_machine.state],
-                    action=action,
-                    npc_knowledge_base=state_knowledge[0] if state_knowledge else None,
-                    context=state_knowledge[0].quests if state_knowledge else None,
-                )
-            ).response
+            quest = self.__select_quest(player)
+            if quest is None:
+                self.confirmation_prefetch = None
+                result.reasoning = "There is no quest the player can take on right now."
+                return result
+
+            result.quest = quest
+            prompt = self.__await_confirmation_prompt(action, player, knowledge, quest)
 
             res = input(f"{prompt} (y/n) ")
 
             if res.lower() == 'yes' or res.lower() == 'y':
-                ## TODO: dynamicly get quest (OPTIONAL)
-                self.__give_quest(state_knowledge[0].quests[0], player)
+                self.__give_quest(quest, player)
                 
                 result.is_successful = True
                 result.reasoning = "The player has accepted the quest. Assume the quest has been added to the player's quest log."
@@ -393,15 +533,7 @@ class ReActMerchant:
                 result.overridden_player_message = "I have declined the quest."
 
         elif action.name == "trade":
-            state_knowledge = self.knowledge_base.get_protected_knowledge(self.state_machine.states_map[self.state_machine.state]),
-            prompt = action_confirm_agent.run(
-                ActionConfirmationInputSchema(
-                    current_state=self.state_machine.states_map[self.state_machine.state],
-                    action=action,
-                    npc_knowledge_base=state_knowledge[0] if state_knowledge else None,
-                    context=self.inventory,
-                )
-            ).response
+            prompt = self.__await_confirmation_prompt(action, player, knowledge)
 
             res = input(f"{prompt} (y/n) ")
             if res.lower() == 'yes' or res.lower() == 'y':
@@ -409,7 +541,7 @@ class ReActMerchant:
                 current_state = self.state_machine.states_map[self.state_machine.state]
                 npc_traits = current_state.trait
 
-                trade_sub_system = TradeSystem(player.inventory, self.inventory, npc_traits)
+                trade_sub_system = TradeSystem(player.inventory, self.inventory, npc_traits, ledger=self.ledger)
                 while trade_sub_system.completed == False:
                     if not trade_sub_system.initiaited:
                         print(f"[TRADING]: {trade_sub_system.greeting()}")
@@ -429,10 +561,64 @@ class ReActMerchant:
 
         return result
 
+    def __await_confirmation_prompt(self, action: Action, player: Player, knowledge: Optional[ProtectedKnowledgeBase], quest: Optional[Quest] = None) -> str:
+        """The prompt prefetched during planning if there is one for this action (and quest), else generated now"""
+        prefetch, self.confirmation_prefetch = self.confirmation_prefetch, None
+        if prefetch and prefetch[0] == (action.name, quest.name if quest else None):
+            metrics.incr('confirmation.prefetch_used')
+            return prefetch[1].result()
+        return self.__confirmation_prompt(action, player, knowledge, quest)
+
+    def __confirmation_prompt(self, action: Action, player: Player, knowledge: Optional[ProtectedKnowledgeBase], quest: Optional[Quest] = None) -> str:
+        """Cached template filled with the current values, the agent is only asked when no template exists
+        - runs on the prefetch thread, the quest is selected by the caller (the quest index is not thread safe)"""
+        current_state = self.state_machine.states_map[self.state_machine.state]
+        ## only the entries retrieved for this turn, like the reflection and response prompts
+        state_knowledge = knowledge or ProtectedKnowledgeBase(quests=[], secrets=[], generic_info=[])
+
+        values, context = None, None
+        if action.name == 'take_bribe':
+            values = {'price': f"{self.bribe_price} gold coins"}
+            context = {"bribe_price": values['price']}
+        elif action.name == 'give_quest':
+            ## only the chosen quest goes into the prompt
+            context = quest
+            state_knowledge = state_knowledge.model_copy(update={'quests': [quest] if quest else []})
+            if quest:
+                values = {'quest': quest.name, 'reward': quest.reward}
+        elif action.name == 'trade':
+            context = self.inventory.query(budget=player.inventory.gold, page_size=INVENTORY_PAGE_SIZE)
+            if context.total:
+                values = {'item_count': context.total, 'min_price': self.inventory.min_price}
+
+        prompt = self.confirmation_prompts.get(self.npc_id, current_state, action, values) if values else None
+        if prompt is not None:
+            return prompt
+
+        metrics.incr('confirmation.agent_fallbacks')
+        return action_confirm_agent.run(
+            ActionConfirmationInputSchema(
+                current_state=current_state,
+                action=action,
+                npc_knowledge_base=state_knowledge,
+                context=context,
+            )
+        ).response
+
+    def __select_quest(self, player: Player) -> Optional[Quest]:
+        """Richest quest the player is eligible for in the current state (level, prerequisites, not given yet)"""
+        if not self.quest_index or self.quest_index.version != self.knowledge_base.version:
+            self.quest_index = QuestIndex.from_knowledge_base(self.knowledge_base, self.state_machine.states_map)
+        quests = self.quest_index.best(self.state_machine.state, player.level, player.completed_quests)
+        return quests[0] if quests else None
+
     def __give_quest(self, quest: Quest, player: Player) -> None:
         # add quest to player quest log
         player.quest_log.append(quest)
 
-        # mark quest as given
-        quest.is_given = True
+        # mark quest as given (invalidates the cached protected views), the quest index is updated in place
+        self.knowledge_base.mark_quest_given(quest)
+        if self.quest_index:
+            self.quest_index.mark_given(quest)
+            self.quest_index.version = self.knowledge_base.version
         
\ No newline at end of file
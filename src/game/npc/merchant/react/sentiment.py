@@ -0,0 +1,72 @@
+"""
+Local lexicon based sentiment of player messages
+- word valences from a small game lexicon, negators flip the valence of the next few words
+- scored with numpy over the message tokens, no LLM round trip
+- cue words (threats, offers of gold) are exposed as cheap signals for transition rules
+"""
+
+import math
+import numpy as np
+from typing import Dict, FrozenSet, List, Literal
+from pydantic import BaseModel, Field
+
+## general valence words only, trade nouns (sword, deal, reward, ...) are neutral whatever the message
+LEXICON: Dict[str, float] = {
+    # positive
+    'thank': 2.0, 'thanks': 2.0, 'please': 1.0, 'friend': 2.0, 'friendly': 2.0, 'kind': 2.0, 'good': 1.5, 'great': 2.5,
+    'wonderful': 3.0, 'nice': 1.5, 'love': 3.0, 'like': 1.0, 'appreciate': 2.5, 'happy': 2.0, 'glad': 2.0, 'help': 1.0,
+    'honest': 1.5, 'fair': 1.5, 'generous': 2.5, 'trust': 2.0, 'pleasure': 2.0, 'welcome': 1.5, 'best': 2.0, 'fine': 1.0,
+    'beautiful': 2.5, 'wise': 1.5, 'gift': 1.5, 'sorry': 0.5, 'cheers': 1.5, 'hello': 0.5, 'greetings': 0.5,
+    # negative
+    'hurt': -2.5, 'kill': -3.5, 'die': -3.0, 'dead': -2.5, 'threaten': -2.5, 'enemy': -2.5, 'regret': -2.0,
+    'hate': -3.0, 'stupid': -2.5, 'fool': -2.0, 'liar': -2.5, 'lie': -1.5, 'lying': -2.0, 'cheat': -2.5, 'thief': -2.5,
+    'rob': -2.5, 'steal': -2.5, 'burn': -2.5, 'destroy': -3.0, 'bad': -1.5, 'terrible': -2.5, 'awful': -2.5,
+    'useless': -2.0, 'worthless': -2.5, 'angry': -2.0, 'ugly': -2.0, 'scam': -2.5, 'rip': -1.0, 'dare': -1.5,
+    'warn': -1.5, 'shut': -1.5, 'never': -0.5, 'pathetic': -2.5, 'blood': -2.0,
+    'overpriced': -2.0, 'expensive': -1.0,
+}
+
+NEGATORS: FrozenSet[str] = frozenset({'not', 'no', 'never', 'dont', 'doesnt', 'didnt', 'isnt', 'wont', 'cant', 'cannot', 'nor', 'without', 'aint'})
+NEGATION_WINDOW = 3 # words after a negator whose valence is flipped
+NEGATION_SCALE = -0.75 # flipped words count a bit less ("not bad" is not "good")
+
+CUES: Dict[str, FrozenSet[str]] = {
+    'threat': frozenset({'hurt', 'kill', 'die', 'threaten', 'enemy', 'regret', 'warn', 'dare', 'burn', 'destroy', 'blood'}),
+    'offer': frozenset({'gold', 'coin', 'coins', 'pay', 'money', 'bribe', 'reward', 'offer', 'silver'}),
+}
+
+NEUTRAL_BAND = 0.05 # |score| below this is neutral
+NORMALIZATION_ALPHA = 15.0 # score = sum / sqrt(sum^2 + alpha), in (-1, 1)
+
+class SentimentResult(BaseModel):
+    label: Literal['positive', 'negative'] | None = Field(..., description="Sentiment label, None when neutral")
+    score: float = Field(..., description="Sentiment score from -1.0 (negative) to 1.0 (positive)")
+    cues: List[str] = Field(default_factory=list, description="Cue categories present in the message (threat, offer)")
+
+def tokenize(text: str) -> List[str]:
+    return ''.join(c if c.isalnum() else (' ' if c != "'" else '') for c in text.lower()).split()
+
+def score_tokens(tokens: List[str]) -> float:
+    if not tokens:
+        return 0.0
+    valence = np.fromiter((LEXICON.get(token, 0.0) for token in tokens), dtype=np.float64, count=len(tokens))
+    if not valence.any():
+        return 0.0
+
+    ## number of negators in the window before each token
+    negator = np.fromiter((token in NEGATORS for token in tokens), dtype=np.int8, count=len(tokens))
+    if negator.any():
+        negated = np.convolve(negator, np.ones(NEGATION_WINDOW + 1, dtype=np.int8))[:len(tokens)] - negator
+        valence = np.where(negated % 2 == 1, valence * NEGATION_SCALE, valence)
+
+    ## normalize into (-1, 1), VADER style
+    total = float(valence.sum())
+    return total / math.sqrt(total * total + NORMALIZATION_ALPHA)
+
+def analyze(text: str) -> SentimentResult:
+    tokens = tokenize(text)
+    score = score_tokens(tokens)
+    label = None if abs(score) < NEUTRAL_BAND else ('positive' if score > 0 else 'negative')
+    words = set(tokens)
+    cues = [cue for cue, cue_words in CUES.items() if not words.isdisjoint(cue_words)]
+    return SentimentResult(label=label, score=score, cues=cues)
@@ -0,0 +1,180 @@
+"""
+Data driven NPC behavior graphs
+- states, actions, transition conditions (with few-shot examples) and transitions are loaded from JSON/YAML
+- a graph is validated and compiled once into read-only lookup tables shared by every NPC using it
+- NpcStateMachine instances only hold their current state name
+"""
+
+import os
+import json
+from enum import Enum
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+from pydantic import BaseModel, Field, model_validator
+from game.npc.merchant.react.models import Action, CharacterSetting, FewShotIntent, NpcConfig, State, StateTransition
+
+## Graph file schema
+class StateSpec(BaseModel):
+    name: str
+    character_trait: str | None = Field(default=None, description="Trait added to the character setting in this state")
+    trait: str = Field(..., description="How the npc should act in this state")
+    available_actions: List[Action] = []
+
+class TransitionSpec(BaseModel):
+    source: str
+    destination: str
+    conditions: List[str] = Field(..., description="Names of the conditions that trigger this transition")
+
+class GraphSpec(BaseModel):
+    name: str
+    initial_state: str
+    character_setting: Dict[str, Any]
+    states: List[StateSpec]
+    conditions: List[FewShotIntent]
+    transitions: List[TransitionSpec]
+
+    @model_validator(mode='after')
+    def check_references(self):
+        states = [state.name for state in self.states]
+        conditions = [condition.name for condition in self.conditions]
+        for label, names in (('state', states), ('condition', conditions)):
+            duplicates = {name for name in names if names.count(name) > 1}
+            if duplicates:
+                raise ValueError(f"Duplicate {label}s in graph '{self.name}': {sorted(duplicates)}")
+        if self.initial_state not in states:
+            raise ValueError(f"Initial state '{self.initial_state}' is not a state of graph '{self.name}'.")
+
+        triggers = set()
+        for transition in self.transitions:
+            for state in (transition.source, transition.destination):
+                if state not in states:
+                    raise ValueError(f"Transition references unknown state '{state}' in graph '{self.name}'.")
+            for condition in transition.conditions:
+                if condition not in conditions:
+                    raise ValueError(f"Transition references unknown condition '{condition}' in graph '{self.name}'.")
+                if (transition.source, condition) in triggers:
+                    raise ValueError(f"Condition '{condition}' leads to more than one state from '{transition.source}' in graph '{self.name}'.")
+                triggers.add((transition.source, condition))
+        return self
+
+## Compiled graph
+class BehaviorGraph:
+    """Validated, read-only form of a graph file"""
+    __slots__ = ('name', 'init_state', 'character_setting', 'states_map', 'config', 'transition_table', 'transition_map', 'all_transition_conditions', 'outgoing_conditions', 'action_map')
+
+    def __init__(self, spec: GraphSpec):
+        self.name = spec.name
+        self.init_state = spec.initial_state
+        self.character_setting = MappingProxyType(dict(spec.character_setting))
+
+        self.states_map: Mapping[str, State] = MappingProxyType({
+            state.name: State(
+                name=state.name,
+                character_setting=CharacterSetting(**spec.character_setting, trait=state.character_trait),
+                trait=state.trait,
+                available_actions=state.available_actions,
+            )
+            for state in spec.states
+        })
+        self.transition_map: Mapping[str, FewShotIntent] = MappingProxyType({condition.name: condition for condition in spec.conditions})
+
+        ## (source state, condition name) -> destination state
+        table: Dict[Tuple[str, str], str] = {}
+        transitions = []
+        for transition in spec.transitions:
+            for condition in transition.conditions:
+                table[(transition.source, condition)] = transition.destination
+            transitions.append(StateTransition(
+                source=self.states_map[transition.source],
+                destination=self.states_map[transition.destination],
+                conditions=[self.transition_map[condition] for condition in transition.conditions],
+            ))
+        self.transition_table: Mapping[Tuple[str, str], str] = MappingProxyType(table)
+        self.config = NpcConfig(states=list(self.states_map.values()), transitions=transitions)
+
+        # conditions used by at least one transition, in file order
+        used = {condition for _, condition in table}
+        self.all_transition_conditions: Tuple[FewShotIntent, ...] = tuple(c for c in spec.conditions if c.name in used)
+
+        # state -> conditions that can fire from it (candidates for transition detection)
+        self.outgoing_conditions: Mapping[str, Tuple[FewShotIntent, ...]] = MappingProxyType({
+            state: tuple(c for c in spec.conditions if (state, c.name) in table)
+            for state in self.states_map
+        })
+
+        action_map = {}
+        for state in self.states_map.values():
+            for action in state.available_actions:
+                action_map.setdefault(action.name, action)
+        self.action_map: Mapping[str, Action] = MappingProxyType(action_map)
+
+    def __setattr__(self, name, value):
+        if hasattr(self, name):
+            raise AttributeError(f"BehaviorGraph '{self.name}' is read-only.")
+        super().__setattr__(name, value)
+
+    def next_state(self, state: str, condition: str) -> Optional[str]:
+        return self.transition_table.get((state, condition))
+
+    def state_enum(self, enum_name: str) -> Enum:
+        """Enum of the graph's state names, e.g. MerchantStateEnum.HELPFUL.value == 'helpful'"""
+        return Enum(enum_name, {name.upper(): name for name in self.states_map})
+
+def compile_graph(data: Dict[str, Any]) -> BehaviorGraph:
+    return BehaviorGraph(GraphSpec.model_validate(data))
+
+@lru_cache(maxsize=None)
+def load_graph(path: str) -> BehaviorGraph:
+    """Load and compile a JSON or YAML graph file, once per path"""
+    with open(path, encoding='utf-8') as f:
+        if os.path.splitext(path)[1].lower() in ('.yaml', '.yml'):
+            import yaml
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    return compile_graph(data)
+
+class InvalidTransition(ValueError):
+    """Raised for a transition condition that can not fire from the current state"""
+
+class NpcStateMachine:
+    """
+    State machine over a compiled behavior graph, subclasses set `graph`.
+    The graph's tables are exposed as class attributes, an instance only holds its current state.
+    """
+    __slots__ = ('state',)
+    graph: BehaviorGraph
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        graph = cls.__dict__.get('graph')
+        if graph is None:
+            return
+        cls.name = graph.character_setting['name']
+        cls.init_state = graph.init_state
+        cls.base_character_setting = graph.character_setting
+        cls.states_map = graph.states_map
+        cls.state_config = graph.config
+        cls.transition_map = graph.transition_map
+        cls.all_transition_conditions = list(graph.all_transition_conditions)
+        cls.action_map = graph.action_map
+
+    def __init__(self, state: Optional[str] = None):
+        self.state = state or self.init_state
+
+    def action_lookup(self, action_name):
+        return self.action_map.get(action_name, None)
+
+    def transition_lookup(self, transition_name):
+        return self.transition_map.get(transition_name, None)
+
+    def available_transition_conditions(self) -> Tuple[FewShotIntent, ...]:
+        """Conditions that can fire from the current state"""
+        return self.graph.outgoing_conditions[self.state]
+
+    def transition(self, incoming_condition_name) -> None:
+        destination = self.graph.next_state(self.state, incoming_condition_name)
+        if destination is None:
+            raise InvalidTransition(f"{incoming_condition_name} is not a valid transition on state: {self.state}")
+        self.state = destination
@@ -0,0 +1,189 @@
+"""
+Offline economy simulation
+- thousands of merchants and players as numpy arrays: gold per agent, stock and price per (merchant, item kind)
+- purchases are checked with the transaction rules (purchase_allowed, purchase_cost), elementwise over a round of attempts
+- a merchant's stock is sold first come first served within a round, so a unit is never sold twice
+- daily: players earn gold (faucet), prices follow unmet demand and unsold stock (price pressure), merchants restock at
+  wholesale price (sink)
+"""
+
+from typing import List, NamedTuple, Optional, Sequence
+import numpy as np
+from game.npc.merchant.react.models import Item
+from game.npc.merchant.react.sub_system.transaction import can_afford, purchase_allowed, purchase_cost
+
+ITEM_TYPES = ('weapon', 'armour', 'potion')
+
+class EconomyConfig(NamedTuple):
+    merchants: int = 1000
+    players: int = 10_000
+    trades_per_day: int = 3 # purchase attempts per player per day
+    player_income: float = 40.0 # mean gold a player earns per day (quests, loot)
+    player_start_gold: int = 100
+    merchant_start_gold: int = 100
+    start_stock: int = 5 # units of every item kind per merchant
+    restock: int = 2 # units bought per item kind per day
+    wholesale_ratio: float = 0.6 # restock cost relative to the base price
+    price_elasticity: float = 0.05 # daily price change per unit of excess demand (per merchant)
+    price_bounds: tuple = (0.5, 3.0) # price multiplier bounds relative to the base price
+
+class RoundResult(NamedTuple):
+    allowed: np.ndarray # attempt succeeded
+    cost: np.ndarray # gold paid per attempt (0 when refused)
+
+class EconomyReport:
+    def __init__(self, item_types: np.ndarray):
+        self.item_types = item_types # item type index per item kind
+        self.gold_supply: List[int] = [] # total gold per day (players + merchants)
+        self.player_gold: List[int] = []
+        self.merchant_gold: List[int] = []
+        self.sales: List[np.ndarray] = [] # units sold per item type per day
+        self.unmet_demand: List[np.ndarray] = [] # refused attempts (out of stock) per item type per day
+        self.unaffordable: List[np.ndarray] = [] # refused attempts (not enough gold) per item type per day
+        self.stockout_rate: List[np.ndarray] = [] # fraction of (merchant, kind) pairs out of stock per item type, before restocking
+        self.price_index: List[np.ndarray] = [] # mean price / base price per item type, end of day
+
+    def by_type(self, per_kind: np.ndarray) -> np.ndarray:
+        return np.array([per_kind[self.item_types == t].sum() for t in range(len(ITEM_TYPES))])
+
+    def summary(self, every: int = 30) -> str:
+        lines = [f"{'day':>4} {'gold supply':>12} {'players':>11} {'merchants':>11}  " + "  ".join(f"{t:>22}" for t in ITEM_TYPES)]
+        lines.append(f"{'':>4} {'':>12} {'':>11} {'':>11}  " + "  ".join(f"{'price stockout unmet':>22}" for _ in ITEM_TYPES))
+        for day in range(0, len(self.gold_supply), every):
+            columns = "  ".join(
+                f"{self.price_index[day][t]:>6.2f} {self.stockout_rate[day][t]:>7.1%} {int(self.unmet_demand[day][t]):>7}"
+                for t in range(len(ITEM_TYPES))
+            )
+            lines.append(f"{day + 1:>4} {self.gold_supply[day]:>12,} {self.player_gold[day]:>11,} {self.merchant_gold[day]:>11,}  {columns}")
+        return "\n".join(lines)
+
+class EconomySimulator:
+    def __init__(self, items: Sequence[Item], config: EconomyConfig = EconomyConfig(), seed: Optional[int] = None):
+        self.items = list(items)
+        self.config = config
+        self.rng = np.random.default_rng(seed)
+
+        kinds = len(self.items)
+        self.item_types = np.array([ITEM_TYPES.index(item.type) for item in self.items])
+        self.base_price = np.array([item.price for item in self.items], dtype=np.int64)
+        self.demand_weights = 1.0 / self.base_price # cheap items are wanted more often
+        self.demand_weights /= self.demand_weights.sum()
+
+        self.player_gold = np.full(config.players, config.player_start_gold, dtype=np.int64)
+        self.merchant_gold = np.full(config.merchants, config.merchant_start_gold, dtype=np.int64)
+        self.stock = np.full((config.merchants, kinds), config.start_stock, dtype=np.int64)
+        self.price_multiplier = np.ones((config.merchants, kinds))
+        self.price = self.base_price[None, :].repeat(config.merchants, axis=0)
+        self.day = 0
+        self._reset_day_stats()
+
+    def _reset_day_stats(self):
+        kinds = self.stock.shape[1]
+        self._demand = np.zeros_like(self.stock) # purchase attempts per (merchant, kind)
+        self._stock_at_open = self.stock.copy()
+        self._stock_at_close = self.stock
+        self._sold_kind = np.zeros(kinds, dtype=np.int64)
+        self._unmet_kind = np.zeros(kinds, dtype=np.int64)
+        self._unaffordable_kind = np.zeros(kinds, dtype=np.int64)
+
+    ## trading
+    def attempt_round(self, merchant: np.ndarray, kind: np.ndarray) -> RoundResult:
+        """
+        One purchase attempt per player (player i buys `kind[i]` from `merchant[i]`, -1 = no attempt).
+        Attempts on the same (merchant, kind) are served in player order while stock lasts.
+        """
+        active = merchant >= 0
+        players = np.flatnonzero(active)
+        m, k = merchant[players], kind[players]
+        price = self.price[m, k]
+
+        ## position of each attempt in the queue of its (merchant, kind), first come first served
+        slot = m * self.stock.shape[1] + k
+        affordable = can_afford(self.player_gold[players], purchase_cost(price))
+        order = np.lexsort((players, slot))
+        queued = np.zeros(len(players), dtype=np.int64)
+        sorted_slot = slot[order]
+        sorted_affordable = affordable[order].astype(np.int64)
+        ## only buyers who can pay take a unit: queue position = affordable attempts before this one on the same slot
+        before = np.cumsum(sorted_affordable) - sorted_affordable
+        group_start = np.flatnonzero(np.r_[True, sorted_slot[1:] != sorted_slot[:-1]])
+        group_offset = np.repeat(before[group_start], np.diff(np.r_[group_start, len(order)]))
+        queued[order] = before - group_offset
+
+        allowed = purchase_allowed(self.player_gold[players], self.stock[m, k] - queued, price)
+        cost = np.where(allowed, purchase_cost(price), 0)
+
+        self.player_gold[players] -= cost
+        np.add.at(self.merchant_gold, m, cost)
+        np.subtract.at(self.stock, (m[allowed], k[allowed]), 1)
+
+        full_allowed = np.zeros(len(merchant), dtype=bool)
+        full_cost = np.zeros(len(merchant), dtype=np.int64)
+        full_allowed[players], full_cost[players] = allowed, cost
+        self._round_stats(m, k, allowed, affordable)
+        return RoundResult(full_allowed, full_cost)
+
+    def _round_stats(self, m, k, allowed, affordable):
+        kinds = self.stock.shape[1]
+        self._demand += np.bincount(m * kinds + k, minlength=self._demand.size).reshape(self._demand.shape)
+        self._sold_kind += np.bincount(k[allowed], minlength=kinds)
+        self._unmet_kind += np.bincount(k[affordable & ~allowed], minlength=kinds)
+        self._unaffordable_kind += np.bincount(k[~affordable], minlength=kinds)
+
+    def random_attempts(self):
+        config = self.config
+        wants = self.rng.random(config.players) < 0.8 # some players skip a round
+        merchant = np.where(wants, self.rng.integers(0, config.merchants, config.players), -1)
+        kind = self.rng.choice(len(self.items), size=config.players, p=self.demand_weights)
+        return merchant, kind
+
+    ## daily updates
+    def _reprice(self):
+        """Raise prices where demand exceeded the stock, lower them where stock stayed unsold"""
+        low, high = self.config.price_bounds
+        excess = self._demand - self._stock_at_open
+        self.price_multiplier = np.clip(self.price_multiplier * (1 + self.config.price_elasticity * np.clip(excess, -5, 5)), low, high)
+        self.price = np.maximum(1, np.rint(self.base_price * self.price_multiplier)).astype(np.int64)
+
+    def _restock(self):
+        """Merchants buy up to `restock` units per kind (towards `start_stock`) from suppliers at wholesale price, cheapest kinds first"""
+        wholesale = np.maximum(1, np.rint(self.base_price * self.config.wholesale_ratio)).astype(np.int64)
+        for kind in np.argsort(wholesale):
+            wanted = np.clip(self.config.start_stock - self.stock[:, kind], 0, self.config.restock)
+            quantity = np.minimum(wanted, self.merchant_gold // wholesale[kind])
+            cost = purchase_cost(wholesale[kind], quantity)
+            allowed = can_afford(self.merchant_gold, cost) & (quantity > 0)
+            self.merchant_gold -= np.where(allowed, cost, 0)
+            self.stock[:, kind] += np.where(allowed, quantity, 0)
+
+    def step(self) -> None:
+        """Simulate one day"""
+        config = self.config
+        self._reset_day_stats()
+        self.player_gold += self.rng.poisson(config.player_income, config.players)
+        for _ in range(config.trades_per_day):
+            self.attempt_round(*self.random_attempts())
+        self._reprice()
+        self._stock_at_close = self.stock.copy()
+        self._restock()
+        self.day += 1
+
+    def run(self, days: int = 365) -> EconomyReport:
+        report = EconomyReport(self.item_types)
+        for _ in range(days):
+            self.step()
+            report.player_gold.append(int(self.player_gold.sum()))
+            report.merchant_gold.append(int(self.merchant_gold.sum()))
+            report.gold_supply.append(report.player_gold[-1] + report.merchant_gold[-1])
+            report.sales.append(report.by_type(self._sold_kind))
+            report.unmet_demand.append(report.by_type(self._unmet_kind))
+            report.unaffordable.append(report.by_type(self._unaffordable_kind))
+            report.stockout_rate.append(self._mean_by_type(self._stock_at_close == 0))
+            report.price_index.append(self._mean_by_type(self.price / self.base_price))
+        return report
+
+    def _mean_by_type(self, per_merchant_kind: np.ndarray) -> np.ndarray:
+        return np.array([
+            per_merchant_kind[:, self.item_types == t].mean() if np.any(self.item_types == t) else np.nan
+            for t in range(len(ITEM_TYPES))
+        ])
@@ -0,0 +1,252 @@
+"""
+Append-only transaction ledger
+- every gold/item transfer is appended as one json line: [seq, source, destination, gold, item_name, item_type, item_price, quantity]
+- gold moves source -> destination, a negative quantity moves the item destination -> source (a purchase is one record)
+- a background writer group-commits pending records, one write + fsync per batch instead of per transaction
+- inventories are rebuilt from a snapshot plus a replay of the records written after it
+"""
+
+import os
+import json
+import itertools
+import threading
+from typing import Dict, List, Optional, Tuple
+from game.npc.merchant.react.models import Item, Inventory
+from game.npc.merchant.react.sub_system.transaction import lock_inventories
+
+class TransactionLedger:
+    def __init__(self, path: str, batch_size: int = 4096, commit_delay: float = 0.0):
+        self.path = path
+        self.batch_size = batch_size # max records per write + fsync
+        self.commit_delay = commit_delay # extra seconds to wait for a batch to fill up before committing
+
+        truncate_torn_tail(path)
+        self._seq = last_ledger_seq(path)
+        self._durable_seq = self._seq
+        self._pending: List[str] = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._error: Optional[BaseException] = None # set when the writer thread failed
+
+        self._file = open(path, 'a', encoding='utf-8')
+        self._writer = threading.Thread(target=self.__write_loop, name='ledger-writer', daemon=True)
+        self._writer.start()
+
+    @property
+    def last_seq(self) -> int:
+        """Sequence number of the last appended (not necessarily durable) record"""
+        return self._seq
+
+    def append(self, source: str, destination: str, gold: int, item: Optional[Item] = None, quantity: int = 1) -> int:
+        """Queue a transfer record and return its sequence number"""
+        with self._cond:
+            if self._error is not None:
+                raise IOError("Ledger writer failed.") from self._error
+            if self._closed:
+                raise ValueError("Ledger is closed.")
+            self._seq += 1
+            self._pending.append(json.dumps([
+                self._seq, source, destination, gold,
+                item.name if item else None,
+                item.type if item else None,
+                item.price if item else None,
+                quantity if item else 0,
+            ]))
+            self._cond.notify_all()
+            return self._seq
+
+    def append_purchase(self, buyer: str, seller: str, cost: int, item: Item, quantity: int = 1) -> int:
+        """Queue a purchase as one record: gold buyer -> seller, item seller -> buyer"""
+        return self.append(buyer, seller, cost, item, -quantity)
+
+    def wait(self, seq: int, timeout: float | None = None) -> bool:
+        """Block until the record with the given sequence number is on disk, raises if the writer failed"""
+        with self._cond:
+            durable = self._cond.wait_for(lambda: self._durable_seq >= seq or self._error is not None, timeout=timeout)
+            if self._durable_seq < seq and self._error is not None:
+                raise IOError("Ledger writer failed, the record is not durable.") from self._error
+            return durable
+
+    def flush(self) -> None:
+        self.wait(self._seq)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join()
+        self._file.close()
+
+    def __write_loop(self):
+        try:
+            self.__write_batches()
+        except BaseException as e:
+            print(f"[ERROR] - Ledger writer failed: {e}")
+            with self._cond:
+                self._error = e
+                self._cond.notify_all() # waiters raise instead of blocking forever
+
+    def __write_batches(self):
+        while True:
+            with self._cond:
+                # records queued while the previous fsync was running form the next batch
+                self._cond.wait_for(lambda: self._closed or self._pending)
+                if self.commit_delay and not self._closed:
+                    self._cond.wait_for(lambda: self._closed or len(self._pending) >= self.batch_size, timeout=self.commit_delay)
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+                batch_seq = json.loads(batch[-1])[0]
+
+            # write outside the lock so transactions keep queueing during the fsync
+            self._file.write('\n'.join(batch) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+            with self._cond:
+                self._durable_seq = batch_seq
+                self._cond.notify_all()
+
+def truncate_torn_tail(path: str) -> int:
+    """Cut a last record left incomplete by a crash (no trailing newline), return the number of bytes removed"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return 0
+    with open(path, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        while pos > 0:
+            start = max(0, pos - 4096)
+            f.seek(start)
+            chunk = f.read(pos - start)
+            newline = chunk.rfind(b'\n')
+            if newline >= 0:
+                keep = start + newline + 1
+                break
+            pos = start
+        else:
+            keep = 0
+        if keep < end:
+            print(f"[WARN] - Ledger {path}: dropping a torn last record ({end - keep} bytes)")
+            f.truncate(keep)
+            f.flush()
+            os.fsync(f.fileno())
+        return end - keep
+
+def last_ledger_seq(path: str) -> int:
+    """Read the sequence number of the last complete record without scanning the whole file"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return 0
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        f.seek(max(0, end - 4096))
+        data = f.read()
+    lines = data.split(b'\n')
+    lines.pop() # empty after the final newline, or a torn record
+    for line in reversed(lines):
+        if line.strip():
+            try:
+                return json.loads(line)[0]
+            except ValueError:
+                continue # first line of the window may be cut
+    return 0
+
+## Snapshot + Replay
+def write_snapshot(path: str, inventories: Dict[str, Inventory], ledger: TransactionLedger) -> int:
+    """Write a consistent snapshot of the inventories, return the ledger sequence it covers"""
+    # transfers append to the ledger while holding the inventory locks,
+    # so no transfer can be half applied relative to last_seq here
+    with lock_inventories(*inventories.values()):
+        last_seq = ledger.last_seq
+        data = {
+            'last_seq': last_seq,
+            'inventories': {owner: inv.model_dump() for owner, inv in inventories.items()},
+        }
+
+    # the snapshot must not claim records that are not yet on disk
+    ledger.wait(last_seq)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return last_seq
+
+def load_snapshot(path: str) -> Tuple[int, Dict[str, Inventory]]:
+    if not os.path.exists(path):
+        return 0, {}
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    inventories = {}
+    for owner, inv in data['inventories'].items():
+        inventories[owner] = Inventory.model_validate(inv)
+        inventories[owner].owner = owner
+    return data['last_seq'], inventories
+
+def _read_records(ledger_path: str, chunk_size: int = 65536):
+    """Parse the ledger in chunks of lines, one json.loads per chunk instead of per record (a torn last record is skipped)"""
+    with open(ledger_path, encoding='utf-8') as f:
+        while True:
+            lines = list(itertools.islice(f, chunk_size))
+            if not lines:
+                return
+            if not lines[-1].endswith('\n'):
+                # only the last line of the file can lack its newline: written partially before a crash
+                print(f"[WARN] - Ledger {ledger_path}: skipping a torn last record")
+                lines.pop()
+            lines = [line for line in lines if line.strip()]
+            if lines:
+                yield from json.loads('[' + ','.join(lines) + ']')
+
+def replay(ledger_path: str, inventories: Dict[str, Inventory], after_seq: int = 0) -> int:
+    """Apply ledger records newer than after_seq to the inventories, return the number of records applied"""
+    if not os.path.exists(ledger_path):
+        return 0
+
+    ## fold all records into net deltas first, then touch each inventory once
+    gold_delta: Dict[str, int] = {}
+    item_delta: Dict[Tuple[str, str], int] = {}
+    items: Dict[str, Item] = {} # item id -> item
+    item_ids: Dict[Tuple[str, str, int], str] = {} # (name, type, price) -> item id
+    applied = 0
+
+    for seq, source, destination, gold, name, item_type, price, quantity in _read_records(ledger_path):
+        if seq <= after_seq:
+            continue
+        applied += 1
+        if gold:
+            gold_delta[source] = gold_delta.get(source, 0) - gold
+            gold_delta[destination] = gold_delta.get(destination, 0) + gold
+        if name is not None:
+            item_id = item_ids.get((name, item_type, price))
+            if item_id is None:
+                item = Item(name=name, type=item_type, price=price)
+                item_id = item_ids[name, item_type, price] = item.id
+                items.setdefault(item_id, item)
+            key = (source, item_id)
+            item_delta[key] = item_delta.get(key, 0) - quantity
+            key = (destination, item_id)
+            item_delta[key] = item_delta.get(key, 0) + quantity
+
+    def inventory_of(owner):
+        if owner not in inventories:
+            inventories[owner] = Inventory(gold=0, owner=owner)
+        return inventories[owner]
+
+    for owner, delta in gold_delta.items():
+        inventory_of(owner).gold += delta
+
+    for (owner, item_id), delta in item_delta.items():
+        if delta > 0:
+            inventory_of(owner).add(inventory_of(owner).get(item_id) or items[item_id], delta)
+        elif delta < 0:
+            inventory_of(owner).remove(item_id, -delta)
+
+    return applied
+
+def restore(snapshot_path: str, ledger_path: str) -> Dict[str, Inventory]:
+    """Rebuild all inventories from the latest snapshot and the ledger"""
+    last_seq, inventories = load_snapshot(snapshot_path)
+    replay(ledger_path, inventories, after_seq=last_seq)
+    return inventories
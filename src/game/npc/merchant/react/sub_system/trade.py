@@ -11,6 +11,11 @@ from game.npc.merchant.react.models import *
 from atomic_agents.agents.base_agent import BaseAgent, BaseAgentConfig, BaseIOSchema
 from atomic_agents.lib.components.system_prompt_generator import SystemPromptGenerator
 from game.npc.merchant.react.llm_client import llm
+from game.npc.merchant.react.sub_system.transaction import purchase
+
+# max number of inventory items put into a single prompt
+INVENTORY_PAGE_SIZE = 8
+ITEM_TYPE_WORDS = {'weapon': 'weapon', 'armour': 'armour', 'armor': 'armour', 'potion': 'potion'}
 
 ## Intent Recognition
 class IntentMatchingInputSchema(BaseIOSchema):
@@ -141,9 +146,10 @@ INTENTS = [
 ]
 
 class TradeSystem:
-    def __init__(self, player_inventory: Inventory, merchant_inventory: Inventory, merchant_trait:str):
+    def __init__(self, player_inventory: Inventory, merchant_inventory: Inventory, merchant_trait:str, ledger=None):
         self.player_inventory = player_inventory
         self.merchant_inventory = merchant_inventory
+        self.ledger = ledger
         self.completed = False # prompt exit
         self.initiaited = False
         self.shared_memory = AgentMemory(max_messages=15)
@@ -208,30 +214,33 @@ class TradeSystem:
             trade_action_res.reasoning = f"Invalud transaction intent - can only buy"
             return trade_action_res
 
-        if not item or not (item in self.merchant_inventory.items):
+        if not item or not (item in self.merchant_inventory):
             trade_action_res.reasoning = f"Item not found in the inventory"
             return trade_action_res
-            
-        if self.player_inventory.gold < item.price:
-            trade_action_res.success = False
-            trade_action_res.item_name = item.name
-            trade_action_res.reasoning = f"Transaction unsuccessful. Player does not have enough gold to buy {item.name}"
+
+        # check and move gold and item atomically, other players may be trading with this merchant
+        purchase_res = purchase(self.player_inventory, self.merchant_inventory, item, ledger=self.ledger)
+        trade_action_res.item_name = item.name
+        if not purchase_res.is_successful:
+            trade_action_res.reasoning = f"Transaction unsuccessful. {purchase_res.reasoning}"
             return trade_action_res
-        
-        # deduct gold from player
-        self.player_inventory.gold -= item.price
-        # add item to player inventory
-        self.player_inventory.items.append(item)
-        # remove item from merchant inventory
-        self.merchant_inventory.items.remove(item)
-        # add gold to merchant
-        self.merchant_inventory.gold += item.price
 
         trade_action_res.success = True
-        trade_action_res.item_name = item.name
-        trade_action_res.reasoning = f"Transaction successful. Player bought {item.name} for {item.price} gold coins"
+        trade_action_res.reasoning = f"Transaction successful. {purchase_res.reasoning}"
         return trade_action_res
 
+    def __candidate_items(self, message: str) -> List[Item]:
+        """Items the player may be talking about: the best name matches, else the mentioned type (or what they can afford)"""
+        tokens = text_tokens(message)
+        page = self.merchant_inventory.query(text=message, page_size=INVENTORY_PAGE_SIZE)
+        if any(tokens & text_tokens(f"{stack.item.name} {stack.item.type}") for stack in page.items):
+            return [stack.item for stack in page.items]
+
+        ## no held item is named in the message, the page is only the cheapest items
+        item_type = next((ITEM_TYPE_WORDS[token] for token in tokens if token in ITEM_TYPE_WORDS), None)
+        page = self.merchant_inventory.query(item_type=item_type, budget=self.player_inventory.gold, page_size=INVENTORY_PAGE_SIZE)
+        return [stack.item for stack in page.items]
+
     def greeting(self):
         self.initiaited = True
         return "What are you looking for today?"
@@ -282,18 +291,25 @@ class TradeSystem:
             instucted_feefback_input.instruction = """
                 The player requested to see the merchant's collection. 
                 Use the provided inventory items in the context to generate a response.
+                The context only holds the best matching items, mention there is more if the total is larger.
             """
 
-            instucted_feefback_input.context = self.merchant_inventory.items
+            instucted_feefback_input.context = self.merchant_inventory.query(
+                text=message,
+                budget=self.player_inventory.gold,
+                page_size=INVENTORY_PAGE_SIZE,
+            )
         
         # transaction intent
         else:
             # Item Identification
             item_input = ItemIdentitySystemInputSchema(
                 message=message, 
-                available_items=self.merchant_inventory.items
+                available_items=self.__candidate_items(message)
             )
             item_output = self.item_identity_agent.run(item_input)
+            ## the held item, the agent may only have echoed one of the candidates
+            item = self.merchant_inventory.get(item_output.item) if item_output.item else None
 
             # provide instruction for response
             instucted_feefback_input.instruction = """
@@ -303,7 +319,7 @@ class TradeSystem:
             """
 
             # perform transaction
-            transaction_res = self.__perform_transaction(intent_output.intent, item_output.item)
+            transaction_res = self.__perform_transaction(intent_output.intent, item)
             # LOG EVENT
             print("[EVENT] Transaction: ", transaction_res.reasoning)
             if transaction_res.success:
@@ -0,0 +1,117 @@
+"""
+Atomic transaction engine for inventories
+- every transfer runs while holding the locks of both inventories
+- locks are always taken in the same global order so two transfers can not deadlock
+- checks (gold, stock) and mutations happen under the same locks so stock and gold can not be double spent
+- with a ledger, the record is appended after the checks and before anything moves (a ledger that refuses records
+  leaves both inventories untouched), the call returns once it is durable
+"""
+
+from contextlib import contextmanager
+from typing import Optional
+from game.npc.merchant.react.models import Item, Inventory, TransactionResult
+
+def _check_owners(*inventories: Inventory) -> None:
+    """Inventories need an owner to be recorded in the ledger, checked before anything moves"""
+    if not all(inventory.owner for inventory in inventories):
+        raise ValueError("Inventories need an owner to be recorded in the ledger.")
+
+## purchase rules, plain comparisons so they also apply elementwise to numpy arrays (economy simulation)
+def purchase_cost(price, quantity=1):
+    return price * quantity
+
+def has_stock(stock, quantity=1):
+    return stock >= quantity
+
+def can_afford(gold, cost):
+    return cost <= gold
+
+def purchase_allowed(buyer_gold, seller_stock, price, quantity=1):
+    return has_stock(seller_stock, quantity) & can_afford(buyer_gold, purchase_cost(price, quantity))
+
+@contextmanager
+def lock_inventories(*inventories: Inventory):
+    """Hold the locks of all given inventories, acquired in a consistent order"""
+    ordered = sorted({id(inv): inv for inv in inventories}.values(), key=lambda inv: inv._lock_order)
+    for inventory in ordered:
+        inventory._lock.acquire()
+    try:
+        yield
+    finally:
+        for inventory in reversed(ordered):
+            inventory._lock.release()
+
+def transfer(from_inventory: Inventory, to_inventory: Inventory, gold: int, item: Optional[Item] = None, quantity: int = 1, ledger=None) -> TransactionResult:
+    """ one way transaction: gold and (optionally) item move from one inventory to the other """
+    result = TransactionResult(is_successful=False)
+    if gold < 0 or (item and quantity <= 0):
+        result.reasoning = "Gold and quantity can not be negative."
+        return result
+    if ledger:
+        _check_owners(from_inventory, to_inventory)
+
+    seq = None
+    with lock_inventories(from_inventory, to_inventory):
+        ## check if item is in inventory
+        if item and not has_stock(from_inventory.quantity(item), quantity):
+            result.reasoning = "Item not found in inventory."
+            return result
+
+        ## check if enough gold
+        if not can_afford(from_inventory.gold, gold):
+            result.reasoning = "Not enough gold."
+            return result
+
+        if ledger:
+            seq = ledger.append(from_inventory.owner, to_inventory.owner, gold, from_inventory.get(item) if item else None, quantity)
+
+        ## perform transaction
+        if item:
+            item = from_inventory.remove(item, quantity)
+            to_inventory.add(item, quantity)
+
+        from_inventory.gold -= gold
+        to_inventory.gold += gold
+
+    # group commit: wait for the batch fsync after releasing the inventory locks
+    if seq:
+        ledger.wait(seq)
+
+    result.is_successful = True
+    return result
+
+def purchase(buyer: Inventory, seller: Inventory, item: Item, quantity: int = 1, ledger=None) -> TransactionResult:
+    """ two way transaction: buyer pays the seller's price for the item, item moves from seller to buyer """
+    result = TransactionResult(is_successful=False)
+    if quantity <= 0:
+        result.reasoning = "Quantity must be positive."
+        return result
+    if ledger:
+        _check_owners(buyer, seller)
+
+    with lock_inventories(buyer, seller):
+        ## price always comes from the seller's own copy of the item
+        held_item = seller.get(item)
+        if not held_item or not has_stock(seller.quantity(held_item), quantity):
+            result.reasoning = "Item not found in inventory."
+            return result
+
+        cost = purchase_cost(held_item.price, quantity)
+        if not can_afford(buyer.gold, cost):
+            result.reasoning = f"Not enough gold to buy {held_item.name}."
+            return result
+
+        if ledger:
+            # one record for both directions, so a crash can not persist half a trade
+            seq = ledger.append_purchase(buyer.owner, seller.owner, cost, held_item, quantity)
+
+        buyer.gold -= cost
+        seller.gold += cost
+        buyer.add(seller.remove(held_item, quantity), quantity)
+
+    if ledger:
+        ledger.wait(seq)
+
+    result.is_successful = True
+    result.reasoning = f"Bought {quantity} {held_item.name} for {cost} gold coins."
+    return result
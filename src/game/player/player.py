@@ -1,13 +1,20 @@
+from typing import Optional
 from pydantic import BaseModel
 from game.npc.merchant.react.models import *
+from game.items.items import Armour, Weapon
     
 class Player:
-    def __init__(self, gold=100):
+    def __init__(self, gold=100, player_id='player'):
+        self.player_id = player_id
         self.name = 'unknown'
-        self.inventory = Inventory(gold=gold, items=[])
+        self.inventory = Inventory(gold=gold, items=[], owner=player_id)
         self.health = 100
         self.level = 1
         self.quest_log = []
+        self.completed_quests = set() # names of completed quests (quest prerequisites)
+        self.location = 'starting_town' # id of the current location
+        self.weapon: Optional[Weapon] = None # equipped, adds to the base damage in combat
+        self.armour: Optional[Armour] = None # equipped, absorbs damage in combat
     
     def set_name(self, name):
         self.name = name
@@ -21,4 +28,4 @@ class Player:
         self.inventory.gold += amount
     
     def add_item(self, item: Item):
-        self.inventory.items[item.name] = item
\ No newline at end of file
+        self.inventory.add(item)
\ No newline at end of file
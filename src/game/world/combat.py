@@ -0,0 +1,185 @@
+"""
+Turn based combat
+- one rule set (attack_damage) shared by the single fight session and the batch simulator, it works on floats and numpy arrays
+- a round: the player acts, then the enemy attacks if still alive; a fight lasting MAX_ROUNDS is a draw
+- simulate_fights runs N independent fights at once with numpy arrays (hit points, rolls), in chunks with their own rng streams
+"""
+
+import random
+from typing import Literal, Optional
+import numpy as np
+from pydantic import BaseModel, Field
+from game.items.items import Armour, Weapon
+
+MAX_ROUNDS = 100
+PLAYER_BASE_DAMAGE = 5 # damage of an unarmed player
+DAMAGE_ROLL = (0.75, 1.25) # raw damage = damage * uniform(low, high)
+MIN_DAMAGE = 1 # a hit always deals at least this much
+DEFEND_MULTIPLIER = 2 # defense multiplier for the round when the player defends
+
+class Combatant(BaseModel):
+    name: str = Field(..., description="Name of the fighter")
+    health: int = Field(..., description="Hit points at the start of the fight")
+    damage: int = Field(..., description="Base damage of an attack")
+    defense: int = Field(default=0, description="Damage absorbed from every hit")
+    hit_chance: float = Field(default=0.8, description="Probability that an attack hits")
+    crit_chance: float = Field(default=0.1, description="Probability that a hit is critical")
+    crit_multiplier: float = Field(default=2.0, description="Damage multiplier of a critical hit")
+
+    @classmethod
+    def equipped(cls, name: str, health: int, base_damage: int, weapon: Optional[Weapon] = None, armour: Optional[Armour] = None, **stats) -> 'Combatant':
+        return cls(
+            name=name,
+            health=health,
+            damage=base_damage + (weapon.damage if weapon else 0),
+            defense=armour.defense if armour else 0,
+            **stats,
+        )
+
+def attack_damage(attacker: Combatant, defense, hit_roll, crit_roll, damage_roll):
+    """
+    Damage of an attack given uniform [0, 1) rolls, for scalars or arrays of rolls.
+    Hit if hit_roll < hit_chance, critical if crit_roll < crit_chance, the defense is subtracted from the rounded raw damage.
+    """
+    low, high = DAMAGE_ROLL
+    raw = attacker.damage * (low + (high - low) * damage_roll)
+    raw = np.where(crit_roll < attacker.crit_chance, raw * attacker.crit_multiplier, raw)
+    dealt = np.maximum(MIN_DAMAGE, np.rint(raw) - defense)
+    return np.where(hit_roll < attacker.hit_chance, dealt, 0).astype(np.int64)
+
+class CombatRound(BaseModel):
+    round: int
+    player_damage: int = Field(..., description="Damage dealt by the player this round")
+    enemy_damage: int = Field(..., description="Damage dealt by the enemy this round")
+    player_health: int
+    enemy_health: int
+    winner: Optional[Literal['player', 'enemy', 'draw']] = None
+
+class CombatSession:
+    def __init__(self, player: Combatant, enemy: Combatant, rng: Optional[random.Random] = None):
+        self.player = player
+        self.enemy = enemy
+        self.rng = rng or random.Random()
+        self.player_health = player.health
+        self.enemy_health = enemy.health
+        self.turn = 1
+        self.is_active = True
+
+    def __roll(self):
+        return self.rng.random(), self.rng.random(), self.rng.random()
+
+    def process_combat_action(self, player_action: Literal['attack', 'defend'] = 'attack') -> CombatRound:
+        """Process a single round of combat"""
+        if not self.is_active:
+            raise ValueError("The fight is over.")
+        player_damage = enemy_damage = 0
+        defense = self.player.defense
+        if player_action == 'attack':
+            player_damage = int(attack_damage(self.player, self.enemy.defense, *self.__roll()))
+            self.enemy_health -= player_damage
+        else:
+            defense *= DEFEND_MULTIPLIER
+
+        winner = None
+        if self.enemy_health <= 0:
+            winner = 'player'
+        else:
+            enemy_damage = int(attack_damage(self.enemy, defense, *self.__roll()))
+            self.player_health -= enemy_damage
+            if self.player_health <= 0:
+                winner = 'enemy'
+            elif self.turn >= MAX_ROUNDS:
+                winner = 'draw'
+
+        result = CombatRound(
+            round=self.turn,
+            player_damage=player_damage,
+            enemy_damage=enemy_damage,
+            player_health=self.player_health,
+            enemy_health=self.enemy_health,
+            winner=winner,
+        )
+        self.is_active = winner is None
+        self.turn += 1
+        return result
+
+    def run(self) -> CombatRound:
+        """Fight to the end, always attacking"""
+        while True:
+            result = self.process_combat_action('attack')
+            if result.winner:
+                return result
+
+class CombatStats:
+    """Outcomes of a batch of fights"""
+    def __init__(self, winners: np.ndarray, rounds: np.ndarray):
+        self.winners = winners # 1 player won, -1 enemy won, 0 draw
+        self.rounds = rounds # rounds fought
+
+    def __len__(self):
+        return len(self.winners)
+
+    @property
+    def player_win_rate(self) -> float:
+        return float(np.mean(self.winners == 1))
+
+    @property
+    def enemy_win_rate(self) -> float:
+        return float(np.mean(self.winners == -1))
+
+    @property
+    def draw_rate(self) -> float:
+        return float(np.mean(self.winners == 0))
+
+    def time_to_kill(self, winner: int = 1) -> np.ndarray:
+        """Rounds of the fights won by the given side"""
+        return self.rounds[self.winners == winner]
+
+    def time_to_kill_distribution(self, winner: int = 1) -> np.ndarray:
+        """Fraction of the side's wins ending in each round (index = round)"""
+        counts = np.bincount(self.time_to_kill(winner), minlength=MAX_ROUNDS + 1)
+        return counts / max(1, counts.sum())
+
+    def summary(self) -> str:
+        ttk = self.time_to_kill()
+        percentiles = np.percentile(ttk, [50, 90, 99]) if len(ttk) else [np.nan] * 3
+        return (
+            f"{len(self)} fights: player {self.player_win_rate:.1%}, enemy {self.enemy_win_rate:.1%}, draw {self.draw_rate:.1%}; "
+            f"player time to kill p50/p90/p99 {percentiles[0]:.0f}/{percentiles[1]:.0f}/{percentiles[2]:.0f} rounds"
+        )
+
+def _simulate_chunk(player: Combatant, enemy: Combatant, n: int, rng: np.random.Generator):
+    player_health = np.full(n, player.health, dtype=np.int64)
+    enemy_health = np.full(n, enemy.health, dtype=np.int64)
+    winners = np.zeros(n, dtype=np.int8)
+    rounds = np.full(n, MAX_ROUNDS, dtype=np.int64)
+    active = np.arange(n) # indexes of the fights still running
+
+    for turn in range(1, MAX_ROUNDS + 1):
+        if not len(active):
+            break
+        rolls = rng.random((6, len(active)))
+        enemy_health[active] -= attack_damage(player, enemy.defense, rolls[0], rolls[1], rolls[2])
+        killed = enemy_health[active] <= 0
+        winners[active[killed]] = 1
+        rounds[active[killed]] = turn
+        active, rolls = active[~killed], rolls[:, ~killed]
+
+        player_health[active] -= attack_damage(enemy, player.defense, rolls[3], rolls[4], rolls[5])
+        killed = player_health[active] <= 0
+        winners[active[killed]] = -1
+        rounds[active[killed]] = turn
+        active = active[~killed]
+    return winners, rounds
+
+def simulate_fights(player: Combatant, enemy: Combatant, n: int, seed: Optional[int] = None, chunk_size: int = 1_000_000) -> CombatStats:
+    """Simulate n fights (player always attacking), each chunk draws from its own spawned rng stream"""
+    chunks = max(1, -(-n // chunk_size))
+    streams = np.random.SeedSequence(seed).spawn(chunks)
+    winners, rounds = [], []
+    for i, stream in enumerate(streams):
+        size = min(chunk_size, n - i * chunk_size)
+        chunk_winners, chunk_rounds = _simulate_chunk(player, enemy, size, np.random.default_rng(stream))
+        winners.append(chunk_winners)
+        rounds.append(chunk_rounds)
+    return CombatStats(np.concatenate(winners), np.concatenate(rounds))
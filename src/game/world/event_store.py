@@ -0,0 +1,185 @@
+"""
+Bounded world event store
+- the last `capacity` events live in a ring buffer, older ones are spilled to an append-only json lines log
+- secondary indexes (npc, location, quest) hold the sequence numbers of the events in the ring, newest last
+- events are kept in time order, so time bounds are a binary search over the ring
+- a sparse (timestamp, offset) index lets archive queries seek into the log instead of reading it all
+"""
+
+import bisect
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+from pydantic import BaseModel, Field
+
+INDEXED_FIELDS = ('npc_id', 'location', 'quest')
+SPARSE_INDEX_EVERY = 64 # spilled events between two entries of the sparse log index
+
+class WorldEvent(BaseModel):
+    seq: int = Field(default=0, description="Sequence number, assigned by the event store")
+    event_type: str = Field(..., description="Kind of event, e.g. 'interaction', 'navigate', 'combat'")
+    timestamp: float = Field(default_factory=time.time, description="Time of the event (seconds since the epoch)")
+    npc_id: Optional[str] = Field(default=None, description="Npc involved in the event")
+    location: Optional[str] = Field(default=None, description="Location where the event happened")
+    quest: Optional[str] = Field(default=None, description="Quest the event relates to")
+    description: str = Field(default="", description="Short description of the event")
+    data: Dict[str, Any] = Field(default_factory=dict, description="Event specific details")
+
+def start_of_day(timestamp: Optional[float] = None) -> float:
+    """Local midnight of the day of the timestamp (now by default)"""
+    t = time.localtime(time.time() if timestamp is None else timestamp)
+    return time.mktime((t.tm_year, t.tm_mon, t.tm_mday, 0, 0, 0, 0, 0, -1))
+
+class WorldEventStore:
+    def __init__(self, capacity: int = 4096, log_path: Optional[str] = None):
+        if capacity < 1:
+            raise ValueError("Capacity must be at least 1.")
+        self.capacity = capacity
+        self.log_path = log_path # None: evicted events are dropped
+
+        self._ring: List[Optional[WorldEvent]] = [None] * capacity
+        self._times: List[float] = [0.0] * capacity
+        self._next_seq = 1
+        self._oldest_seq = 1 # oldest sequence number still in the ring
+        self._indexes: Dict[str, Dict[str, Deque[int]]] = {field: {} for field in INDEXED_FIELDS}
+        self._lock = threading.RLock()
+
+        self._log = open(log_path, 'a', encoding='utf-8') if log_path else None
+        self._spilled = 0
+        self._sparse: List[Tuple[float, int]] = [] # (timestamp, log offset) of every SPARSE_INDEX_EVERY-th spilled event
+
+    def __len__(self):
+        return self._next_seq - self._oldest_seq
+
+    @property
+    def last_seq(self) -> int:
+        return self._next_seq - 1
+
+    def append(self, event: WorldEvent) -> WorldEvent:
+        """Store a copy of the event with its sequence number assigned, the caller's event is left unchanged"""
+        with self._lock:
+            if len(self) == self.capacity:
+                self.__evict_oldest()
+
+            seq = self._next_seq
+            self._next_seq += 1
+            timestamp = event.timestamp
+            ## keep the ring in time order (the clock may step back)
+            if seq > self._oldest_seq:
+                timestamp = max(timestamp, self._times[(seq - 1) % self.capacity])
+            event = event.model_copy(update={'seq': seq, 'timestamp': timestamp})
+
+            slot = seq % self.capacity
+            self._ring[slot] = event
+            self._times[slot] = event.timestamp
+            for field in INDEXED_FIELDS:
+                value = getattr(event, field)
+                if value is not None:
+                    self._indexes[field].setdefault(value, deque()).append(seq)
+            return event
+
+    def __evict_oldest(self):
+        seq = self._oldest_seq
+        slot = seq % self.capacity
+        event = self._ring[slot]
+        self._ring[slot] = None
+        self._oldest_seq += 1
+
+        ## the evicted event is the oldest entry of each of its index lists
+        for field in INDEXED_FIELDS:
+            value = getattr(event, field)
+            if value is None:
+                continue
+            seqs = self._indexes[field][value]
+            seqs.popleft()
+            if not seqs:
+                del self._indexes[field][value]
+
+        if self._log is not None:
+            if self._spilled % SPARSE_INDEX_EVERY == 0:
+                self._sparse.append((event.timestamp, self._log.tell()))
+            self._log.write(event.model_dump_json() + '\n')
+            self._spilled += 1
+
+    def _event(self, seq: int) -> WorldEvent:
+        return self._ring[seq % self.capacity]
+
+    def _first_seq_at(self, since: float) -> int:
+        """Oldest sequence number in the ring with timestamp >= since"""
+        lo, hi = self._oldest_seq, self._next_seq
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._times[mid % self.capacity] < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def query(
+        self,
+        npc_id: Optional[str] = None,
+        location: Optional[str] = None,
+        quest: Optional[str] = None,
+        event_type: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: Optional[int] = None,
+    ) -> List[WorldEvent]:
+        """Events in memory matching every given filter, newest first"""
+        with self._lock:
+            filters = {field: value for field, value in zip(INDEXED_FIELDS, (npc_id, location, quest)) if value is not None}
+            lowest = self._oldest_seq if since is None else self._first_seq_at(since)
+
+            if filters:
+                ## walk the shortest index list, check the other filters on its events
+                candidates = [self._indexes[field].get(value, ()) for field, value in filters.items()]
+                seqs = reversed(min(candidates, key=len))
+            else:
+                seqs = range(self._next_seq - 1, self._oldest_seq - 1, -1)
+
+            results = []
+            for seq in seqs:
+                if seq < lowest or (limit is not None and len(results) >= limit):
+                    break
+                event = self._event(seq)
+                if until is not None and event.timestamp > until:
+                    continue
+                if event_type is not None and event.event_type != event_type:
+                    continue
+                if all(getattr(event, field) == value for field, value in filters.items()):
+                    results.append(event)
+            return results
+
+    def recent(self, count: Optional[int] = 5, **filters) -> List[WorldEvent]:
+        """Last `count` (None: all) events in memory matching the filters, oldest first"""
+        return list(reversed(self.query(limit=count, **filters)))
+
+    def archived(self, since: Optional[float] = None, until: Optional[float] = None, **filters) -> Iterator[WorldEvent]:
+        """Spilled events from the log in time order, seeking to `since` with the sparse index"""
+        if self._log is None:
+            return
+        with self._lock:
+            self._log.flush()
+            offset = 0
+            if since is not None and self._sparse:
+                pos = bisect.bisect_left(self._sparse, (since, -1)) - 1
+                offset = self._sparse[pos][1] if pos >= 0 else 0
+
+        with open(self.log_path, encoding='utf-8') as f:
+            f.seek(offset)
+            for line in f:
+                event = WorldEvent.model_validate(json.loads(line))
+                if since is not None and event.timestamp < since:
+                    continue
+                if until is not None and event.timestamp > until:
+                    break
+                if all(getattr(event, field) == value for field, value in filters.items() if value is not None):
+                    yield event
+
+    def close(self) -> None:
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
@@ -0,0 +1,91 @@
+"""
+Cached location narration
+- a description depends only on (location, time of day, weather), so generated descriptions are cached under that key
+- the cache is an LRU bounded by its number of entries
+- a background prefetcher generates the descriptions of the locations next to the players, so arriving there is a cache hit
+- concurrent requests for the same key share one generation
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+from game.npc.merchant.react.metrics import metrics
+
+NarrationKey = Tuple[str, Hashable, Hashable] # location id, time of day, weather
+NarrationGenerator = Callable[[str, Any, Any], str]
+
+class NarrationCache:
+    def __init__(self, generate: NarrationGenerator, max_entries: int = 512, executor: Optional[Executor] = None):
+        self.generate = generate
+        self.max_entries = max_entries
+        self._executor = executor
+        self._entries: OrderedDict[NarrationKey, str] = OrderedDict() # least recently used first
+        self._pending: Dict[NarrationKey, Future] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='narration-prefetch')
+        return self._executor
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: NarrationKey):
+        return key in self._entries
+
+    def get(self, location_id: str, time_of_day, weather) -> str:
+        """The description, generated now on a miss (or awaited if a prefetch is already running)"""
+        key = (location_id, time_of_day, weather)
+        with self._lock:
+            description = self._entries.get(key)
+            if description is not None:
+                self._entries.move_to_end(key)
+                metrics.incr('narration.hits')
+                return description
+            future = self._pending.get(key)
+            if future is None:
+                future = Future()
+                self._pending[key] = future
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            metrics.incr('narration.prefetch_waits')
+            return future.result()
+        metrics.incr('narration.misses')
+        return self.__generate(key, future)
+
+    def prefetch(self, location_ids: Iterable[str], time_of_day, weather) -> None:
+        """Generate the missing descriptions in the background"""
+        for location_id in location_ids:
+            key = (location_id, time_of_day, weather)
+            with self._lock:
+                if key in self._entries or key in self._pending:
+                    continue
+                future = Future()
+                self._pending[key] = future
+            metrics.incr('narration.prefetches')
+            self.executor.submit(self.__generate, key, future)
+
+    def __generate(self, key: NarrationKey, future: Future) -> str:
+        try:
+            description = self.generate(*key)
+        except Exception as e:
+            with self._lock:
+                self._pending.pop(key, None)
+            future.set_exception(e) # callers waiting on this generation see the error too
+            print(f"[WARN] - Narration generation failed for {key}: {e}")
+            raise
+
+        with self._lock:
+            self._entries[key] = description
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._pending.pop(key, None)
+        future.set_result(description)
+        return description
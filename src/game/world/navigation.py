@@ -0,0 +1,239 @@
+"""
+Location graph for navigation
+- locations are nodes, passable connections are undirected edges weighted by travel time
+- reachability: union-find over the open edges, near O(1)
+- routes: A* with ALT landmark bounds (|d(l, t) - d(l, v)| for a few precomputed landmark distance tables)
+- opening an edge (e.g. a secret passage) unions two components and repairs the landmark tables incrementally,
+  only the nodes whose landmark distance shrinks are touched
+- computed routes are cached; a new edge only drops the cached routes it can change (the 'unreachable' answers
+  between the two components it joins, or the routes the landmark bounds can not prove shorter than a detour over it)
+"""
+
+import heapq
+import threading
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+INF = float('inf')
+
+class Route(NamedTuple):
+    path: List[str] # location ids, start and destination included
+    travel_time: float
+
+class NavigationGraph:
+    def __init__(self, num_landmarks: int = 8, route_cache_size: int = 4096):
+        self.num_landmarks = num_landmarks
+        self.route_cache_size = route_cache_size
+
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._adjacency: List[Dict[int, float]] = [] # node -> {neighbour: travel time}
+        self._parent: List[int] = [] # union-find
+        self._landmarks: List[int] = []
+        self._landmark_dist: List[List[float]] = [] # one distance table per landmark
+        self._routes: OrderedDict[Tuple[int, int], Optional[Route]] = OrderedDict()
+        self._lock = threading.RLock()
+        self.version = 0
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, location_id: str):
+        return location_id in self._ids
+
+    ## building
+    def add_location(self, location_id: str) -> int:
+        with self._lock:
+            node = self._ids.get(location_id)
+            if node is not None:
+                return node
+            node = len(self._names)
+            self._ids[location_id] = node
+            self._names.append(location_id)
+            self._adjacency.append({})
+            self._parent.append(node)
+            for dist in self._landmark_dist:
+                dist.append(INF)
+            return node
+
+    def add_edge(self, a: str, b: str, travel_time: float = 1.0) -> None:
+        """Connect two locations (both ways), keeps the landmark tables exact"""
+        if travel_time < 0:
+            raise ValueError("Travel time can not be negative.")
+        with self._lock:
+            u, v = self.add_location(a), self.add_location(b)
+            if travel_time >= self._adjacency[u].get(v, INF):
+                return
+            self._adjacency[u][v] = travel_time
+            self._adjacency[v][u] = travel_time
+            ## before the union and the landmark repair, both describe the graph the cached routes were computed on
+            self._invalidate_routes(u, v, travel_time)
+            self._union(u, v)
+            for dist in self._landmark_dist:
+                if dist[u] + travel_time < dist[v]:
+                    self._propagate(dist, v, dist[u] + travel_time)
+                elif dist[v] + travel_time < dist[u]:
+                    self._propagate(dist, u, dist[v] + travel_time)
+            self.version += 1
+
+    # an opened connection is just a new edge, e.g. open_edge('waterfall', 'dragon_lair') once the secret passage is known
+    open_edge = add_edge
+
+    def neighbours(self, location_id: str) -> List[str]:
+        with self._lock:
+            node = self._ids.get(location_id)
+            return [] if node is None else [self._names[n] for n in self._adjacency[node]]
+
+    def build_landmarks(self) -> None:
+        """
+        Pick landmarks in the largest component by farthest point sampling and compute their distance tables.
+        Routes in other (small) components are searched without landmark bounds.
+        """
+        with self._lock:
+            self._landmarks, self._landmark_dist = [], []
+            if not self._names:
+                return
+            sizes: Dict[int, int] = {}
+            for node in range(len(self._names)):
+                root = self._find(node)
+                sizes[root] = sizes.get(root, 0) + 1
+
+            start = max(sizes, key=sizes.__getitem__)
+            closest = [INF] * len(self._names) # distance of each node to its nearest landmark
+            while len(self._landmarks) < self.num_landmarks:
+                dist = self._dijkstra(start)
+                self._landmarks.append(start)
+                self._landmark_dist.append(dist)
+                closest = [min(c, d) for c, d in zip(closest, dist)]
+                ## next landmark: the node of the component farthest from the current landmarks
+                start = max(range(len(closest)), key=lambda n: closest[n] if closest[n] < INF else -1)
+                if closest[start] <= 0:
+                    break
+            self._routes.clear()
+
+    def _invalidate_routes(self, u: int, v: int, travel_time: float) -> None:
+        """Drop the cached routes a new edge u-v can change"""
+        ru, rv = self._find(u), self._find(v)
+        if ru != rv:
+            ## joins two components: a route inside either one can not use the edge (it would have to cross back),
+            ## only the unreachable answers between them change
+            joined = {ru, rv}
+            stale = [key for key, route in self._routes.items() if route is None and {self._find(key[0]), self._find(key[1])} == joined]
+        else:
+            ## a shortcut inside a component: s -> t can only get faster through it if d(s, u) + w + d(v, t) (or the
+            ## other way round) beats the cached time, the landmark lower bounds rule most routes out
+            def beaten(s: int, t: int, cost: float) -> bool:
+                return (self._lower_bound(s, u) + travel_time + self._lower_bound(v, t) < cost
+                    or self._lower_bound(s, v) + travel_time + self._lower_bound(u, t) < cost)
+            stale = [key for key, route in self._routes.items() if route is not None and self._find(key[0]) == ru and beaten(*key, route.travel_time)]
+        for key in stale:
+            del self._routes[key]
+
+    def _lower_bound(self, a: int, b: int) -> float:
+        """Landmark lower bound of the distance between two nodes of the same component (0 without landmarks)"""
+        h = 0.0
+        for dist in self._landmark_dist:
+            da, db = dist[a], dist[b]
+            if da < INF and db < INF and abs(da - db) > h:
+                h = abs(da - db)
+        return h
+
+    ## union-find
+    def _find(self, node: int) -> int:
+        parent = self._parent
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    def _union(self, a: int, b: int) -> None:
+        ra, rb = self._find(a), self._find(b)
+        if ra != rb:
+            self._parent[max(ra, rb)] = min(ra, rb)
+
+    ## shortest paths
+    def _dijkstra(self, source: int) -> List[float]:
+        dist = [INF] * len(self._names)
+        self._propagate(dist, source, 0.0)
+        return dist
+
+    def _propagate(self, dist: List[float], node: int, d: float) -> None:
+        """Lower dist[node] to d and relax outwards, visiting only the nodes that improve"""
+        dist[node] = d
+        heap = [(d, node)]
+        adjacency = self._adjacency
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            for v, w in adjacency[u].items():
+                nd = d + w
+                if nd < dist[v]:
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+
+    def _search(self, source: int, target: int) -> Optional[Route]:
+        ## landmark bounds towards the target, landmarks in another component carry no information
+        bounds = [(dist, dist[target]) for dist in self._landmark_dist if dist[target] < INF]
+        def heuristic(v: int) -> float:
+            h = 0.0
+            for dist, dt in bounds:
+                b = dt - dist[v]
+                if b < 0:
+                    b = -b
+                if b > h:
+                    h = b
+            return h
+
+        g = {source: 0.0}
+        came_from = {source: -1}
+        heap = [(heuristic(source), 0.0, source)]
+        adjacency = self._adjacency
+        while heap:
+            _, d, u = heapq.heappop(heap)
+            if u == target:
+                path = []
+                while u != -1:
+                    path.append(self._names[u])
+                    u = came_from[u]
+                return Route(path[::-1], d)
+            if d > g[u]:
+                continue
+            for v, w in adjacency[u].items():
+                nd = d + w
+                if nd < g.get(v, INF):
+                    g[v] = nd
+                    came_from[v] = u
+                    heapq.heappush(heap, (nd + heuristic(v), nd, v))
+        return None
+
+    ## queries
+    def reachable(self, a: str, b: str) -> bool:
+        with self._lock:
+            u, v = self._ids.get(a), self._ids.get(b)
+            if u is None or v is None:
+                return False
+            return self._find(u) == self._find(v)
+
+    def route(self, a: str, b: str) -> Optional[Route]:
+        """Fastest route from a to b, None when b can not be reached"""
+        with self._lock:
+            u, v = self._ids.get(a), self._ids.get(b)
+            if u is None or v is None:
+                return None
+            key = (u, v)
+            if key in self._routes:
+                self._routes.move_to_end(key)
+                return self._routes[key]
+            route = self._search(u, v) if self._find(u) == self._find(v) else None
+            self._routes[key] = route
+            if len(self._routes) > self.route_cache_size:
+                self._routes.popitem(last=False)
+            return route
+
+    def travel_time(self, a: str, b: str) -> float:
+        """Travel time of the fastest route, inf when unreachable"""
+        route = self.route(a, b)
+        return INF if route is None else route.travel_time
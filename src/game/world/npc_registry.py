@@ -0,0 +1,228 @@
+"""
+Lazy npc registry
+- registering an npc stores a small descriptor, the npc itself is built by its kind's factory on first use
+- built npcs stay resident in an LRU bounded by a memory budget (estimated bytes per npc)
+- evicted npcs are persisted with export_state and restored with restore_state when they are needed again
+- get() returns an NpcHandle, not the npc: the handle resolves the live npc on every access, so a caller keeping it
+  never talks to an evicted copy; method calls through the handle hold a lease, a leased npc is never evicted
+- for several steps on the same object use `with registry.lease(npc_id) as npc:`
+- npcs are built (factory + restore_state) outside the registry lock, concurrent gets of the same npc wait for one build
+"""
+
+import os
+import json
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+from pydantic import BaseModel, Field
+from game.npc.merchant.react.metrics import metrics
+
+NPC_BASE_SIZE = 64 * 1024 # estimated bytes of a built npc besides its exported state (state machine, knowledge base, indexes)
+
+class NpcDescriptor(BaseModel):
+    npc_id: str = Field(..., description="Unique npc id, e.g. 'magnus_merchant'")
+    kind: str = Field(..., description="Npc kind, selects the factory building the npc, e.g. 'merchant'")
+    location: Optional[str] = Field(default=None, description="Location the npc is found at")
+    params: Dict[str, Any] = Field(default_factory=dict, description="Keyword arguments passed to the factory")
+
+NpcFactory = Callable[[NpcDescriptor], Any]
+
+def estimate_size(npc) -> int:
+    """Rough resident size of an npc: a fixed base plus the size of its exported state"""
+    export_state = getattr(npc, 'export_state', None)
+    if export_state is None:
+        return NPC_BASE_SIZE
+    return NPC_BASE_SIZE + len(json.dumps(export_state()))
+
+class NpcHandle:
+    """Stable reference to a registered npc, every attribute access goes to the live (possibly reloaded) npc"""
+    __slots__ = ('_registry', 'npc_id')
+
+    def __init__(self, registry: 'NpcRegistry', npc_id: str):
+        object.__setattr__(self, '_registry', registry)
+        object.__setattr__(self, 'npc_id', npc_id)
+
+    def __getattr__(self, name: str):
+        registry, npc_id = self._registry, self.npc_id
+        value = getattr(registry._resolve(npc_id), name)
+        if not callable(value):
+            return value
+        def leased_call(*args, **kwargs):
+            with registry.lease(npc_id) as npc:
+                return getattr(npc, name)(*args, **kwargs)
+        return leased_call
+
+    def __setattr__(self, name: str, value):
+        with self._registry.lease(self.npc_id) as npc:
+            setattr(npc, name, value)
+
+    def __repr__(self):
+        return f"NpcHandle({self.npc_id!r})"
+
+class NpcRegistry:
+    def __init__(
+        self,
+        factories: Optional[Dict[str, NpcFactory]] = None,
+        memory_budget: int = 64 * 1024 * 1024,
+        state_dir: Optional[str] = None,
+        size_of: Callable[[Any], int] = estimate_size,
+    ):
+        self.factories: Dict[str, NpcFactory] = dict(factories or {})
+        self.memory_budget = memory_budget
+        self.state_dir = state_dir # None: evicted states are kept in memory (as json strings)
+        self.size_of = size_of
+
+        self.descriptors: Dict[str, NpcDescriptor] = {}
+        self._resident: OrderedDict[str, Any] = OrderedDict() # least recently used first
+        self._sizes: Dict[str, int] = {}
+        self._pinned: set = set() # npcs registered as instances, never evicted
+        self._saved: Dict[str, str] = {}
+        self._leases: Dict[str, int] = {} # npc id -> callers currently using it, leased npcs are not evicted
+        self._loading: Dict[str, threading.Event] = {} # npc id -> set once its build finished
+        self._resident_bytes = 0
+        self._lock = threading.RLock()
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self.descriptors)
+
+    def __contains__(self, npc_id: str):
+        return npc_id in self.descriptors
+
+    @property
+    def resident_count(self) -> int:
+        return len(self._resident)
+
+    @property
+    def resident_bytes(self) -> int:
+        return self._resident_bytes
+
+    def register_factory(self, kind: str, factory: NpcFactory) -> None:
+        self.factories[kind] = factory
+
+    def register(self, descriptor: NpcDescriptor) -> None:
+        """Register an npc without building it"""
+        if descriptor.kind not in self.factories:
+            raise ValueError(f"No factory for npc kind '{descriptor.kind}'.")
+        with self._lock:
+            self.descriptors[descriptor.npc_id] = descriptor
+
+    def register_instance(self, npc_id: str, npc, kind: str = 'instance') -> None:
+        """Register an already built npc, it stays resident"""
+        with self._lock:
+            self.descriptors[npc_id] = NpcDescriptor(npc_id=npc_id, kind=kind)
+            self._pinned.add(npc_id)
+            self._resident[npc_id] = npc
+            self._sizes[npc_id] = 0
+
+    def is_resident(self, npc_id: str) -> bool:
+        return npc_id in self._resident
+
+    def get(self, npc_id: str) -> Optional[NpcHandle]:
+        """A handle to the npc (built on first use), None for an unknown id"""
+        if npc_id not in self.descriptors:
+            return None
+        return NpcHandle(self, npc_id)
+
+    @contextmanager
+    def lease(self, npc_id: str):
+        """The live npc, kept resident until the block exits"""
+        with self._lock:
+            self._leases[npc_id] = self._leases.get(npc_id, 0) + 1
+        try:
+            yield self._resolve(npc_id)
+        finally:
+            with self._lock:
+                self._leases[npc_id] -= 1
+                if not self._leases[npc_id]:
+                    del self._leases[npc_id]
+                self.__evict_over_budget(keep=npc_id)
+
+    def _resolve(self, npc_id: str):
+        """The resident npc, built and restored outside the lock when it is not resident"""
+        while True:
+            with self._lock:
+                npc = self._resident.get(npc_id)
+                if npc is not None:
+                    self._resident.move_to_end(npc_id)
+                    metrics.incr('npc_registry.hits')
+                    return npc
+                descriptor = self.descriptors.get(npc_id)
+                if descriptor is None:
+                    raise KeyError(f"Unknown npc '{npc_id}'.")
+                loading = self._loading.get(npc_id)
+                if loading is None:
+                    loading = self._loading[npc_id] = threading.Event()
+                    break
+            ## another thread is building this npc
+            loading.wait()
+
+        try:
+            metrics.incr('npc_registry.loads')
+            npc = self.factories[descriptor.kind](descriptor)
+            state = self.__load_state(npc_id)
+            if state is not None:
+                npc.restore_state(state)
+            size = self.size_of(npc)
+            with self._lock:
+                self._resident[npc_id] = npc
+                self._sizes[npc_id] = size
+                self._resident_bytes += size
+                self.__evict_over_budget(keep=npc_id)
+            return npc
+        finally:
+            with self._lock:
+                del self._loading[npc_id]
+            loading.set()
+
+    def evict(self, npc_id: str) -> bool:
+        """Persist and drop a resident npc (pinned and leased npcs are kept)"""
+        with self._lock:
+            if npc_id not in self._resident or npc_id in self._pinned or npc_id in self._leases:
+                return False
+            npc = self._resident.pop(npc_id)
+            self._resident_bytes -= self._sizes.pop(npc_id)
+            export_state = getattr(npc, 'export_state', None)
+            if export_state is not None:
+                self.__save_state(npc_id, json.dumps(export_state()))
+            metrics.incr('npc_registry.evictions')
+            return True
+
+    def flush(self) -> None:
+        """Persist every resident npc without evicting it"""
+        with self._lock:
+            for npc_id, npc in self._resident.items():
+                if npc_id not in self._pinned and hasattr(npc, 'export_state'):
+                    self.__save_state(npc_id, json.dumps(npc.export_state()))
+
+    def __evict_over_budget(self, keep: str):
+        for npc_id in list(self._resident):
+            if self._resident_bytes <= self.memory_budget:
+                return
+            if npc_id != keep:
+                self.evict(npc_id)
+
+    def __state_path(self, npc_id: str) -> str:
+        return os.path.join(self.state_dir, f"{npc_id}.json")
+
+    def __save_state(self, npc_id: str, payload: str):
+        if not self.state_dir:
+            self._saved[npc_id] = payload
+            return
+        path = self.__state_path(npc_id)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+    def __load_state(self, npc_id: str) -> Optional[dict]:
+        if not self.state_dir:
+            payload = self._saved.get(npc_id)
+            return json.loads(payload) if payload is not None else None
+        try:
+            with open(self.__state_path(npc_id), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
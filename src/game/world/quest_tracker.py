@@ -0,0 +1,93 @@
+"""
+Event driven quest progress
+- quest objectives are compiled into an index (event type, target) -> interested objectives
+- an action result only touches the objectives it can affect, not every quest in the quest log
+- completed objectives and quests leave the index
+"""
+
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field
+from game.npc.merchant.react.models import Quest, QuestObjective
+
+ObjectiveKey = Tuple[str, int] # quest name, objective position
+
+class QuestUpdate(BaseModel):
+    quest_name: str = Field(..., description="Quest that progressed")
+    objective: QuestObjective = Field(..., description="Objective that progressed")
+    progress: int = Field(..., description="Progress of the objective after the event")
+    objective_completed: bool = Field(..., description="Whether the objective is now complete")
+    quest_completed: bool = Field(..., description="Whether every objective of the quest is now complete")
+
+class QuestTracker:
+    """Progress of one player's active quests"""
+    def __init__(self, player=None):
+        self.player = player # completed quests are added to player.completed_quests when set
+        self.quests: Dict[str, Quest] = {}
+        self.progress: Dict[str, List[int]] = {}
+        self._remaining: Dict[str, int] = {} # quest name -> number of open objectives
+        # (event type, target) -> open objectives (dict as an ordered set)
+        self._index: Dict[Tuple[str, str], Dict[ObjectiveKey, None]] = {}
+
+    def __len__(self):
+        return len(self.quests)
+
+    def add_quest(self, quest: Quest) -> None:
+        if quest.name in self.quests:
+            return
+        self.quests[quest.name] = quest
+        self.progress[quest.name] = [0] * len(quest.objectives)
+        self._remaining[quest.name] = len(quest.objectives)
+        for i, objective in enumerate(quest.objectives):
+            self._index.setdefault((objective.event_type, objective.target), {})[(quest.name, i)] = None
+
+    def remove_quest(self, quest_name: str) -> None:
+        quest = self.quests.pop(quest_name, None)
+        if quest is None:
+            return
+        for i, objective in enumerate(quest.objectives):
+            self._unindex((objective.event_type, objective.target), (quest_name, i))
+        del self.progress[quest_name]
+        del self._remaining[quest_name]
+
+    def _unindex(self, key: Tuple[str, str], objective_key: ObjectiveKey) -> None:
+        objectives = self._index.get(key)
+        if objectives is None:
+            return
+        objectives.pop(objective_key, None)
+        if not objectives:
+            del self._index[key]
+
+    def on_event(self, event_type: str, target: str, amount: int = 1) -> List[QuestUpdate]:
+        """Apply an event (e.g. 'defeat', 'cave_troll') to the objectives waiting for it"""
+        key = (event_type, target)
+        objectives = self._index.get(key)
+        if not objectives:
+            return []
+
+        updates = []
+        for quest_name, i in list(objectives):
+            quest = self.quests[quest_name]
+            objective = quest.objectives[i]
+            progress = self.progress[quest_name]
+            progress[i] = min(objective.required, progress[i] + amount)
+
+            objective_completed = progress[i] >= objective.required
+            quest_completed = False
+            if objective_completed:
+                self._unindex(key, (quest_name, i))
+                self._remaining[quest_name] -= 1
+                quest_completed = self._remaining[quest_name] == 0
+                if quest_completed and self.player is not None:
+                    self.player.completed_quests.add(quest_name)
+            updates.append(QuestUpdate(
+                quest_name=quest_name,
+                objective=objective,
+                progress=progress[i],
+                objective_completed=objective_completed,
+                quest_completed=quest_completed,
+            ))
+        return updates
+
+    def is_completed(self, quest_name: str) -> Optional[bool]:
+        remaining = self._remaining.get(quest_name)
+        return None if remaining is None else remaining == 0
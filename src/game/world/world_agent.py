@@ -3,20 +3,35 @@ A trading system for player and merchant interaction
 - self containing conversation loop
 """
 
+import os
 import instructor
-from pydantic import Field
-from typing import List, Any
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from typing import List, Any, Optional
 from atomic_agents.agents.base_agent import AgentMemory
 from atomic_agents.agents.base_agent import BaseAgent, BaseAgentConfig, BaseIOSchema
 from atomic_agents.lib.components.system_prompt_generator import SystemPromptGenerator
 from game.npc.merchant.react.llm_client import llm
+from game.world.quest_tracker import QuestTracker, QuestUpdate
+from game.world.event_store import WorldEvent, WorldEventStore, start_of_day
+from game.world.npc_registry import NpcDescriptor, NpcRegistry
+from game.world.narration_cache import NarrationCache
+from game.world.navigation import NavigationGraph
+from game.world.combat import PLAYER_BASE_DAMAGE, Combatant, CombatSession, CombatStats, simulate_fights
+from game.npc.merchant.react.react_merchant import ReActMerchant
+from game.npc.merchant.react.sub_system.ledger import TransactionLedger
+
+SAVE_DIR = "saves" # world save data (transaction ledger, ...)
+WORLD_EVENTS_LOG = "world_events.log" # events spilled from the in-memory window
+NPC_STATE_DIR = "npcs" # states of the npcs evicted from memory
 
 class WorldAgent:
-    def __init__(self):
+    def __init__(self, save_dir: str = SAVE_DIR):
+        os.makedirs(save_dir, exist_ok=True)
+        self.ledger = TransactionLedger(os.path.join(save_dir, "transactions.ledger"))  # every gold/item transfer
         self.world_state = WorldState()  # Contains map, NPCs, quests, enemies
         self.player = Player()
-        self.memory = WorldMemory()  # For persistent world state
-        self.npc_registry = NPCRegistry()  # Contains all NPCs including your merchant
+        self.memory = WorldMemory(log_path=os.path.join(save_dir, WORLD_EVENTS_LOG))  # For persistent world state
+        self.npc_registry = NPCRegistry(state_dir=os.path.join(save_dir, NPC_STATE_DIR), ledger=self.ledger)  # Contains all NPCs including your merchant, evicted ones are saved to disk
         self.current_location = "starting_town"
         
     def process_input(self, player_input: str):
@@ -53,6 +68,27 @@ class WorldState(BaseModel):
     quest_states: Dict[str, QuestState] = {}
     time_of_day: TimeOfDay = TimeOfDay.MORNING
     weather: Weather = Weather.CLEAR
+    navigation: NavigationGraph = Field(default_factory=NavigationGraph, exclude=True) # connections between locations
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @model_validator(mode='after')
+    def build_navigation(self) -> 'WorldState':
+        """Navigation graph of the loaded locations, one edge per connection"""
+        for location_id, location in self.locations.items():
+            self.__connect(location_id, location)
+        self.navigation.build_landmarks()
+        return self
+
+    def add_location(self, location_id: str, location: Location) -> None:
+        """Add a location and its connections (the landmark tables are kept exact by add_edge)"""
+        self.locations[location_id] = location
+        self.__connect(location_id, location)
+
+    def __connect(self, location_id: str, location: Location) -> None:
+        self.navigation.add_location(location_id)
+        for connection in location.connections:
+            self.navigation.add_edge(location_id, connection)
     
     def get_location_description(self, location_id: str) -> str:
         """Get narrative description of location"""
@@ -64,10 +100,21 @@ class WorldState(BaseModel):
         location = self.locations.get(location_id)
         return location.available_actions
 
+    def get_adjacent_locations(self, location_id: str) -> List[str]:
+        """Ids of the locations reachable in one move"""
+        return self.navigation.neighbours(location_id)
+
+class ActionResult(BaseModel):
+    success: bool = Field(..., description="Whether the action succeeded")
+    reason: str = Field(..., description="What happened, used for the narration")
+    event_type: Optional[str] = Field(default=None, description="Quest event the action caused (talk, collect, visit, defeat)")
+    target: Optional[str] = Field(default=None, description="Target of the quest event, e.g. a location or npc id")
+
 class ActionHandler:
-    def __init__(self, world_state: WorldState, player: Player):
+    def __init__(self, world_state: WorldState, player: Player, npc_registry: 'NPCRegistry'):
         self.world_state = world_state
         self.player = player
+        self.npc_registry = npc_registry
         self.action_map = {
             "navigate": self.handle_navigation,
             "talk_to_npc": self.handle_npc_interaction,
@@ -85,30 +132,51 @@ class ActionHandler:
     
     def handle_navigation(self, action: WorldAction) -> ActionResult:
         """Handle player movement between locations"""
-        # Implementation for navigation
+        destination = action.params.get("location_id")
+        route = self.world_state.navigation.route(self.player.location, destination)
+        if route is None:
+            return ActionResult(success=False, reason=f"There is no known way from {self.player.location} to {destination}.")
+        self.player.location = destination
+        return ActionResult(
+            success=True,
+            reason=f"Travelled {' -> '.join(route.path)} in {route.travel_time:g} hours.",
+            event_type="visit",
+            target=destination,
+        )
         
     def handle_npc_interaction(self, action: WorldAction) -> ActionResult:
         """Handle talking to NPCs including your merchant"""
         npc_id = action.params.get("npc_id")
-        npc = self.world_state.npcs.get(npc_id)
-        
-        if isinstance(npc, ReActMerchant):
-            # Use your existing merchant logic
-            return npc.process_input(action.params.get("message"), self.player)
-        
-        # Handle other NPC types
+        npc = self.npc_registry.get_npc(npc_id) # handle to the npc, built or restored on demand
+        if npc is None:
+            return ActionResult(success=False, reason=f"There is nobody called {npc_id} here.")
+        return npc.process_input(action.params.get("message"), self.player)
     
 
 class NarrativeGenerator:
     def __init__(self, world_state: WorldState):
         self.world_state = world_state
         self.llm = ChatOpenAI(model="gpt-4o-mini")
+        self.location_descriptions = NarrationCache(self.__describe_location) # keyed by (location, time of day, weather)
     
     def generate_location_description(self, location_id: str) -> str:
-        """Generate a rich description of the current location"""
+        """Generate a rich description of the current location (cached), and prefetch the adjacent ones"""
+        time_of_day, weather = self.world_state.time_of_day, self.world_state.weather
+        description = self.location_descriptions.get(location_id, time_of_day, weather)
+        self.prefetch_adjacent(location_id)
+        return description
+
+    def prefetch_adjacent(self, location_id: str):
+        """Warm the descriptions of the locations a player can move to next"""
+        self.location_descriptions.prefetch(
+            self.world_state.get_adjacent_locations(location_id),
+            self.world_state.time_of_day,
+            self.world_state.weather,
+        )
+
+    def __describe_location(self, location_id: str, time_of_day: TimeOfDay, weather: Weather) -> str:
         location = self.world_state.locations.get(location_id)
-        
-        prompt = self.create_location_prompt(location)
+        prompt = self.create_location_prompt(location, time_of_day, weather)
         return self.llm.invoke(prompt).content
     
     def generate_action_result_narrative(self, action_result: ActionResult) -> str:
@@ -116,81 +184,100 @@ class NarrativeGenerator:
         prompt = self.create_action_result_prompt(action_result)
         return self.llm.invoke(prompt).content
 
-class NPCRegistry:
-    def __init__(self):
-        self.npcs = {}
+class NPCRegistry(NpcRegistry):
+    """NPCs are registered as descriptors and built on first interaction, cold ones are persisted and evicted"""
+    def __init__(self, memory_budget: int = 64 * 1024 * 1024, state_dir: Optional[str] = None, ledger: Optional[TransactionLedger] = None):
+        super().__init__(factories={"merchant": self.build_merchant}, memory_budget=memory_budget, state_dir=state_dir)
+        self.ledger = ledger # shared by every merchant, records their transfers
+
+    def build_merchant(self, descriptor: NpcDescriptor) -> ReActMerchant:
+        return ReActMerchant(npc_id=descriptor.npc_id, ledger=self.ledger, **descriptor.params)
     
     def register_npc(self, npc_id: str, npc_instance):
-        """Register an NPC with the registry"""
-        self.npcs[npc_id] = npc_instance
+        """Register an already built NPC (kept resident)"""
+        self.register_instance(npc_id, npc_instance)
     
     def get_npc(self, npc_id: str):
-        """Get an NPC by ID"""
-        return self.npcs.get(npc_id)
+        """Get a handle to an NPC by ID (built or restored on demand)"""
+        return self.get(npc_id)
 
 class WorldMemory:
-    def __init__(self):
-        self.event_history = []
-        self.player_interactions = {}
+    def __init__(self, capacity: int = 4096, log_path: Optional[str] = os.path.join(SAVE_DIR, WORLD_EVENTS_LOG)):
+        if log_path:
+            os.makedirs(os.path.dirname(log_path) or '.', exist_ok=True)
+        self.events = WorldEventStore(capacity, log_path) # bounded in memory, older events spill to the log (None: dropped)
         self.quest_progress = {}
     
     def record_event(self, event: WorldEvent):
         """Record a game event"""
-        self.event_history.append(event)
+        self.events.append(event)
     
     def record_npc_interaction(self, npc_id: str, interaction: NPCInteraction):
         """Record interactions with NPCs"""
-        if npc_id not in self.player_interactions:
-            self.player_interactions[npc_id] = []
-        self.player_interactions[npc_id].append(interaction)
+        self.events.append(WorldEvent(
+            event_type="interaction",
+            npc_id=npc_id,
+            location=interaction.location,
+            description=interaction.summary,
+        ))
     
-    def get_recent_events(self, count: int = 5) -> List[WorldEvent]:
-        """Get recent events for context"""
-        return self.event_history[-count:]
+    def get_recent_events(self, count: int = 5, **filters) -> List[WorldEvent]:
+        """Get recent events for context, e.g. get_recent_events(5, location="starting_town")"""
+        return self.events.recent(count, **filters)
+
+    def get_npc_interactions_today(self, npc_id: str) -> List[WorldEvent]:
+        """Interactions with an NPC since midnight, oldest first"""
+        return self.events.recent(None, npc_id=npc_id, event_type="interaction", since=start_of_day())
 
 class CombatSystem:
     def __init__(self, player: Player):
         self.player = player
     
-    def initiate_combat(self, enemy: Enemy) -> CombatSession:
-        """Start a combat encounter"""
-        return CombatSession(self.player, enemy)
-    
-class CombatSession:
-    def __init__(self, player: Player, enemy: Enemy):
-        self.player = player
-        self.enemy = enemy
-        self.turn = 1
-        self.is_active = True
-    
-    def process_combat_action(self, player_action: CombatAction) -> CombatRound:
-        """Process a single round of combat"""
-        # Implementation for turn-based combat
+    def initiate_combat(self, enemy: Combatant) -> CombatSession:
+        """Start a combat encounter (rounds are played with CombatSession.process_combat_action)"""
+        return CombatSession(self.__combatant(), enemy)
+
+    def simulate(self, enemy: Combatant, fights: int = 100_000) -> CombatStats:
+        """Win rate and time to kill of the player against an enemy, for balancing"""
+        return simulate_fights(self.__combatant(), enemy, fights)
+
+    def __combatant(self) -> Combatant:
+        """The player with the equipped weapon and armour"""
+        return Combatant.equipped(self.player.name, self.player.health, PLAYER_BASE_DAMAGE, self.player.weapon, self.player.armour)
 
 class QuestManager:
     def __init__(self, world_state: WorldState, player: Player):
         self.world_state = world_state
         self.player = player
-    
+        self.tracker = QuestTracker(player) # index of the active quests' objectives
+        self._tracked = 0 # quests of player.quest_log already added to the tracker
+        self.sync_quest_log()
+
+    def sync_quest_log(self) -> None:
+        """Track the quests appended to the player's quest log since the last sync (e.g. handed out by a merchant)"""
+        quest_log = self.player.quest_log
+        for quest in quest_log[self._tracked:]:
+            self.tracker.add_quest(quest)
+        self._tracked = len(quest_log)
+
+    def accept_quest(self, quest: Quest):
+        if quest not in self.player.quest_log:
+            self.player.quest_log.append(quest)
+        self.sync_quest_log()
+
     def check_quest_progress(self, action_result: ActionResult) -> List[QuestUpdate]:
-        """Check if an action has progressed any quests"""
-        updates = []
-        for quest in self.player.quest_log:
-            if self.action_progresses_quest(action_result, quest):
-                updates.append(self.update_quest_progress(quest, action_result))
-        return updates
-    
-    def action_progresses_quest(self, action_result: ActionResult, quest: Quest) -> bool:
-        """Check if an action progresses a specific quest"""
-        # Implementation to check quest objectives
+        """Check if an action has progressed any quests (only the objectives waiting for this event are touched)"""
+        self.sync_quest_log()
+        if action_result.event_type is None or action_result.target is None:
+            return []
+        return self.tracker.on_event(action_result.event_type, action_result.target)
 
 
 def main():
     world_agent = WorldAgent()
     
-    # Register your merchant NPC
-    merchant = ReActMerchant()
-    world_agent.npc_registry.register_npc("magnus_merchant", merchant)
+    # Register your merchant NPC (built on the first interaction)
+    world_agent.npc_registry.register(NpcDescriptor(npc_id="magnus_merchant", kind="merchant", location="starting_town"))
     
     # Game loop
     while True: